@@ -0,0 +1,12 @@
+from flask import request
+
+# Largest page a client may ask for with ?limit=
+MAX_PAGE_SIZE = 100
+
+
+def get_limit_arg():
+    """Reads ?limit=, bounded to 1..MAX_PAGE_SIZE; None (every item) when it is absent"""
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return None
+    return max(1, min(limit, MAX_PAGE_SIZE))
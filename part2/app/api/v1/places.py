@@ -1,5 +1,8 @@
 from flask_restx import Namespace, Resource, fields
+from flask import request
 from app.services import facade
+from app.api.v1.pagination import MAX_PAGE_SIZE, get_limit_arg
+from app.models.serializer import DEFAULT_DEPTH, MAX_DEPTH, Serializer
 
 api = Namespace('places', description='Place operations')
 
@@ -27,6 +30,11 @@ place_model = api.model('Place', {
     'amenities': fields.List(fields.String, required=True, description="List of amenities ID's")
 })
 
+def get_depth_arg():
+    """Reads ?depth=, the levels of relations nested in each place, bounded by MAX_DEPTH"""
+    depth = request.args.get('depth', DEFAULT_DEPTH, type=int)
+    return max(0, min(depth, MAX_DEPTH))
+
 @api.route('/')
 class PlaceList(Resource):
     @api.expect(place_model)
@@ -42,17 +50,67 @@ class PlaceList(Resource):
             return {'error': str(e)}, 400
 
     @api.response(200, 'List of places retrieved successfully')
+    @api.response(400, 'Invalid cursor or sort')
+    @api.param('limit', f'Maximum number of places to return, at most {MAX_PAGE_SIZE} (all by default)')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('min_price', 'Only places priced at least this much per night')
+    @api.param('max_price', 'Only places priced at most this much per night')
+    @api.param('sort', 'created_at (default), price, or either prefixed with - for descending')
+    @api.param('depth', f'Levels of relations nested in each place (default {DEFAULT_DEPTH}, at most {MAX_DEPTH})')
+    def get(self):
+        """Retrieve a list of places"""
+        limit = get_limit_arg()
+        cursor = request.args.get('cursor')
+        min_price = request.args.get('min_price', type=float)
+        max_price = request.args.get('max_price', type=float)
+        sort = request.args.get('sort', 'created_at')
+        try:
+            # Get one page of places using facade
+            places, next_cursor = facade.get_places_page(limit, cursor, min_price, max_price, sort)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+        # One serializer for the whole list: an owner, amenity or review shared by places is serialized once
+        return Serializer(get_depth_arg()).dump_all(places), 200, headers
+
+def get_nearby_args():
+    """Reads ?lat=&lon=&k=&max_km= for /places/nearby, raises ValueError when they are invalid"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+    except (KeyError, ValueError):
+        raise ValueError("lat and lon are required numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat must be between -90 and 90, lon between -180 and 180")
+    k = request.args.get('k', 10, type=int)
+    max_km = request.args.get('max_km', type=float)
+    if max_km is not None and max_km < 0:
+        raise ValueError("max_km must be positive")
+    return lat, lon, max(1, min(k, 100)), max_km
+
+@api.route('/nearby')
+class PlaceNearby(Resource):
+    @api.response(200, 'Nearest places retrieved successfully')
+    @api.response(400, 'Invalid coordinates')
+    @api.param('lat', 'Latitude of the point', required=True)
+    @api.param('lon', 'Longitude of the point', required=True)
+    @api.param('k', 'Maximum number of places to return (default 10, at most 100)')
+    @api.param('max_km', 'Only places within this great-circle distance, in km')
     def get(self):
-        """Retrieve a list of all places"""
-        # Get all places using facade
-        places = facade.get_all_places()
-        # Convert to list of dictionaries
-        return [place.to_dict() for place in places], 200
+        """Retrieve the places nearest to a point, nearest first"""
+        try:
+            lat, lon, k, max_km = get_nearby_args()
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        nearby = facade.get_nearby_places(lat, lon, k, max_km)
+        serializer = Serializer()
+        return [dict(serializer.dump(place), distance_km=round(distance, 3)) for place, distance in nearby], 200
 
 @api.route('/<place_id>')
 class PlaceResource(Resource):
     @api.response(200, 'Place details retrieved successfully')
     @api.response(404, 'Place not found')
+    @api.param('depth', f'Levels of relations nested in the place (default {DEFAULT_DEPTH}, at most {MAX_DEPTH})')
     def get(self, place_id):
         """Get place details by ID"""
          # Get place using facade
@@ -61,7 +119,7 @@ class PlaceResource(Resource):
             return {'error': 'Place not found'}, 404
         
         # Convert to dictionary and return
-        return place.to_dict(), 200
+        return place.to_dict(get_depth_arg()), 200
 
     @api.expect(place_model)
     @api.response(200, 'Place updated successfully')
@@ -1,5 +1,8 @@
 from flask_restx import Namespace, Resource, fields
+from flask import request
 from app.services import facade
+from app.api.v1.pagination import MAX_PAGE_SIZE, get_limit_arg
+from app.models.serializer import Serializer
 
 api = Namespace('reviews', description='Review operations')
 
@@ -28,7 +31,7 @@ class ReviewList(Resource):
     def get(self):
         """Retrieve a list of all reviews"""
         reviews = facade.get_all_reviews()
-        return [review.to_dict() for review in reviews], 200
+        return Serializer().dump_all(reviews), 200
 
 @api.route('/<review_id>')
 class ReviewResource(Resource):
@@ -69,11 +72,22 @@ class ReviewResource(Resource):
 @api.route('/places/<place_id>/reviews')
 class PlaceReviewList(Resource):
     @api.response(200, 'List of reviews for the place retrieved successfully')
+    @api.response(400, 'Invalid cursor')
     @api.response(404, 'Place not found')
+    @api.param('limit', f'Maximum number of reviews to return, at most {MAX_PAGE_SIZE} (all by default)')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('order', 'newest (default) or oldest first')
     def get(self, place_id):
-        """Get all reviews for a specific place"""
-        reviews = facade.get_reviews_by_place(place_id)
-        if reviews is None:
+        """Get reviews for a specific place"""
+        if not facade.get_place(place_id):
             return {'error': 'Place not found'}, 404
-        return [review.to_dict() for review in reviews], 200
+        limit = get_limit_arg()
+        cursor = request.args.get('cursor')
+        newest_first = request.args.get('order', 'newest') != 'oldest'
+        try:
+            reviews, next_cursor = facade.get_reviews_by_place(place_id, limit, cursor, newest_first)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+        return Serializer().dump_all(reviews), 200, headers
 
@@ -1,6 +1,9 @@
 from app.models.base_model import BaseModel
+from app.models.serializer import Serializer
 
 class Amenity(BaseModel):
+    FIELDS = ('name',)
+
     def __init__(self, name):
         super().__init__()
         if len(name) > 50:
@@ -9,12 +12,7 @@ class Amenity(BaseModel):
 
 
     def to_dict(self):
-        return {
-            'id': self.id,  # ✅ Ajout des deux-points
-            'name': self.name,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+        return Serializer().dump(self)
 
 
     def update(self, data):
@@ -2,6 +2,11 @@ import uuid
 from datetime import datetime
 
 class BaseModel:
+    # What app/models/serializer.py writes: plain attributes, nested relations, back references by id
+    FIELDS = ()
+    EMBEDS = ()
+    REFERENCES = ()
+
     def __init__(self):
         self.id = str(uuid.uuid4())
         self.created_at = datetime.now()
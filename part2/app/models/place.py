@@ -1,6 +1,10 @@
 from app.models.base_model import BaseModel
+from app.models.serializer import DEFAULT_DEPTH, Serializer
 
 class Place(BaseModel):
+    FIELDS = ('title', 'description', 'price', 'latitude', 'longitude')
+    EMBEDS = ('owner', 'amenities', 'reviews')
+
     def __init__(self, title, description, price, latitude, longitude, owner, amenities=None, reviews=None):
         super().__init__()
 
@@ -44,20 +48,8 @@ class Place(BaseModel):
         self.amenities.append(amenity)
 
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'price': self.price,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'owner': self.owner.to_dict() if self.owner else None,
-            'amenities': [amenity.to_dict() for amenity in self.amenities],
-            'reviews': [review.to_dict() for review in self.reviews],
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    def to_dict(self, max_depth=DEFAULT_DEPTH):
+        return Serializer(max_depth).dump(self)
 
 
     def update(self, data):
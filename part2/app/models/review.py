@@ -1,6 +1,12 @@
 from app.models.base_model import BaseModel
+from app.models.serializer import DEFAULT_DEPTH, Serializer
 
 class Review(BaseModel):
+    FIELDS = ('text', 'rating')
+    EMBEDS = ('user',)
+    # The place embeds its reviews, a review only points back to it
+    REFERENCES = ('place',)
+
     def __init__(self, text, rating, place, user):
         super().__init__()
         
@@ -25,16 +31,12 @@ class Review(BaseModel):
         self.place = place
         self.user = user
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'text': self.text,
-            'rating': self.rating,
-            'place': self.place.to_dict() if self.place else None,
-            'user': self.user.to_dict() if self.user else None,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    @property
+    def place_id(self):
+        return self.place.id
+
+    def to_dict(self, max_depth=DEFAULT_DEPTH):
+        return Serializer(max_depth).dump(self)
 
     def update(self, data):
         """Update review attributes with validation"""
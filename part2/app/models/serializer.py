@@ -0,0 +1,64 @@
+from app.models.base_model import BaseModel
+
+# Relations nested below the serialized object by default: place -> reviews -> user
+DEFAULT_DEPTH = 2
+MAX_DEPTH = 4
+
+
+class Serializer:
+    """Turns models and the objects they link to into JSON dicts, for one response.
+
+    A model lists its plain FIELDS, the relations it EMBEDS, and the REFERENCES back
+    to its parent (a review's place), written as <name>_id. Embedding stops after
+    max_depth levels; deeper objects and objects met again among their own ancestors
+    become {'id': ...}. An object is serialized once per depth and its dict reused
+    wherever it appears again in the response, so the work is linear in the output.
+    """
+
+    def __init__(self, max_depth=DEFAULT_DEPTH):
+        self.max_depth = max_depth
+        self._memo = {}         # (id(obj), depth) -> (obj, dict)
+        self._path = set()      # ids of the objects being serialized
+        self._cuts = 0          # cycles cut so far, their dicts depend on the path
+
+    def dump(self, obj, depth=0):
+        if not isinstance(obj, BaseModel):
+            # A plain value, or an id stored in place of the object
+            return obj
+        if depth > self.max_depth:
+            return {'id': obj.id}
+        if id(obj) in self._path:
+            self._cuts += 1
+            return {'id': obj.id}
+        key = (id(obj), depth)
+        memo = self._memo.get(key)
+        if memo is not None:
+            return memo[1]
+        cuts = self._cuts
+        self._path.add(id(obj))
+        try:
+            data = {'id': obj.id}
+            for name in type(obj).FIELDS:
+                data[name] = getattr(obj, name)
+            for name in type(obj).EMBEDS:
+                data[name] = self._relation(getattr(obj, name, None), depth + 1)
+            for name in type(obj).REFERENCES:
+                value = getattr(obj, name, None)
+                data[f'{name}_id'] = value.id if isinstance(value, BaseModel) else value
+            data['created_at'] = obj.created_at.isoformat()
+            data['updated_at'] = obj.updated_at.isoformat()
+        finally:
+            self._path.discard(id(obj))
+        if self._cuts == cuts:
+            # The object is kept so that its id is not reused by another one during the response
+            self._memo[key] = (obj, data)
+        return data
+
+    def _relation(self, value, depth):
+        if isinstance(value, (list, tuple)):
+            return [self.dump(item, depth) for item in value]
+        return self.dump(value, depth)
+
+    def dump_all(self, objs):
+        """Serializes a list, sharing the dicts of the objects it links to several times"""
+        return [self.dump(obj) for obj in objs]
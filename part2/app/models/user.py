@@ -1,6 +1,9 @@
 from app.models.base_model import BaseModel
+from app.models.serializer import Serializer
 
 class User(BaseModel):
+    FIELDS = ('first_name', 'last_name', 'email', 'is_admin')
+
     def __init__(self, first_name, last_name, email, password="", is_admin=False):
         super().__init__()
 
@@ -18,15 +21,7 @@ class User(BaseModel):
         self.is_admin = is_admin
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'email': self.email,
-            'is_admin': self.is_admin,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+        return Serializer().dump(self)
 
     def update(self, data):
         """Update user attributes"""
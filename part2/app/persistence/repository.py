@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
 
 class Repository(ABC):
     @abstractmethod
@@ -27,11 +29,64 @@ class Repository(ABC):
 
 
 class InMemoryRepository(Repository):
-    def __init__(self):
+    def __init__(self, unique_indexes=(), indexes=(), sorted_indexes=()):
         self._storage = {}
+        # attr -> {value: obj} for unique attributes, attr -> {value: {id: obj}} otherwise
+        self._unique_indexes = {attr: {} for attr in unique_indexes}
+        self._indexes = {attr: {} for attr in indexes}
+        # attr -> sorted list of (value, id), for range queries and ordered pages;
+        # (group_attr, attr) -> {group value: sorted list of (value, id)}, for ordered pages within a group
+        self._sorted_indexes = {name: {} if isinstance(name, tuple) else [] for name in sorted_indexes}
+
+    def _check_unique(self, obj_id, values):
+        """Raise if one of the values is already taken by another object"""
+        for attr, value in values.items():
+            if attr in self._unique_indexes:
+                owner = self._unique_indexes[attr].get(value)
+                if owner is not None and owner.id != obj_id:
+                    raise ValueError(f"{attr} '{value}' already exists")
+
+    def _sorted_keys(self, name, obj, create=False):
+        """The sorted (value, id) list of index name that obj belongs to, None if its group has none"""
+        keys = self._sorted_indexes[name]
+        if isinstance(name, tuple):
+            group = getattr(obj, name[0])
+            return keys.setdefault(group, []) if create else keys.get(group)
+        return keys
+
+    def _index(self, obj):
+        for attr, index in self._unique_indexes.items():
+            index[getattr(obj, attr)] = obj
+        for attr, index in self._indexes.items():
+            index.setdefault(getattr(obj, attr), {})[obj.id] = obj
+        for name in self._sorted_indexes:
+            attr = name[1] if isinstance(name, tuple) else name
+            insort(self._sorted_keys(name, obj, create=True), (getattr(obj, attr), obj.id))
+
+    def _unindex(self, obj):
+        for attr, index in self._unique_indexes.items():
+            index.pop(getattr(obj, attr), None)
+        for attr, index in self._indexes.items():
+            bucket = index.get(getattr(obj, attr))
+            if bucket is not None:
+                bucket.pop(obj.id, None)
+                if not bucket:
+                    del index[getattr(obj, attr)]
+        for name in self._sorted_indexes:
+            keys = self._sorted_keys(name, obj)
+            if keys is None:
+                continue
+            key = (getattr(obj, name[1] if isinstance(name, tuple) else name), obj.id)
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+            if not keys and isinstance(name, tuple):
+                del self._sorted_indexes[name][getattr(obj, name[0])]
 
     def add(self, obj):
+        self._check_unique(obj.id, {attr: getattr(obj, attr) for attr in self._unique_indexes})
         self._storage[obj.id] = obj
+        self._index(obj)
 
     def get(self, obj_id):
         return self._storage.get(obj_id)
@@ -42,11 +97,56 @@ class InMemoryRepository(Repository):
     def update(self, obj_id, data):
         obj = self.get(obj_id)
         if obj:
-            obj.update(data)
+            self._check_unique(obj_id, {attr: data[attr] for attr in self._unique_indexes if attr in data})
+            self._unindex(obj)
+            try:
+                obj.update(data)
+            finally:
+                self._index(obj)
+        return obj
 
     def delete(self, obj_id):
         if obj_id in self._storage:
-            del self._storage[obj_id]
+            self._unindex(self._storage.pop(obj_id))
 
     def get_by_attribute(self, attr_name, attr_value):
+        if attr_name in self._unique_indexes:
+            return self._unique_indexes[attr_name].get(attr_value)
+        if attr_name in self._indexes:
+            bucket = self._indexes[attr_name].get(attr_value)
+            return next(iter(bucket.values())) if bucket else None
         return next((obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value), None)
+
+    def get_all_by_attribute(self, attr_name, attr_value):
+        """Return every object whose attribute equals the value"""
+        if attr_name in self._unique_indexes:
+            obj = self._unique_indexes[attr_name].get(attr_value)
+            return [obj] if obj else []
+        if attr_name in self._indexes:
+            return list(self._indexes[attr_name].get(attr_value, {}).values())
+        return [obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value]
+
+    def iter_sorted_by_attribute(self, attr_name, low=None, high=None, descending=False, after_id=None,
+                                 within=None):
+        """Yield the objects whose attribute lies in [low, high], ordered by (attribute, id).
+
+        attr_name must be one of the sorted_indexes, or with within=(group_attr, value) the
+        attribute of a (group_attr, attr_name) one, yielding only that group. after_id resumes
+        just past that object, which is how a page cursor picks up where the previous page stopped.
+        """
+        if within is None:
+            keys = self._sorted_indexes[attr_name]
+        else:
+            keys = self._sorted_indexes[(within[0], attr_name)].get(within[1], [])
+        start = 0 if low is None else bisect_left(keys, low, key=itemgetter(0))
+        stop = len(keys) if high is None else bisect_right(keys, high, key=itemgetter(0))
+        if after_id is not None:
+            after = self._storage[after_id]
+            key = (getattr(after, attr_name), after.id)
+            if descending:
+                stop = min(stop, bisect_left(keys, key))
+            else:
+                start = max(start, bisect_right(keys, key))
+        positions = range(stop - 1, start - 1, -1) if descending else range(start, stop)
+        for position in positions:
+            yield self._storage[keys[position][1]]
@@ -1,5 +1,8 @@
 # app/services/facade.py
+import threading
+from itertools import islice
 from app.persistence.repository import InMemoryRepository
+from app.persistence.geo_index import GeoIndex
 from app.models.user import User
 from app.models.amenity import Amenity
 from app.models.place import Place
@@ -7,10 +10,25 @@ from app.models.review import Review
 
 class HBnBFacade:
     def __init__(self):
-        self.user_repo = InMemoryRepository()
-        self.place_repo = InMemoryRepository()
-        self.review_repo = InMemoryRepository()
+        self.user_repo = InMemoryRepository(unique_indexes=('email',))
+        self.place_repo = InMemoryRepository(sorted_indexes=('price', 'created_at'))
+        # Reviews of each place ordered by creation, for the review pages of a place
+        self.review_repo = InMemoryRepository(sorted_indexes=(('place_id', 'created_at'),))
         self.amenity_repo = InMemoryRepository()
+        # kNN index of the place coordinates, built on first use and then patched by the place endpoints below
+        self._place_index = None
+        self._place_index_lock = threading.Lock()
+
+    @property
+    def place_index(self):
+        """The kNN index of the place coordinates, built from the places stored when first needed"""
+        if self._place_index is None:
+            with self._place_index_lock:
+                if self._place_index is None:
+                    self._place_index = GeoIndex.from_points(
+                        (place.id, place.latitude, place.longitude) for place in self.place_repo.get_all()
+                    )
+        return self._place_index
 
     # User endpoints
     def create_user(self, user_data):
@@ -26,7 +44,7 @@ class HBnBFacade:
 
     def get_user_by_email(self, email):
         """Retrieves a user by email."""
-        # Note: get_by_attribute in InMemoryRepository is suitable here
+        # Note: email is a unique index of user_repo, so this is a dict lookup
         return self.user_repo.get_by_attribute('email', email)
 
     def get_all_users(self):
@@ -35,10 +53,7 @@ class HBnBFacade:
 
     def update_user(self, user_id, user_data):
         """Updates a user by ID."""
-        user = self.user_repo.get(user_id)
-        if user:
-            user.update(user_data)
-        return user
+        return self.user_repo.update(user_id, user_data)
 
     def delete_user(self, user_id):
         """Deletes a user by ID."""
@@ -103,6 +118,8 @@ class HBnBFacade:
         
         place = Place(**place_args)
         self.place_repo.add(place)
+        if self._place_index is not None:
+            self._place_index.put(place.id, place.latitude, place.longitude)
         return place
 
     def get_place(self, place_id):
@@ -141,11 +158,57 @@ class HBnBFacade:
                 new_amenities_objects.append(amenity)
             place_data['amenities'] = new_amenities_objects 
 
-        place.update(place_data) 
+        try:
+            # Through the repository, so the price index follows the new price
+            self.place_repo.update(place_id, place_data)
+        finally:
+            # A failed validation may still have changed one coordinate
+            if self._place_index is not None:
+                self._place_index.put(place.id, place.latitude, place.longitude)
         return place
 
+    # ?sort= values of the place list: (sorted index, descending)
+    PLACE_SORTS = {
+        'created_at': ('created_at', False),
+        '-created_at': ('created_at', True),
+        'price': ('price', False),
+        '-price': ('price', True),
+    }
+
+    def get_places_page(self, limit=None, cursor=None, min_price=None, max_price=None, sort='created_at'):
+        """Retrieves one page of places priced within [min_price, max_price] and the cursor of the next page.
+
+        sort is created_at, price, or either prefixed with - for descending. The cursor
+        is the id of the last place of the previous page.
+        """
+        if sort not in self.PLACE_SORTS:
+            raise ValueError(f"Cannot sort by {sort}, use one of: {', '.join(self.PLACE_SORTS)}")
+        if cursor and not self.place_repo.get(cursor):
+            raise ValueError("Invalid cursor")
+        attr, descending = self.PLACE_SORTS[sort]
+        if attr == 'price':
+            # The price bounds are a range of the price index
+            places = self.place_repo.iter_sorted_by_attribute('price', min_price, max_price, descending, cursor)
+        else:
+            places = (place for place in self.place_repo.iter_sorted_by_attribute(attr, None, None, descending, cursor)
+                      if (min_price is None or place.price >= min_price)
+                      and (max_price is None or place.price <= max_price))
+        if limit is None:
+            return list(places), None
+        page = list(islice(places, limit + 1))
+        if len(page) <= limit:
+            return page, None
+        return page[:limit], page[limit - 1].id
+
+    def get_nearby_places(self, lat, lon, k, max_km=None):
+        """Retrieves up to k (place, distance in km) pairs around a point, nearest first."""
+        return [(self.place_repo.get(place_id), distance)
+                for place_id, distance in self.place_index.nearest(lat, lon, k, max_km)]
+
     def delete_place(self, place_id):
         """Deletes a place by ID."""
+        if self._place_index is not None:
+            self._place_index.remove(place_id)
         return self.place_repo.delete(place_id)
 
     # Review endpoints
@@ -186,11 +249,23 @@ class HBnBFacade:
         """Retrieves all reviews."""
         return self.review_repo.get_all()
 
-    def get_reviews_by_place(self, place_id):
-        """Retrieves all reviews for a specific place."""
-        all_reviews = self.review_repo.get_all() 
-        filtered_reviews = [review for review in all_reviews if review.place and review.place.id == place_id]
-        return filtered_reviews
+    def get_reviews_by_place(self, place_id, limit=None, cursor=None, newest_first=True):
+        """Retrieves one page of the reviews of a place and the cursor of the next page.
+
+        The cursor is the id of the last review of the previous page.
+        """
+        if cursor:
+            after = self.review_repo.get(cursor)
+            if after is None or after.place_id != place_id:
+                raise ValueError("Invalid cursor")
+        reviews = self.review_repo.iter_sorted_by_attribute('created_at', descending=newest_first, after_id=cursor,
+                                                            within=('place_id', place_id))
+        if limit is None:
+            return list(reviews), None
+        page = list(islice(reviews, limit + 1))
+        if len(page) <= limit:
+            return page, None
+        return page[:limit], page[limit - 1].id
 
     def update_review(self, review_id, review_data):
         """Updates a review by ID."""
@@ -205,5 +280,16 @@ class HBnBFacade:
             review_data['user'] = user
             del review_data['user_id']
 
+        if 'place_id' in review_data:
+            place = self.place_repo.get(review_data['place_id'])
+            if not place:
+                raise ValueError(f"Place with ID {review_data['place_id']} not found.")
+            review_data['place'] = place
+            del review_data['place_id']
 
+        # Going through the repository keeps the place_id index in sync
+        return self.review_repo.update(review_id, review_data)
 
+    def delete_review(self, review_id):
+        """Deletes a review by ID."""
+        return self.review_repo.delete(review_id)
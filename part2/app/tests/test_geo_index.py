@@ -0,0 +1,74 @@
+import random
+import unittest
+import numpy as np
+from app.persistence.geo_index import GeoIndex, haversine_km
+from app.models.place import Place
+from app.services.facade import HBnBFacade
+
+
+class TestGeoIndex(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        points = [(i, rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(3000)]
+        index = GeoIndex.from_points(points, cell_deg=2.0)
+        lats = np.array([lat for _, lat, _ in points])
+        lons = np.array([lon for _, _, lon in points])
+        # Random points, plus the poles and both sides of the antimeridian
+        queries = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(50)]
+        queries += [(89.9, 179.9), (-89.9, -179.9), (0.0, 179.99), (0.0, -179.99)]
+        for lat, lon in queries:
+            for k, max_km in ((1, None), (15, None), (15, 1500.0)):
+                distances = haversine_km(lat, lon, lats, lons)
+                if max_km is not None:
+                    distances = distances[distances <= max_km]
+                expected = np.sort(distances)[:k]
+                found = [distance for _, distance in index.nearest(lat, lon, k, max_km)]
+                np.testing.assert_allclose(found, expected)
+
+    def test_put_moves_and_remove_drops(self):
+        index = GeoIndex()
+        index.put('a', 10.0, 10.0)
+        index.put('b', 10.5, 10.5)
+        index.put('a', -40.0, 170.0)
+        index.remove('b')
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.nearest(10.0, 10.0, 5)[0][0], 'a')
+        self.assertEqual(index.nearest(10.0, 10.0, 5, max_km=100), [])
+
+
+class TestFacadeNearby(unittest.TestCase):
+    def setUp(self):
+        self.facade = HBnBFacade()
+        owner = self.facade.create_user({'first_name': "Alice", 'last_name': "Dupont", 'email': "alice@mail.com"})
+        self.places = {
+            title: self.facade.create_place({'title': title, 'price': 10, 'latitude': lat, 'longitude': lon,
+                                             'owner_id': owner.id})
+            for title, lat, lon in (("Paris", 48.8566, 2.3522), ("Lyon", 45.7640, 4.8357),
+                                    ("Tokyo", 35.6762, 139.6503))
+        }
+
+    def titles(self, nearby):
+        return [place.title for place, _ in nearby]
+
+    def test_nearest_first(self):
+        self.assertEqual(self.titles(self.facade.get_nearby_places(48.85, 2.35, 3)), ["Paris", "Lyon", "Tokyo"])
+        self.assertEqual(self.titles(self.facade.get_nearby_places(48.85, 2.35, 3, max_km=500)), ["Paris", "Lyon"])
+
+    def test_follows_updates_and_deletes(self):
+        self.facade.update_place(self.places["Tokyo"].id, {'latitude': 48.86, 'longitude': 2.35})
+        self.facade.delete_place(self.places["Paris"].id)
+        self.assertEqual(self.titles(self.facade.get_nearby_places(48.85, 2.35, 2)), ["Tokyo", "Lyon"])
+
+
+    def test_built_on_first_use(self):
+        # Places stored before the first query, even straight into the repository, are indexed
+        self.assertIsNone(self.facade._place_index)
+        place = Place("Nice", "", 10, 43.70, 7.26, self.places["Paris"].owner)
+        self.facade.place_repo.add(place)
+        self.assertEqual(self.titles(self.facade.get_nearby_places(43.7, 7.2, 1)), ["Nice"])
+        self.facade.update_place(self.places["Lyon"].id, {'latitude': 43.71, 'longitude': 7.27})
+        self.assertEqual(self.titles(self.facade.get_nearby_places(43.71, 7.27, 1)), ["Lyon"])
+
+
+if __name__ == "__main__":
+    unittest.main()
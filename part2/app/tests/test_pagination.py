@@ -0,0 +1,52 @@
+import unittest
+from app import create_app
+from app.api.v1.pagination import MAX_PAGE_SIZE
+from app.services import facade
+
+
+class TestPageLimits(unittest.TestCase):
+    def setUp(self):
+        self.client = create_app().test_client()
+        self.owner = facade.create_user({'first_name': 'Ada', 'last_name': 'Owner',
+                                         'email': f'ada{id(self)}@example.com'})
+        self.places = [facade.create_place({'title': f'Place {i}', 'description': 'Quiet', 'price': 50.0 + i,
+                                            'latitude': 45.0, 'longitude': 3.0, 'owner_id': self.owner.id})
+                       for i in range(3)]
+        for i in range(3):
+            facade.create_review({'text': f'Review {i}', 'rating': 4, 'user_id': self.owner.id,
+                                  'place_id': self.places[0].id})
+
+    def tearDown(self):
+        for place in self.places:
+            facade.delete_place(place.id)
+
+    def titles(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [place['title'] for place in response.json if place['owner']['id'] == self.owner.id]
+
+    def test_zero_and_negative_limits_read_one_place(self):
+        for limit in (0, -1, -50):
+            response = self.client.get(f'/api/v1/places/?sort=price&min_price=50&max_price=52&limit={limit}')
+            self.assertEqual(self.titles(response), ['Place 0'])
+            # The cursor resumes right after the place returned, none is skipped
+            cursor = response.headers['X-Next-Cursor']
+            rest = self.client.get(f'/api/v1/places/?sort=price&min_price=50&max_price=52&cursor={cursor}')
+            self.assertEqual(self.titles(rest), ['Place 1', 'Place 2'])
+
+    def test_review_limits(self):
+        url = f'/api/v1/reviews/places/{self.places[0].id}/reviews'
+        for limit in (0, -3):
+            response = self.client.get(f'{url}?limit={limit}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json), 1)
+            rest = self.client.get(f"{url}?cursor={response.headers['X-Next-Cursor']}")
+            self.assertEqual(len(rest.json), 2)
+
+    def test_limit_is_capped(self):
+        response = self.client.get(f'/api/v1/places/?limit={MAX_PAGE_SIZE * 10}')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.json), MAX_PAGE_SIZE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from app.persistence.repository import InMemoryRepository
+from datetime import datetime, timedelta
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app import create_app
+from app.services import facade
+from app.services.facade import HBnBFacade
+
+
+class TestInMemoryRepositoryIndexes(unittest.TestCase):
+    def setUp(self):
+        self.repo = InMemoryRepository(unique_indexes=('email',), indexes=('last_name',))
+        self.alice = User("Alice", "Dupont", "alice@mail.com")
+        self.bob = User("Bob", "Dupont", "bob@mail.com")
+        self.repo.add(self.alice)
+        self.repo.add(self.bob)
+
+    def test_unique_lookup(self):
+        self.assertIs(self.repo.get_by_attribute('email', "alice@mail.com"), self.alice)
+        self.assertIsNone(self.repo.get_by_attribute('email', "nobody@mail.com"))
+
+    def test_unique_violation(self):
+        with self.assertRaises(ValueError):
+            self.repo.add(User("Alice", "Bis", "alice@mail.com"))
+        with self.assertRaises(ValueError):
+            self.repo.update(self.bob.id, {'email': "alice@mail.com"})
+        self.assertEqual(self.bob.email, "bob@mail.com")
+
+    def test_bucket_lookup(self):
+        bucket = self.repo.get_all_by_attribute('last_name', "Dupont")
+        self.assertEqual({u.id for u in bucket}, {self.alice.id, self.bob.id})
+
+    def test_update_moves_entries(self):
+        self.repo.update(self.alice.id, {'email': "alice@new.com", 'last_name': "Martin"})
+        self.assertIsNone(self.repo.get_by_attribute('email', "alice@mail.com"))
+        self.assertIs(self.repo.get_by_attribute('email', "alice@new.com"), self.alice)
+        self.assertEqual(self.repo.get_all_by_attribute('last_name', "Dupont"), [self.bob])
+        self.assertEqual(self.repo.get_all_by_attribute('last_name', "Martin"), [self.alice])
+
+    def test_delete_removes_entries(self):
+        self.repo.delete(self.alice.id)
+        self.assertIsNone(self.repo.get_by_attribute('email', "alice@mail.com"))
+        self.assertEqual(self.repo.get_all_by_attribute('last_name', "Dupont"), [self.bob])
+
+
+
+class TestInMemoryRepositorySortedIndexes(unittest.TestCase):
+    def setUp(self):
+        self.repo = InMemoryRepository(sorted_indexes=('first_name',))
+        self.users = [User(name, "Dupont", f"{name.lower()}@mail.com") for name in ("Eve", "Bob", "Dan", "Amy", "Cid")]
+        for user in self.users:
+            self.repo.add(user)
+
+    def names(self, users):
+        return [user.first_name for user in users]
+
+    def test_range_in_order(self):
+        self.assertEqual(self.names(self.repo.iter_sorted_by_attribute('first_name')), ["Amy", "Bob", "Cid", "Dan", "Eve"])
+        self.assertEqual(self.names(self.repo.iter_sorted_by_attribute('first_name', "B", "D", descending=True)),
+                         ["Cid", "Bob"])
+
+    def test_resume_after(self):
+        bob = self.users[1]
+        self.assertEqual(self.names(self.repo.iter_sorted_by_attribute('first_name', after_id=bob.id)),
+                         ["Cid", "Dan", "Eve"])
+        self.assertEqual(self.names(self.repo.iter_sorted_by_attribute('first_name', descending=True, after_id=bob.id)),
+                         ["Amy"])
+
+    def test_update_and_delete_follow(self):
+        self.repo.update(self.users[0].id, {'first_name': "Abe"})
+        self.repo.delete(self.users[3].id)
+        self.assertEqual(self.names(self.repo.iter_sorted_by_attribute('first_name')), ["Abe", "Bob", "Cid", "Dan"])
+
+class TestReviewPages(unittest.TestCase):
+    def setUp(self):
+        self.facade = HBnBFacade()
+        self.guest = User("Bob", "Guest", "bob@mail.com")
+        self.facade.user_repo.add(self.guest)
+        self.places = [Place(f"Place {i}", "Quiet", 50.0, 45.0, 3.0, self.guest) for i in range(2)]
+        start = datetime(2024, 1, 1)
+        self.reviews = []
+        for i in range(6):
+            place = self.places[i % 2]
+            review = Review(f"Review {i}", 4, place, self.guest)
+            review.created_at = start + timedelta(minutes=i)
+            self.facade.review_repo.add(review)
+            self.reviews.append(review)
+
+    def texts(self, reviews):
+        return [review.text for review in reviews]
+
+    def test_pages_newest_first_within_the_place(self):
+        place_id = self.places[0].id
+        page, cursor = self.facade.get_reviews_by_place(place_id, 2)
+        self.assertEqual(self.texts(page), ["Review 4", "Review 2"])
+        page, cursor = self.facade.get_reviews_by_place(place_id, 2, cursor)
+        self.assertEqual((self.texts(page), cursor), (["Review 0"], None))
+        oldest, _ = self.facade.get_reviews_by_place(place_id, None, newest_first=False)
+        self.assertEqual(self.texts(oldest), ["Review 0", "Review 2", "Review 4"])
+
+    def test_edited_review_keeps_its_place(self):
+        self.facade.review_repo.update(self.reviews[0].id, {'text': "Edited"})
+        page, _ = self.facade.get_reviews_by_place(self.places[0].id)
+        self.assertEqual(self.texts(page), ["Review 4", "Review 2", "Edited"])
+        self.facade.review_repo.delete(self.reviews[2].id)
+        page, _ = self.facade.get_reviews_by_place(self.places[0].id)
+        self.assertEqual(self.texts(page), ["Review 4", "Edited"])
+
+    def test_unknown_cursor(self):
+        for cursor in ("unknown", self.reviews[1].id):
+            with self.assertRaises(ValueError):
+                self.facade.get_reviews_by_place(self.places[0].id, 2, cursor)
+
+    def test_unknown_cursor_is_a_bad_request(self):
+        owner = facade.create_user({'first_name': 'Ada', 'last_name': 'Owner', 'email': f'ada{id(self)}@mail.com'})
+        place = facade.create_place({'title': 'Loft', 'description': 'Quiet', 'price': 80.0,
+                                     'latitude': 45.0, 'longitude': 3.0, 'owner_id': owner.id})
+        try:
+            response = create_app().test_client().get(f'/api/v1/reviews/places/{place.id}/reviews?cursor=unknown')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json, {'error': 'Invalid cursor'})
+        finally:
+            facade.delete_place(place.id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from app import create_app
+from app.models.amenity import Amenity
+from app.models.place import Place
+from app.models.review import Review
+from app.models.serializer import Serializer
+from app.models.user import User
+from app.services import facade
+
+
+class TestSerializer(unittest.TestCase):
+    def setUp(self):
+        self.owner = User("Ada", "Owner", "ada@example.com")
+        self.guest = User("Bob", "Guest", "bob@example.com")
+        self.wifi = Amenity("WiFi")
+        self.places = [Place(f"Place {i}", "Quiet", 50.0 + i, 45.0, 3.0, self.owner) for i in range(3)]
+        for place in self.places:
+            place.add_amenity(self.wifi)
+            place.add_review(Review("Nice", 4, place, self.guest))
+
+    def test_reviewed_place_is_finite(self):
+        place = self.places[0]
+        data = place.to_dict()
+        review = data['reviews'][0]
+        self.assertEqual(review['place_id'], place.id)
+        self.assertNotIn('place', review)
+        self.assertEqual(review['user']['email'], "bob@example.com")
+        self.assertEqual(data['owner']['first_name'], "Ada")
+        self.assertEqual(place.reviews[0].to_dict()['place_id'], place.id)
+
+    def test_depth_limits_nesting(self):
+        place = self.places[0]
+        self.assertEqual(place.to_dict(0)['owner'], {'id': self.owner.id})
+        self.assertEqual(place.to_dict(1)['reviews'][0]['user'], {'id': self.guest.id})
+        self.assertEqual(place.to_dict(2)['reviews'][0]['user']['last_name'], "Guest")
+
+    def test_shared_objects_are_serialized_once(self):
+        serializer = Serializer()
+        data = serializer.dump_all(self.places)
+        self.assertIs(data[0]['owner'], data[2]['owner'])
+        self.assertIs(data[0]['amenities'][0], data[1]['amenities'][0])
+        self.assertIs(data[0]['reviews'][0]['user'], data[1]['reviews'][0]['user'])
+        # places, owner, amenity, guest, reviews: one entry each
+        self.assertEqual(len(serializer._memo), 3 + 1 + 1 + 1 + 3)
+
+    def test_cycle_becomes_reference(self):
+        place = self.places[0]
+        place.amenities.append(place)
+        data = place.to_dict()
+        self.assertEqual(data['amenities'][1], {'id': place.id})
+
+
+class TestPlacesApi(unittest.TestCase):
+    def setUp(self):
+        self.client = create_app().test_client()
+        self.owner = facade.create_user({'first_name': 'Ada', 'last_name': 'Owner',
+                                         'email': f'ada{id(self)}@example.com'})
+        self.place = facade.create_place({'title': 'Loft', 'description': 'Quiet', 'price': 80.0,
+                                          'latitude': 45.0, 'longitude': 3.0, 'owner_id': self.owner.id})
+        review = facade.create_review({'text': 'Nice', 'rating': 5, 'user_id': self.owner.id,
+                                       'place_id': self.place.id})
+        self.place.add_review(review)
+
+    def tearDown(self):
+        facade.delete_place(self.place.id)
+
+    def test_reviewed_place_in_list_and_detail(self):
+        response = self.client.get('/api/v1/places/')
+        self.assertEqual(response.status_code, 200)
+        place = next(place for place in response.json if place['id'] == self.place.id)
+        self.assertEqual(place['reviews'][0]['place_id'], self.place.id)
+        detail = self.client.get(f'/api/v1/places/{self.place.id}?depth=0').json
+        self.assertEqual(detail['reviews'][0], {'id': self.place.reviews[0].id})
+
+
+if __name__ == "__main__":
+    unittest.main()
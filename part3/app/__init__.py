@@ -8,6 +8,37 @@ bcrypt = Bcrypt()
 jwt = JWTManager()
 db = SQLAlchemy()
 
+# Keep the repositories' entity caches in sync with every committed write
+from app.persistence.cache import register_invalidation
+register_invalidation(db.session)
+# Keep the in-memory kNN index of the places in step with committed writes
+from app.persistence.spatial import register_geo_index_sync
+register_geo_index_sync(db.session)
+# Keep the amenity bitmaps of the places in step with committed link changes
+from app.persistence.bitmaps import register_bitmap_sync
+register_bitmap_sync(db.session)
+# Keep the review aggregates of the places in step with every review write, in the same transaction
+from app.persistence.ratings import register_rating_sync
+register_rating_sync(db.session, db.metadata)
+# Keep the place facet counters in step with committed prices and ratings, after the aggregates they read
+from app.persistence.facets import register_facet_sync
+register_facet_sync(db.session)
+# Keep the trending and top-rated leaderboards in step with committed reviews
+from app.persistence.leaderboard import register_leaderboard_sync
+register_leaderboard_sync(db.session)
+# Keep the autocomplete prefix indexes in step with committed titles, names and their popularity
+from app.persistence.autocomplete import register_autocomplete_sync
+register_autocomplete_sync(db.session)
+# Keep the similarity vectors of the places in step with committed places and amenity links
+from app.persistence.similarity import register_vector_sync
+register_vector_sync(db.session)
+# Keep the map cluster grid of the places in step with committed coordinates and prices
+from app.persistence.clusters import register_cluster_sync
+register_cluster_sync(db.session)
+# Keep the per-table change counters behind the list ETags in step with committed writes
+from app.persistence.versions import register_version_sync
+register_version_sync(db.session)
+
 def create_app(config_class="config.DevelopmentConfig"):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -22,8 +53,14 @@ def create_app(config_class="config.DevelopmentConfig"):
     from app.api.v1.places import api as places_ns
     from app.api.v1.reviews import api as reviews_ns
     from app.api.v1.auth import api as auth_ns
+    from app.api.v1.autocomplete import api as autocomplete_ns
+    from app.api.v1.admin import admin_ns
+    from app.utils.passwords import HasherBusy
+    from app.utils.serializer import output_json
 
     api = Api(app, version='1.0', title='HBnB API', description='HBnB Application API')
+    # Responses are encoded straight to bytes, by orjson when it is installed
+    api.representations['application/json'] = output_json
 
     # Register the users namespace
     api.add_namespace(users_ns, path='/api/v1/users')
@@ -35,5 +72,100 @@ def create_app(config_class="config.DevelopmentConfig"):
     api.add_namespace(reviews_ns, path='/api/v1/reviews')
     # Register the auth namespace
     api.add_namespace(auth_ns, path='/api/v1/auth')
+    # Register the autocomplete namespace
+    api.add_namespace(autocomplete_ns, path='/api/v1/autocomplete')
+    # Register the admin namespace
+    api.add_namespace(admin_ns, path='/api/v1/admin')
+
+    @api.errorhandler(HasherBusy)
+    def handle_hasher_busy(error):
+        """The bcrypt pool is saturated, ask the client to retry"""
+        return {'error': str(error)}, 503, {'Retry-After': '1'}
+
+    if app.config.get('CHECK_SCHEMA_INDEXES'):
+        check_schema_indexes(app)
+    if app.config.get('PLACE_RTREE'):
+        install_spatial_index(app)
+    if app.config.get('FULL_TEXT_SEARCH'):
+        install_search_index(app)
+    if app.config.get('GEO_INDEX_PRELOAD'):
+        load_geo_index(app)
+    if app.config.get('AUTOCOMPLETE_PRELOAD'):
+        load_autocomplete(app)
+
+    from app.commands import register_commands
+    register_commands(app)
 
     return app
+
+def check_schema_indexes(app):
+    """Warns about model indexes missing from the database (created before they were declared)"""
+    from sqlalchemy.exc import SQLAlchemyError
+    from app.persistence.schema import missing_indexes
+
+    with app.app_context():
+        try:
+            missing = missing_indexes(db.engine, db.metadata)
+        except SQLAlchemyError as e:
+            app.logger.warning("Could not inspect the database indexes: %s", e)
+            return
+    for table, index in missing:
+        app.logger.warning("Index %s on table %s is declared on the model but missing from the database", index, table)
+
+def install_spatial_index(app):
+    """Adds the places R*Tree to a database created before it existed (new ones get it from create_all)"""
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import SQLAlchemyError
+    from app.persistence.spatial import install_place_rtree
+
+    with app.app_context():
+        try:
+            if inspect(db.engine).has_table('places'):
+                with db.engine.begin() as connection:
+                    install_place_rtree(connection)
+        except SQLAlchemyError as e:
+            app.logger.warning("Could not install the places R*Tree: %s", e)
+
+def install_search_index(app):
+    """Adds the full-text indexes to a database created before they existed (new ones get them from create_all)"""
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import SQLAlchemyError
+    from app.persistence.search import PLACES_FTS, REVIEWS_FTS
+
+    with app.app_context():
+        try:
+            tables = set(inspect(db.engine).get_table_names())
+            with db.engine.begin() as connection:
+                for index in (PLACES_FTS, REVIEWS_FTS):
+                    if index.content in tables:
+                        index.install(connection)
+        except SQLAlchemyError as e:
+            app.logger.warning("Could not install the full-text indexes: %s", e)
+
+def load_geo_index(app):
+    """Builds the places kNN index at startup rather than on the first /places/nearby"""
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import SQLAlchemyError
+    from app.services import facade
+
+    with app.app_context():
+        try:
+            if inspect(db.engine).has_table('places'):
+                facade.place_repo.geo_index()
+        except SQLAlchemyError as e:
+            app.logger.warning("Could not load the places kNN index: %s", e)
+
+def load_autocomplete(app):
+    """Builds the autocomplete prefix indexes at startup rather than on the first keystroke"""
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import SQLAlchemyError
+    from app.services import facade
+
+    with app.app_context():
+        try:
+            tables = set(inspect(db.engine).get_table_names())
+            if {'places', 'amenities', 'place_amenities'} <= tables:
+                facade.place_repo.title_index()
+                facade.amenity_repo.name_index()
+        except SQLAlchemyError as e:
+            app.logger.warning("Could not load the autocomplete indexes: %s", e)
@@ -1,20 +1,19 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request
-from app.services.facade import HBnBFacade
+from app.services import facade
 from app.utils.decorators import admin_required
+from app.utils.streaming import stream_list
 
 admin_ns = Namespace('admin', description='Admin operations')
 
-facade = HBnBFacade()
-
 @admin_ns.route('/users')
 class AdminUserList(Resource):
     @admin_required
     def get(self):
-        """Lists all users with admin details"""
+        """Lists all users with admin details, streamed (NDJSON with Accept: application/x-ndjson)"""
         try:
-            users = facade.get_all_users()
-            return [user.to_dict() for user in users], 200
+            users, _ = facade.get_users_page(None)
+            return stream_list(users, lambda user: user.to_dict())
         except Exception as e:
             return {'error': str(e)}, 500
 
@@ -36,10 +35,10 @@ class AdminUserDetail(Resource):
 class AdminPlaceList(Resource):
     @admin_required
     def get(self):
-        """Lists all locations with admin details"""
+        """Lists all locations with admin details, streamed (NDJSON with Accept: application/x-ndjson)"""
         try:
-            places = facade.get_all_places()
-            return [place.to_dict() for place in places], 200
+            places, _ = facade.get_places_page(None)
+            return stream_list(places, lambda place: place.to_dict())
         except Exception as e:
             return {'error': str(e)}, 500
 
@@ -1,6 +1,10 @@
 from flask_restx import Namespace, Resource, fields
 from app.services import facade
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from app.utils.pagination import get_page_args, page_headers
+from app.utils.fields import get_fields_args, row_to_dict
+from app.utils.streaming import stream_ndjson, wants_ndjson
+from app.utils.conditional import conditional, entity_tag, list_tag
 
 api = Namespace('amenities', description='Amenity operations')
 
@@ -29,27 +33,48 @@ class AmenityList(Resource):
         }, 201
 
     @api.response(200, 'List of amenities retrieved successfully')
+    @api.response(400, 'Invalid cursor')
+    @api.param('limit', 'Maximum number of amenities to return')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('fields', 'Comma-separated fields to return (default: id,name)')
     def get(self):
-        """Retrieve a list of all amenities"""
-        amenities = facade.get_all_amenities()
-        return [
-            {"id": amenity.id, "name": amenity.name} 
-            for amenity in amenities
-        ], 200
+        """Retrieve one page of amenities, or every amenity from the cursor on with Accept: application/x-ndjson"""
+        limit, cursor = get_page_args()
+        fields = get_fields_args(default=('id', 'name'))
+        stream = wants_ndjson()
+        headers, not_modified = conditional(list_tag('amenities'))
+        if not_modified:
+            return not_modified
+        try:
+            rows, next_cursor = facade.get_amenities_page(None if stream else limit, cursor, fields)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if stream:
+            response = stream_ndjson(rows, lambda row: row_to_dict(row, fields))
+            response.headers.extend(headers)
+            return response
+        headers.update(page_headers(next_cursor))
+        return [row_to_dict(row, fields) for row in rows], 200, headers
 
 @api.route('/<amenity_id>')
 class AmenityResource(Resource):
     @api.response(200, 'Amenity details retrieved successfully')
     @api.response(404, 'Amenity not found')
     def get(self, amenity_id):
-        """Get amenity details by ID"""
+        """Get amenity details by ID, or 304 Not Modified when the If-None-Match or If-Modified-Since copy is current"""
+        stamp = facade.get_amenity_stamp(amenity_id)
+        if stamp is None:
+            return {'error': 'Amenity not found'}, 404
+        headers, not_modified = conditional(entity_tag(stamp.id, stamp.updated_at), stamp.updated_at)
+        if not_modified:
+            return not_modified
         amenity = facade.get_amenity(amenity_id)
         if not amenity:
             return {'error': 'Amenity not found'}, 404
         return {
             "id": amenity.id, 
             "name": amenity.name
-        }, 200
+        }, 200, headers
 
     @api.expect(amenity_model, validate=True)
     @api.response(200, 'Amenity updated successfully')
@@ -63,12 +88,8 @@ class AmenityResource(Resource):
         if not claims.get('is_admin'):
             return {'error': 'Admin privileges required'}, 403
         amenity_data = api.payload
-        amenity = facade.get_amenity(amenity_id)
-        if not amenity:
+        # One UPDATE ... RETURNING, no row means the amenity does not exist
+        row = facade.update_amenity_returning(amenity_id, amenity_data, fields=('id', 'name'))
+        if not row:
             return {'error': 'Amenity not found'}, 404
-        
-        updated_amenity = facade.update_amenity(amenity_id, amenity_data)
-        return {
-            "id": updated_amenity.id, 
-            "name": updated_amenity.name
-        }, 200
+        return row_to_dict(row, ('id', 'name')), 200
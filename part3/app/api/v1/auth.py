@@ -24,6 +24,9 @@ class Login(Resource):
        if not user or not user.verify_password(credentials['password']):
            return {'error': 'Invalid credentials'}, 401
 
+       # Upgrade the stored hash if BCRYPT_LOG_ROUNDS changed since it was made
+       facade.rehash_password_if_needed(user, credentials['password'])
+
        # Step 3: Create a JWT token with the user's id and is_admin flag
        access_token = create_access_token(
            identity=str(user.id),
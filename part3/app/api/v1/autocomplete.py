@@ -0,0 +1,21 @@
+from flask_restx import Namespace, Resource
+from flask import request
+from app.services import facade
+from app.persistence.autocomplete import MAX_LIMIT
+
+api = Namespace('autocomplete', description='Typeahead suggestions')
+
+@api.route('/')
+class Autocomplete(Resource):
+    @api.response(200, 'Suggestions retrieved successfully')
+    @api.response(400, 'Invalid type')
+    @api.param('q', 'Beginning of a word of the title or name', required=True)
+    @api.param('type', 'place (default) or amenity')
+    @api.param('limit', f'Maximum number of suggestions, at most {MAX_LIMIT} (default 10)')
+    def get(self):
+        """Suggest places or amenities as the user types, most popular first"""
+        limit = max(1, min(request.args.get('limit', 10, type=int), MAX_LIMIT))
+        try:
+            return facade.autocomplete(request.args.get('q', ''), request.args.get('type', 'place'), limit), 200
+        except ValueError as e:
+            return {'error': str(e)}, 400
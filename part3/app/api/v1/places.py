@@ -1,6 +1,13 @@
 from flask_restx import Namespace, Resource, fields
+from flask import current_app, request
 from app.services import facade
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from app.utils.pagination import get_page_args, page_headers
+from app.utils.fields import get_fields_args, row_to_dict
+from app.utils.streaming import stream_ndjson, wants_ndjson
+from app.utils.conditional import conditional, entity_tag, list_tag, table_stamp
+from app.models.place import Place
+from app.persistence.spatial import parse_bbox
 api = Namespace('places', description='Place operations')
 
 # Define the models for related entities
@@ -27,6 +34,21 @@ place_model = api.model('Place', {
     'amenities': fields.List(fields.String, required=True, description="List of amenities ID's")
 })
 
+def get_expand_args():
+    """Reads ?expand=owner,amenities,reviews from the query string"""
+    return tuple(name.strip() for name in request.args.get('expand', '').split(',') if name.strip())
+
+# Tables read by each relation of ?expand=
+EXPAND_TABLES = {'owner': 'users', 'amenities': 'amenities', 'reviews': 'reviews'}
+
+def expanded_tables(expand):
+    """Tables a place response is read from besides places"""
+    return tuple(EXPAND_TABLES[name] for name in expand if name in EXPAND_TABLES)
+
+def get_id_list_arg(name):
+    """Reads a comma-separated list of ids such as ?amenities=id1,id2"""
+    return tuple(obj_id.strip() for obj_id in request.args.get(name, '').split(',') if obj_id.strip())
+
 @api.route('/')
 class PlaceList(Resource):
     @api.expect(place_model)
@@ -48,26 +70,215 @@ class PlaceList(Resource):
             return {'error': str(e)}, 400
 
     @api.response(200, 'List of places retrieved successfully')
+    @api.response(400, 'Invalid cursor or sort')
+    @api.param('limit', 'Maximum number of places to return')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('expand', 'Comma-separated relations to nest: owner, amenities, reviews')
+    @api.param('fields', 'Comma-separated fields to return, e.g. id,title,price')
+    @api.param('min_price', 'Only places priced at least this much per night')
+    @api.param('max_price', 'Only places priced at most this much per night')
+    @api.param('sort', 'created_at (default), price, rating, or any prefixed with - for descending')
+    @api.param('amenities', 'Comma-separated amenity ids the places must all have')
+    @api.param('amenities_any', 'Comma-separated amenity ids the places must have at least one of')
     def get(self):
-        """Retrieve a list of all places"""
-        # Get all places using facade
-        places = facade.get_all_places()
+        """Retrieve one page of places, or every place from the cursor on with Accept: application/x-ndjson"""
+        limit, cursor = get_page_args()
+        stream = wants_ndjson()
+        expand = get_expand_args()
+        fields = get_fields_args()
+        min_price = request.args.get('min_price', type=float)
+        max_price = request.args.get('max_price', type=float)
+        sort = request.args.get('sort', 'created_at')
+        amenities = get_id_list_arg('amenities')
+        amenities_any = get_id_list_arg('amenities_any')
+        headers, not_modified = conditional(list_tag('places', *expanded_tables(expand)))
+        if not_modified:
+            return not_modified
+        try:
+            # Get one page of places using facade
+            places, next_cursor = facade.get_places_page(None if stream else limit, cursor, expand, fields,
+                                                         min_price, max_price, sort, amenities, amenities_any)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if stream:
+            response = stream_ndjson(places, (lambda row: row_to_dict(row, fields)) if fields else
+                                     (lambda place: place.to_dict(expand)))
+            response.headers.extend(headers)
+            return response
+        headers.update(page_headers(next_cursor))
+        if fields:
+            # Projected rows, not Place instances
+            return [row_to_dict(row, fields) for row in places], 200, headers
         # Convert to list of dictionaries
-        return [place.to_dict() for place in places], 200
+        return [place.to_dict(expand) for place in places], 200, headers
+
+@api.route('/facets')
+class PlaceFacets(Resource):
+    @api.response(200, 'Places and facet counts retrieved successfully')
+    @api.response(400, 'Invalid cursor or sort')
+    @api.param('limit', 'Maximum number of places to return')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('min_price', 'Only places priced at least this much per night')
+    @api.param('max_price', 'Only places priced at most this much per night')
+    @api.param('sort', 'created_at (default), price, rating, or any prefixed with - for descending')
+    @api.param('amenities', 'Comma-separated amenity ids the places must all have')
+    @api.param('amenities_any', 'Comma-separated amenity ids the places must have at least one of')
+    def get(self):
+        """Retrieve one page of places with the counts per amenity, price and rating under the same filters"""
+        limit, cursor = get_page_args()
+        min_price = request.args.get('min_price', type=float)
+        max_price = request.args.get('max_price', type=float)
+        sort = request.args.get('sort', 'created_at')
+        amenities = get_id_list_arg('amenities')
+        amenities_any = get_id_list_arg('amenities_any')
+        try:
+            places, next_cursor = facade.get_places_page(limit, cursor, min_price=min_price, max_price=max_price,
+                                                         sort=sort, amenities=amenities, amenities_any=amenities_any)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        facets = facade.get_place_facets(min_price, max_price, amenities, amenities_any)
+        return {'places': [place.to_dict() for place in places], 'facets': facets}, 200, page_headers(next_cursor)
+
+def best_places(kind):
+    """Response of /places/top and /places/trending"""
+    window = request.args.get('window', '7d')
+    limit = get_page_args()[0]
+    try:
+        best = facade.get_best_places(kind, window, limit)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return [dict(place.to_dict(), score=round(score, 6)) for place, score in best], 200
+
+@api.route('/top')
+class PlaceTop(Resource):
+    @api.response(200, 'Best rated places retrieved successfully')
+    @api.response(400, 'Unknown window')
+    @api.param('window', 'Decay time constant of the scores: 24h, 7d (default) or 30d')
+    @api.param('limit', 'Maximum number of places to return')
+    def get(self):
+        """Retrieve the places with the most stars from recent reviews, best first"""
+        return best_places('top')
+
+@api.route('/trending')
+class PlaceTrending(Resource):
+    @api.response(200, 'Trending places retrieved successfully')
+    @api.response(400, 'Unknown window')
+    @api.param('window', 'Decay time constant of the scores: 24h, 7d (default) or 30d')
+    @api.param('limit', 'Maximum number of places to return')
+    def get(self):
+        """Retrieve the places with the most recent reviews, best first"""
+        return best_places('trending')
+
+@api.route('/search')
+class PlaceSearch(Resource):
+    @api.response(200, 'Matching places retrieved successfully')
+    @api.response(400, 'Invalid q, bbox or cursor')
+    @api.param('q', 'Free text searched in titles and descriptions, best match first')
+    @api.param('bbox', 'minLon,minLat,maxLon,maxLat (minLon > maxLon crosses the antimeridian)')
+    @api.param('limit', 'Maximum number of places to return')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('fields', 'Comma-separated fields to return, e.g. id,title,latitude,longitude (bbox only)')
+    def get(self):
+        """Retrieve one page of the places matching a text and/or inside a bounding box"""
+        limit, cursor = get_page_args()
+        fields = get_fields_args()
+        q = request.args.get('q')
+        try:
+            if q is None and request.args.get('bbox') is None:
+                raise ValueError("q or bbox is required")
+            bbox = parse_bbox(request.args['bbox']) if 'bbox' in request.args else None
+            if q is not None:
+                if fields:
+                    raise ValueError("fields cannot be combined with q")
+                matches, next_cursor = facade.search_places_text(q, limit, cursor, bbox)
+                # highlight holds the title and a snippet of the description, HTML-escaped, matches in <mark>
+                return [dict(place.to_dict(), highlight=highlight) for place, highlight in matches], 200, \
+                    page_headers(next_cursor)
+            places, next_cursor = facade.search_places_page(bbox, limit, cursor, fields)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if fields:
+            return [row_to_dict(row, fields) for row in places], 200, page_headers(next_cursor)
+        return [place.to_dict() for place in places], 200, page_headers(next_cursor)
+
+@api.route('/clusters')
+class PlaceClusters(Resource):
+    @api.response(200, 'Clusters retrieved successfully')
+    @api.response(400, 'Invalid bbox or zoom')
+    @api.param('bbox', 'minLon,minLat,maxLon,maxLat of the map view', required=True)
+    @api.param('zoom', 'Map zoom level, 0 shows the whole world in one tile', required=True)
+    def get(self):
+        """Retrieve the centroid, count and lowest price of the places of every grid cell in a map view"""
+        try:
+            bbox = parse_bbox(request.args.get('bbox'))
+            zoom = request.args.get('zoom', type=int)
+            if zoom is None or zoom < 0:
+                raise ValueError("zoom must be a positive integer")
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return facade.get_place_clusters(bbox, zoom), 200
+
+def get_nearby_args():
+    """Reads ?lat=&lon=&k=&max_km= for /places/nearby, raises ValueError when they are invalid"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+    except (KeyError, ValueError):
+        raise ValueError("lat and lon are required numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat must be between -90 and 90, lon between -180 and 180")
+    k = request.args.get('k', 10, type=int)
+    max_km = request.args.get('max_km', type=float)
+    if max_km is not None and max_km < 0:
+        raise ValueError("max_km must be positive")
+    return lat, lon, max(1, min(k, current_app.config.get('MAX_PAGE_SIZE', 100))), max_km
+
+@api.route('/nearby')
+class PlaceNearby(Resource):
+    @api.response(200, 'Nearest places retrieved successfully')
+    @api.response(400, 'Invalid coordinates')
+    @api.param('lat', 'Latitude of the point', required=True)
+    @api.param('lon', 'Longitude of the point', required=True)
+    @api.param('k', 'Maximum number of places to return (default 10)')
+    @api.param('max_km', 'Only places within this great-circle distance, in km')
+    def get(self):
+        """Retrieve the places nearest to a point, nearest first"""
+        try:
+            lat, lon, k, max_km = get_nearby_args()
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        nearby = facade.get_nearby_places(lat, lon, k, max_km)
+        return [dict(place.to_dict(), distance_km=round(distance, 3)) for place, distance in nearby], 200
 
 @api.route('/<place_id>')
 class PlaceResource(Resource):
     @api.response(200, 'Place details retrieved successfully')
+    @api.response(400, 'Invalid expand value')
     @api.response(404, 'Place not found')
+    @api.param('expand', 'Comma-separated relations to nest: owner, amenities, reviews')
     def get(self, place_id):
-        """Get place details by ID"""
-         # Get place using facade
-        place = facade.get_place(place_id)
+        """Get place details by ID, or 304 Not Modified when the If-None-Match or If-Modified-Since copy is current"""
+        expand = get_expand_args()
+        # Validated from the (id, updated_at) row, before the place is loaded
+        stamp = facade.get_place_stamp(place_id)
+        if stamp is None:
+            return {'error': 'Place not found'}, 404
+        tables = expanded_tables(expand)
+        # Owners, amenities and reviews change without touching the place row
+        etag = entity_tag(stamp.id, stamp.updated_at, expand, table_stamp('places', *tables) if tables else None)
+        headers, not_modified = conditional(etag, None if tables else stamp.updated_at)
+        if not_modified:
+            return not_modified
+        try:
+            # Get place using facade
+            place = facade.get_place(place_id, expand)
+        except ValueError as e:
+            return {'error': str(e)}, 400
         if not place:
             return {'error': 'Place not found'}, 404
         
         # Convert to dictionary and return
-        return place.to_dict(), 200
+        return place.to_dict(expand), 200, headers
 
     @api.expect(place_model)
     @api.response(200, 'Place updated successfully')
@@ -78,17 +289,45 @@ class PlaceResource(Resource):
     def put(self, place_id):
         """Update a place's information"""
         current_user_id = get_jwt_identity()
+        claims = get_jwt()
+        is_admin = claims.get('is_admin', False)
+        place_data = api.payload
+        if 'amenities' not in place_data:
+            # Plain columns: one UPDATE ... RETURNING, restricted to the caller's places, builds the response
+            try:
+                row = facade.update_place_returning(place_id, place_data,
+                                                    owner_id=None if is_admin else current_user_id)
+            except Exception as e:
+                return {'error': str(e)}, 400
+            if row is None:
+                # Nothing updated: the place is missing, or someone else's
+                if facade.get_place_stamp(place_id) is None:
+                    return {'error': 'Place not found'}, 404
+                return {'error':'unauthorized - you can only modify your own places'}, 403
+            return Place.row_to_dict(row), 200
         # Get existing place
         place = facade.get_place(place_id)
         if not place:
             return {'error': 'Place not found'}, 404
-        claims = get_jwt()
-        is_admin = claims.get('is_admin', False)
         if not is_admin and place.owner_id != current_user_id:
             return {'error':'unauthorized - you can only modify your own places'}, 403
         try:
-            # Update place using facade
-            updated_place = facade.update_place(place_id, api.payload)
+            # Relinking amenities needs the ORM, reuse the place loaded above
+            updated_place = facade.update_place(place_id, place_data, place=place)
             return updated_place.to_dict(), 200
         except Exception as e:
             return {'error': str(e)}, 400
+
+@api.route('/<place_id>/similar')
+class PlaceSimilar(Resource):
+    @api.response(200, 'Similar places retrieved successfully')
+    @api.response(404, 'Place not found')
+    @api.param('k', 'Maximum number of places to return (default 10)')
+    def get(self, place_id):
+        """Retrieve the places most like a place by amenities, price and location, most similar first"""
+        k = request.args.get('k', 10, type=int)
+        k = max(1, min(k, current_app.config.get('SIMILAR_PLACES', {}).get('max_k', 50)))
+        similar = facade.get_similar_places(place_id, k)
+        if similar is None:
+            return {'error': 'Place not found'}, 404
+        return [dict(place.to_dict(), similarity=round(score, 4)) for place, score in similar], 200
@@ -1,6 +1,13 @@
 from flask_restx import Namespace, Resource, fields
+from flask import request
 from app.services import facade
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy.exc import IntegrityError
+from app.utils.pagination import get_page_args, page_headers
+from app.utils.fields import get_fields_args, row_to_dict
+from app.utils.streaming import stream_ndjson, wants_ndjson
+from app.utils.conditional import conditional, entity_tag, list_tag
+from app.models.review import Review
 
 
 api = Namespace('reviews', description='Review operations')
@@ -35,32 +42,77 @@ class ReviewList(Resource):
                 return {'error': 'Place not found'}, 404
             if place.owner_id == current_user_id:
                 return {'error': 'Cannot review your own place'}, 403
-            #check for duplicates reviews
-            existing_reviews = facade.get_reviews_by_place(review_data['place_id'])
-            for existing_review in existing_reviews:
-                if existing_review.user_id == current_user_id:
+            #duplicates are rejected by the (user_id, place_id) unique constraint
+            try:
+                review = facade.create_review(review_data)
+            except IntegrityError:
+                if facade.has_reviewed(current_user_id, review_data['place_id']):
                     return {'error': 'You have already reviewed this place'}, 403
-            review = facade.create_review(review_data)
+                raise
             return review.to_dict(), 201
         except Exception as e:
             return {'error': str(e)}, 400
 
     @api.response(200, 'List of reviews retrieved successfully')
+    @api.response(400, 'Invalid cursor')
+    @api.param('limit', 'Maximum number of reviews to return')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('fields', 'Comma-separated fields to return, e.g. id,rating')
     def get(self):
-        """Retrieve a list of all reviews"""
-        reviews = facade.get_all_reviews()
-        return [review.to_dict() for review in reviews], 200
+        """Retrieve one page of reviews, or every review from the cursor on with Accept: application/x-ndjson"""
+        limit, cursor = get_page_args()
+        fields = get_fields_args()
+        stream = wants_ndjson()
+        headers, not_modified = conditional(list_tag('reviews'))
+        if not_modified:
+            return not_modified
+        try:
+            reviews, next_cursor = facade.get_reviews_page(None if stream else limit, cursor, fields)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if stream:
+            response = stream_ndjson(reviews, (lambda row: row_to_dict(row, fields)) if fields else
+                                     (lambda review: review.to_dict()))
+            response.headers.extend(headers)
+            return response
+        headers.update(page_headers(next_cursor))
+        if fields:
+            return [row_to_dict(row, fields) for row in reviews], 200, headers
+        return [review.to_dict() for review in reviews], 200, headers
+
+@api.route('/search')
+class ReviewSearch(Resource):
+    @api.response(200, 'Matching reviews retrieved successfully')
+    @api.response(400, 'Invalid q or cursor')
+    @api.param('q', 'Free text searched in the review texts, best match first', required=True)
+    @api.param('limit', 'Maximum number of reviews to return')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    def get(self):
+        """Retrieve one page of the reviews matching a text"""
+        limit, cursor = get_page_args()
+        try:
+            matches, next_cursor = facade.search_reviews_page(request.args.get('q'), limit, cursor)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return [dict(review.to_dict(), highlight=highlight) for review, highlight in matches], 200, \
+            page_headers(next_cursor)
 
 @api.route('/<review_id>')
 class ReviewResource(Resource):
     @api.response(200, 'Review details retrieved successfully')
     @api.response(404, 'Review not found')
     def get(self, review_id):
-        """Get review details by ID"""
+        """Get review details by ID, or 304 Not Modified when the If-None-Match or If-Modified-Since copy is current"""
+        stamp = facade.get_review_stamp(review_id)
+        if stamp is None:
+            return {'error': 'Review not found'}, 404
+        headers, not_modified = conditional(entity_tag(stamp.id, stamp.updated_at), stamp.updated_at)
+        if not_modified:
+            return not_modified
         review = facade.get_review(review_id)
         if not review:
             return {'error': 'Review not found'}, 404
-        return review.to_dict(), 200
+        return review.to_dict(), 200, headers
 
     @api.expect(review_model)
     @api.response(200, 'Review updated successfully')
@@ -81,8 +133,9 @@ class ReviewResource(Resource):
         if not is_admin and review.user_id != current_user_id:
             return {'error': 'Unauthorized - you can only modify your own reviews'}, 403
         try:
-            updated_review = facade.update_review(review_id, api.payload)
-            return updated_review.to_dict(), 200
+            # One UPDATE ... RETURNING builds the response, no reload of the review
+            row = facade.update_review_returning(review_id, api.payload)
+            return row_to_dict(row, Review.PUBLIC_FIELDS), 200
         except Exception as e:
             return {'error': str(e)}, 400
 
@@ -106,10 +159,23 @@ class ReviewResource(Resource):
 @api.route('/places/<place_id>/reviews')
 class PlaceReviewList(Resource):
     @api.response(200, 'List of reviews for the place retrieved successfully')
+    @api.response(400, 'Invalid cursor')
     @api.response(404, 'Place not found')
+    @api.param('limit', 'Maximum number of reviews to return')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('order', 'newest (default) or oldest first')
     def get(self, place_id):
-        """Get all reviews for a specific place"""
-        reviews = facade.get_reviews_by_place(place_id)
-        if reviews is None:
+        """Get one page of reviews for a specific place"""
+        if facade.get_place_stamp(place_id) is None:
             return {'error': 'Place not found'}, 404
-        return [review.to_dict() for review in reviews], 200
+        headers, not_modified = conditional(list_tag('reviews', 'places'))
+        if not_modified:
+            return not_modified
+        limit, cursor = get_page_args()
+        newest_first = request.args.get('order', 'newest') != 'oldest'
+        try:
+            reviews, next_cursor = facade.get_reviews_by_place(place_id, limit, cursor, newest_first)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        headers.update(page_headers(next_cursor))
+        return [review.to_dict() for review in reviews], 200, headers
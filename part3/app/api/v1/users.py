@@ -1,6 +1,10 @@
 from flask_restx import Namespace, Resource, fields
 from app.services import facade
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from app.utils.pagination import get_page_args, page_headers
+from app.utils.fields import get_fields_args, row_to_dict
+from app.utils.streaming import stream_ndjson, wants_ndjson
+from app.utils.conditional import conditional, entity_tag, list_tag
 
 api = Namespace('users', description='User operations')
 
@@ -19,6 +23,7 @@ class UserList(Resource):
     @api.response(400, 'Email already registered')
     @api.response(400, 'Invalid input data')
     @api.response(403, 'Admin privileges required')
+    @api.response(503, 'Password hashing busy, retry later')
     @jwt_required()
     def post(self):
         """Register a new user - ADMIN ONLY"""
@@ -33,19 +38,34 @@ class UserList(Resource):
         if existing_user:
             return {'error': 'Email already registered'}, 400
 
+        # create_user hashes the password once
         new_user = facade.create_user(user_data)
 
-        if 'password' in user_data:
-            new_user.hash_password(user_data['password'])
-
         return {'id': new_user.id, 'first_name': new_user.first_name, 'last_name': new_user.last_name, 'email': new_user.email}, 201
     @api.response(200, 'List of users retrieved successfully')
-
-
+    @api.response(400, 'Invalid cursor')
+    @api.param('limit', 'Maximum number of users to return')
+    @api.param('cursor', 'Cursor from the X-Next-Cursor header of the previous page')
+    @api.param('fields', 'Comma-separated fields to return (default: id,first_name,last_name,email)')
     def get(self):
-        """Get all users"""
-        users = facade.get_all_users()
-        return [{'id': user.id, 'first_name': user.first_name, 'last_name': user.last_name, 'email': user.email} for user in users], 200
+        """Get one page of users, or every user from the cursor on with Accept: application/x-ndjson"""
+        limit, cursor = get_page_args()
+        # Only the listed columns are read, the password hash never leaves the database
+        fields = get_fields_args(default=('id', 'first_name', 'last_name', 'email'))
+        stream = wants_ndjson()
+        headers, not_modified = conditional(list_tag('users'))
+        if not_modified:
+            return not_modified
+        try:
+            rows, next_cursor = facade.get_users_page(None if stream else limit, cursor, fields)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if stream:
+            response = stream_ndjson(rows, lambda row: row_to_dict(row, fields))
+            response.headers.extend(headers)
+            return response
+        headers.update(page_headers(next_cursor))
+        return [row_to_dict(row, fields) for row in rows], 200, headers
 
 @api.route('/<user_id>')
 class UserResource(Resource):
@@ -54,16 +74,24 @@ class UserResource(Resource):
 
 
     def get(self, user_id):
-        """Get user details by ID"""
+        """Get user details by ID, or 304 Not Modified when the If-None-Match or If-Modified-Since copy is current"""
+        stamp = facade.get_user_stamp(user_id)
+        if stamp is None:
+            return {'error': 'User not found'}, 404
+        headers, not_modified = conditional(entity_tag(stamp.id, stamp.updated_at), stamp.updated_at)
+        if not_modified:
+            return not_modified
         user = facade.get_user(user_id)
         if not user:
             return {'error': 'User not found'}, 404
-        return {'id': user.id, 'first_name': user.first_name, 'last_name': user.last_name, 'email': user.email}, 200
+        return {'id': user.id, 'first_name': user.first_name, 'last_name': user.last_name, 'email': user.email}, \
+            200, headers
     @api.expect(user_model, validate=True)
     @api.response(200, 'User successfully updated')
     @api.response(404, 'User not found')
     @api.response(400, 'Invalid input data')
     @api.response(403, 'Unauthorized - you can only modify your own profile')
+    @api.response(503, 'Password hashing busy, retry later')
     @jwt_required()
     def put(self, user_id):
         """Update user information"""
@@ -74,9 +102,6 @@ class UserResource(Resource):
             return {'error': 'you can only modify your own profile'}, 403
 
         user_data = api.payload
-        user = facade.get_user(user_id)
-        if not user:
-            return {'error': 'User not found'}, 404
 
         # Check if email is being changed and if it's already taken by another user
         if 'email' in user_data:
@@ -84,6 +109,9 @@ class UserResource(Resource):
             if existing_user and existing_user.id != user_id:
                 return {'error': 'Email already registered'}, 400
 
-        facade.update_user(user_id, user_data)
-        updated_user = facade.get_user(user_id)
-        return {'id': updated_user.id, 'first_name': updated_user.first_name, 'last_name': updated_user.last_name, 'email': updated_user.email}, 200
+        # One UPDATE ... RETURNING, no row means the user does not exist
+        fields = ('id', 'first_name', 'last_name', 'email')
+        row = facade.update_user_returning(user_id, user_data, fields)
+        if not row:
+            return {'error': 'User not found'}, 404
+        return row_to_dict(row, fields), 200
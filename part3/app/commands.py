@@ -0,0 +1,60 @@
+import click
+from sqlalchemy import inspect
+from app import db
+from app.persistence.ratings import recompute_aggregates
+from app.persistence.search import PLACES_FTS, REVIEWS_FTS
+from app.persistence.spatial import has_place_rtree, rebuild_place_rtree
+
+
+def register_commands(app):
+    """Adds the maintenance commands to the flask CLI"""
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Rebuilds the full-text indexes and the places R*Tree from their tables.
+
+        Needed after writing the tables outside the application, or after a VACUUM
+        renumbered the rowids.
+        """
+        if db.engine.dialect.name != 'sqlite':
+            click.echo("The search indexes only exist on SQLite, nothing to do")
+            return
+        tables = set(inspect(db.engine).get_table_names())
+        with db.engine.begin() as connection:
+            for index in (PLACES_FTS, REVIEWS_FTS):
+                if index.content not in tables:
+                    continue
+                if index.name in tables:
+                    index.rebuild(connection)
+                else:
+                    index.install(connection)
+                click.echo(f"Rebuilt {index.name}")
+        if has_place_rtree(db.engine):
+            with db.engine.begin() as connection:
+                rebuild_place_rtree(connection)
+            click.echo("Rebuilt places_rtree")
+
+    @app.cli.command('repair-rating-aggregates')
+    def repair_rating_aggregates():
+        """Recomputes the review count, rating sum, average and histogram of every place from its reviews.
+
+        Needed after writing the reviews outside the application.
+        """
+        with db.engine.begin() as connection:
+            recompute_aggregates(connection, db.metadata.tables['places'], db.metadata.tables['reviews'])
+        # The cached places hold the old aggregates
+        cache = app.extensions.get('entity_cache', {}).get('places')
+        if cache is not None:
+            cache.clear()
+        click.echo("Recomputed the rating aggregates of the places")
+
+    @app.cli.command('rebuild-leaderboard')
+    def rebuild_leaderboard():
+        """Recomputes the trending and top-rated scores from the reviews and saves them as the checkpoint.
+
+        Needed after writing the reviews outside the application.
+        """
+        from app.services import facade
+        facade.place_repo.leaderboard(rebuild=True)
+        facade.place_repo.save_leaderboard()
+        click.echo("Rebuilt the leaderboard checkpoint")
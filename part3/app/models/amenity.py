@@ -1,5 +1,6 @@
 from app import db
 from app.models.base_model import BaseModel
+from app.utils.serializer import FieldExtractor
 
 class Amenity(BaseModel):
     # name of the table in the DB
@@ -7,15 +8,22 @@ class Amenity(BaseModel):
     # name of the amenity
     name = db.Column(db.String(128), nullable=False, unique=True)
 
+    # Columns that ?fields= may select
+    PUBLIC_FIELDS = ('id', 'name', 'created_at', 'updated_at')
+    # Columns that an update may write
+    UPDATABLE_FIELDS = ('name',)
+    # Builds the dict of to_dict
+    _serializer = FieldExtractor(('id', 'name'))
+
+    __table_args__ = (
+        # Same index as hbnb_schema.sql
+        db.Index('idx_amenities_name', 'name'),
+    )
+
     places = db.relationship('Place', secondary='place_amenities', back_populates='amenities')
 
     def __repr__(self):
         return f"<Amenity {self.name}>"
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+        return self._serializer(self)
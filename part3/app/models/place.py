@@ -1,5 +1,11 @@
+from operator import attrgetter
+from sqlalchemy import event, text
 from app import db
 from app.models.base_model import BaseModel
+from app.models.place_amenities import place_amenities  # registers the association table used below
+from app.persistence.search import PLACES_FTS
+from app.persistence.spatial import install_place_rtree
+from app.utils.serializer import FieldExtractor
 
 class Place(BaseModel):
     #Name of the table in the DB
@@ -14,6 +20,42 @@ class Place(BaseModel):
 
     owner_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
 
+    # Aggregates of the reviews, maintained on every review write (app/persistence/ratings.py)
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_avg = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Columns that ?fields= may select
+    PUBLIC_FIELDS = ('id', 'title', 'description', 'price', 'latitude', 'longitude', 'created_at', 'updated_at',
+                     'review_count', 'rating_avg')
+    # Columns that an update may write
+    UPDATABLE_FIELDS = ('title', 'description', 'price', 'latitude', 'longitude')
+    # Builds the dict of to_dict
+    _serializer = FieldExtractor(
+        ('id', 'title', 'description', 'price', 'latitude', 'longitude', 'review_count', 'rating_sum', 'rating_avg'),
+        computed={'rating_histogram': lambda place, stars=attrgetter(*(f'rating_{star}' for star in range(1, 6))):
+                  dict(zip(('1', '2', '3', '4', '5'), stars(place)))},
+    )
+    # Columns a row needs for row_to_dict
+    SERIALIZED_FIELDS = (_serializer.fields + tuple(f'rating_{star}' for star in range(1, 6))
+                         + ('created_at', 'updated_at'))
+
+    __table_args__ = (
+        # Same index as hbnb_schema.sql
+        db.Index('idx_places_owner', 'owner_id'),
+        # Serves the places of one owner, ordered by creation
+        db.Index('idx_places_owner_created', 'owner_id', 'created_at'),
+        # Serves ?min_price=/?max_price= and ?sort=price with its (price, id) keyset
+        db.Index('idx_places_price', 'price', 'id'),
+        # Serves ?sort=rating with its (rating_avg, id) keyset
+        db.Index('idx_places_rating', 'rating_avg', 'id'),
+    )
+
     # Relations
     reviews = db.relationship('Review', backref='place', lazy=True, cascade='all, delete-orphan')
     amenities = db.relationship('Amenity', secondary='place_amenities', back_populates='places')
@@ -21,14 +63,40 @@ class Place(BaseModel):
     def __repr__(self):
         return f"<Place {self.title}>"
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'price': self.price,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    def to_dict(self, expand=()):
+        """Serializes the place, nesting the relations listed in expand"""
+        data = self._serializer(self)
+        if 'owner' in expand:
+            owner = self.owner
+            data['owner'] = {
+                'id': owner.id,
+                'first_name': owner.first_name,
+                'last_name': owner.last_name,
+                'email': owner.email
+            } if owner else None
+        if 'amenities' in expand:
+            data['amenities'] = [{'id': amenity.id, 'name': amenity.name} for amenity in self.amenities]
+        if 'reviews' in expand:
+            data['reviews'] = [review.to_dict() for review in self.reviews]
+        return data
+
+    @classmethod
+    def row_to_dict(cls, row):
+        """Serializes a row holding SERIALIZED_FIELDS as to_dict does a place"""
+        return cls._serializer.from_row(row)
+
+
+# SQLite: the coordinates R*Tree (app/persistence/spatial.py) is created and dropped with the table
+@event.listens_for(Place.__table__, 'after_create')
+def create_place_rtree(target, connection, **kw):
+    install_place_rtree(connection)
+
+
+@event.listens_for(Place.__table__, 'before_drop')
+def drop_place_rtree(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("DROP TABLE IF EXISTS places_rtree"))
+
+
+# SQLite: full-text index of the titles and descriptions (app/persistence/search.py)
+PLACES_FTS.attach(Place)
@@ -0,0 +1,20 @@
+from app import db
+
+# Checkpoints of the in-memory leaderboard (app/persistence/leaderboard.py), one per window.
+# Scores are stored relative to the epoch of their window, as kept in memory.
+leaderboard_checkpoints = db.Table('leaderboard_checkpoints',
+    db.Column('window', db.String(16), primary_key=True),
+    db.Column('epoch', db.Float, nullable=False),
+    # created_at of the last review counted, the next load catches up from there
+    db.Column('watermark', db.DateTime, nullable=True),
+    db.Column('saved_at', db.DateTime, nullable=False),
+    # Version of leaderboard_scores when saved: a review deletion or rating change since then bumped it
+    db.Column('retractions', db.BigInteger, nullable=True)
+)
+
+leaderboard_scores = db.Table('leaderboard_scores',
+    db.Column('window', db.String(16), primary_key=True),
+    db.Column('place_id', db.String(36), primary_key=True),
+    db.Column('trending', db.Float, nullable=False),
+    db.Column('top', db.Float, nullable=False)
+)
@@ -1,5 +1,7 @@
 from app import db
 from app.models.base_model import BaseModel
+from app.persistence.search import REVIEWS_FTS
+from app.utils.serializer import FieldExtractor
 
 class Review(BaseModel):
     #name of the table in the db
@@ -12,14 +14,29 @@ class Review(BaseModel):
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     place_id = db.Column(db.String(36), db.ForeignKey('places.id'), nullable=False)
 
+    # Columns that ?fields= may select
+    PUBLIC_FIELDS = ('id', 'text', 'rating', 'created_at', 'updated_at')
+    # Columns that an update may write
+    UPDATABLE_FIELDS = ('text', 'rating')
+    # Builds the dict of to_dict
+    _serializer = FieldExtractor(('id', 'text', 'rating'))
+
+    __table_args__ = (
+        # One review per user per place, also serves the duplicate-review probe
+        db.UniqueConstraint('user_id', 'place_id', name='uq_reviews_user_place'),
+        # Same indexes as hbnb_schema.sql
+        db.Index('idx_reviews_user', 'user_id'),
+        db.Index('idx_reviews_place', 'place_id'),
+        # Serves the reviews of one place, most recent first
+        db.Index('idx_reviews_place_created', 'place_id', 'created_at', 'id'),
+    )
+
     def __repr__(self):
         return f"<Review {self.id}>"
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'text': self.text,
-            'rating': self.rating,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+        return self._serializer(self)
+
+
+# SQLite: full-text index of the review texts (app/persistence/search.py)
+REVIEWS_FTS.attach(Review)
@@ -0,0 +1,20 @@
+import random
+from sqlalchemy import event
+from app import db
+
+# Change counter of every table (app/persistence/versions.py), bumped inside each transaction writing to it
+table_versions = db.Table('table_versions',
+    db.Column('name', db.String(64), primary_key=True),
+    db.Column('version', db.BigInteger, nullable=False)
+)
+
+
+def initial_version():
+    """Random starting point, so that a rebuilt database does not hand out the versions of the previous one"""
+    return random.getrandbits(31)
+
+
+@event.listens_for(table_versions, 'after_create')
+def seed_table_versions(target, connection, **kw):
+    connection.execute(target.insert(), [{'name': table.name, 'version': initial_version()}
+                                         for table in target.metadata.sorted_tables if table is not target])
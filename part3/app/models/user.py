@@ -1,5 +1,7 @@
 from app import db
 from app.models.base_model import BaseModel  # Import BaseModel from its module
+from app.utils.passwords import get_password_hasher
+from app.utils.serializer import FieldExtractor
 
 class User(BaseModel):
     __tablename__ = 'users'
@@ -10,26 +12,32 @@ class User(BaseModel):
     password = db.Column(db.String(128), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
 
+    # Columns that ?fields= may select (never the password hash)
+    PUBLIC_FIELDS = ('id', 'first_name', 'last_name', 'email', 'is_admin', 'created_at', 'updated_at')
+    # Columns that an update may write (is_admin and password have their own paths)
+    UPDATABLE_FIELDS = ('first_name', 'last_name', 'email')
+    # Builds the dict of to_dict
+    _serializer = FieldExtractor(('id', 'first_name', 'last_name', 'email', 'is_admin'))
+
+    __table_args__ = (
+        # Same index as hbnb_schema.sql
+        db.Index('idx_users_email', 'email'),
+    )
+
     places = db.relationship('Place', backref='owner', lazy=True, cascade='all, delete-orphan')
     reviews = db.relationship('Review', backref='user', lazy=True, cascade='all, delete-orphan')
 
     def hash_password(self, password):
         """Hash the password before storing it."""
-        from app import bcrypt
-        self.password = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password = get_password_hasher().hash(password)
 
     def verify_password(self, password):
         """Verify the hashed password."""
-        from app import bcrypt
-        return bcrypt.check_password_hash(self.password, password)
+        return get_password_hasher().check(self.password, password)
+
+    def password_needs_rehash(self):
+        """True when the stored hash was made with another bcrypt cost than the configured one."""
+        return get_password_hasher().needs_rehash(self.password)
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'email': self.email,
-            'is_admin': self.is_admin,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+        return self._serializer(self)
@@ -0,0 +1,229 @@
+import heapq
+import re
+import sys
+import threading
+import unicodedata
+from bisect import bisect_left
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from app.persistence.ratings import committed_value
+from app.persistence.row_hooks import RowHook, register_row_hook
+
+# Above this many keys in a prefix range, its ranking is computed once and cached
+CACHE_THRESHOLD = 256
+# Length of the cached rankings, and so the largest limit served
+MAX_LIMIT = 50
+
+
+def normalize(value):
+    """Case-folded text without accents or punctuation, words separated by one space"""
+    value = value or ''
+    if not value.isascii():
+        value = ''.join(char for char in unicodedata.normalize('NFKD', value) if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', value.casefold()))
+
+
+class PrefixIndex:
+    """Typeahead over short labels: a sorted array of normalized keys searched with bisect.
+
+    Every word of a label starts a key ("sunny loft" and "loft"), so a prefix matches
+    any word. Keys are interned and point to their id through a parallel array; a
+    prefix is the slice between two bisections. Short prefixes span many keys, their
+    top-MAX_LIMIT by popularity is cached until a key or a popularity in it changes.
+    """
+
+    def __init__(self):
+        self._keys = []         # sorted normalized keys
+        self._ids = []          # id of the key at the same position
+        self._labels = {}       # id -> label as written
+        self._entry_keys = {}   # id -> keys of the id
+        self.popularity = {}    # id -> popularity
+        self._ranked = {}       # prefix -> best ids of a large range
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_items(cls, items):
+        """Builds an index from (id, label, popularity) tuples with one sort"""
+        index = cls()
+        pairs = []
+        for obj_id, label, popularity in items:
+            obj_id = sys.intern(obj_id)
+            keys = index._keys_of(label)
+            index._labels[obj_id] = label
+            index._entry_keys[obj_id] = keys
+            index.popularity[obj_id] = popularity or 0
+            pairs.extend((key, obj_id) for key in keys)
+        pairs.sort()
+        index._keys = [key for key, _ in pairs]
+        index._ids = [obj_id for _, obj_id in pairs]
+        return index
+
+    def __len__(self):
+        return len(self._labels)
+
+    @staticmethod
+    def _keys_of(label):
+        words = normalize(label).split(' ')
+        return tuple(dict.fromkeys(sys.intern(' '.join(words[i:])) for i in range(len(words)) if words[i]))
+
+    def _forget(self, keys):
+        """Drops the cached rankings that a change to these keys may alter"""
+        if self._ranked:
+            for key in keys:
+                for end in range(1, len(key) + 1):
+                    self._ranked.pop(key[:end], None)
+
+    def put(self, obj_id, label, popularity=None):
+        """Adds an entry or changes its label"""
+        with self._lock:
+            obj_id = sys.intern(obj_id)
+            self._remove(obj_id)
+            keys = self._keys_of(label)
+            for key in keys:
+                position = bisect_left(self._keys, key)
+                # Among equal keys the ids stay sorted too
+                while position < len(self._keys) and self._keys[position] == key and self._ids[position] < obj_id:
+                    position += 1
+                self._keys.insert(position, key)
+                self._ids.insert(position, obj_id)
+            self._labels[obj_id] = label
+            self._entry_keys[obj_id] = keys
+            if popularity is not None or obj_id not in self.popularity:
+                self.popularity[obj_id] = popularity or 0
+            self._forget(keys)
+
+    def remove(self, obj_id):
+        with self._lock:
+            self._remove(obj_id)
+            self.popularity.pop(obj_id, None)
+
+    def _remove(self, obj_id):
+        keys = self._entry_keys.pop(obj_id, ())
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            while self._ids[position] != obj_id:
+                position += 1
+            del self._keys[position]
+            del self._ids[position]
+        self._labels.pop(obj_id, None)
+        self._forget(keys)
+
+    def bump(self, obj_id, delta):
+        """Adds delta to the popularity of an entry"""
+        with self._lock:
+            if obj_id in self._labels:
+                self.popularity[obj_id] = self.popularity.get(obj_id, 0) + delta
+                self._forget(self._entry_keys[obj_id])
+
+    def complete(self, prefix, limit=10):
+        """Up to limit (id, label) pairs with a word starting with prefix, most popular first"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_LIMIT)
+        with self._lock:
+            low = bisect_left(self._keys, prefix)
+            high = bisect_left(self._keys, prefix + '\U0010ffff', low)
+            if high - low > CACHE_THRESHOLD:
+                best = self._ranked.get(prefix)
+                if best is None:
+                    best = self._ranked[prefix] = self._best(low, high, MAX_LIMIT)
+            else:
+                best = self._best(low, high, limit)
+            return [(obj_id, self._labels[obj_id]) for obj_id in best[:limit]]
+
+    def _best(self, low, high, n):
+        ids = set(self._ids[low:high])
+        popularity, labels = self.popularity, self._labels
+        return heapq.nsmallest(n, ids, key=lambda obj_id: (-popularity.get(obj_id, 0), labels[obj_id], obj_id))
+
+
+_index_lock = threading.Lock()
+
+
+def get_prefix_index(name, load_items):
+    """Returns the named prefix index of the current app, built from load_items() on first use"""
+    indexes = current_app.extensions.setdefault('autocomplete', {})
+    index = indexes.get(name)
+    if index is None:
+        with _index_lock:
+            index = indexes.get(name)
+            if index is None:
+                index = indexes[name] = PrefixIndex.from_items(load_items())
+    return index
+
+
+def register_autocomplete_sync(session):
+    """Applies the place titles, amenity names and their popularity written by a transaction to the
+    prefix indexes once it commits. A place is as popular as its reviews are many, an amenity as
+    the places having it."""
+    @event.listens_for(session, 'after_flush')
+    def collect_labels(session, flush_context):
+        changes = session.info.setdefault('autocomplete_changes', [])
+        for obj in session.new:
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name == 'places':
+                changes.append(('put', 'places', obj.id, obj.title))
+                changes.extend(('bump', 'amenities', amenity.id, 1) for amenity in obj.amenities)
+            elif table_name == 'amenities':
+                changes.append(('put', 'amenities', obj.id, obj.name))
+            elif table_name == 'reviews':
+                changes.append(('bump', 'places', obj.place_id, 1))
+        for obj in session.dirty:
+            table_name = getattr(type(obj), '__tablename__', None)
+            state = inspect(obj)
+            if table_name == 'places':
+                if state.attrs.title.history.has_changes():
+                    changes.append(('put', 'places', obj.id, obj.title))
+                history = state.attrs.amenities.history
+                changes.extend(('bump', 'amenities', amenity.id, 1) for amenity in history.added)
+                changes.extend(('bump', 'amenities', amenity.id, -1) for amenity in history.deleted)
+            elif table_name == 'amenities':
+                # Links are counted from the places side only, which the backref keeps in step
+                if state.attrs.name.history.has_changes():
+                    changes.append(('put', 'amenities', obj.id, obj.name))
+            elif table_name == 'reviews' and state.attrs.place_id.history.has_changes():
+                changes.append(('bump', 'places', committed_value(state, 'place_id'), -1))
+                changes.append(('bump', 'places', obj.place_id, 1))
+        for obj in session.deleted:
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name == 'places':
+                changes.append(('remove', 'places', obj.id, None))
+                # The flush loaded the links it deleted, no lazy load happens here
+                changes.extend(('bump', 'amenities', amenity.id, -1)
+                               for amenity in inspect(obj).dict.get('amenities', ()))
+            elif table_name == 'amenities':
+                changes.append(('remove', 'amenities', obj.id, None))
+            elif table_name == 'reviews':
+                changes.append(('bump', 'places', committed_value(inspect(obj), 'place_id'), -1))
+
+    @event.listens_for(session, 'after_commit')
+    def apply_labels(session):
+        changes = session.info.pop('autocomplete_changes', [])
+        if not changes or not has_app_context():
+            return
+        indexes = current_app.extensions.get('autocomplete', {})
+        # Labels first: a new place may be bumped by its reviews in the same transaction
+        for change, name, obj_id, value in sorted(changes, key=lambda change: change[0] == 'bump'):
+            index = indexes.get(name)
+            if index is None:
+                # Not built yet, it will read the committed rows
+                continue
+            if change == 'put':
+                index.put(obj_id, value)
+            elif change == 'remove':
+                index.remove(obj_id)
+            elif value:
+                index.bump(obj_id, value)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_labels(session):
+        session.info.pop('autocomplete_changes', None)
+
+    def label_collector(name, column):
+        def collect_row_label(session, obj_id, row, state):
+            session.info.setdefault('autocomplete_changes', []).append(('put', name, obj_id, getattr(row, column)))
+        return collect_row_label
+
+    register_row_hook('places', RowHook(('title',), ('title',), after=label_collector('places', 'title')))
+    register_row_hook('amenities', RowHook(('name',), ('name',), after=label_collector('amenities', 'name')))
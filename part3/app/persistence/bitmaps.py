@@ -0,0 +1,209 @@
+import threading
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+
+
+class AmenityBitmaps:
+    """One bitmap per amenity with a bit per place, packed in NumPy uint8 arrays.
+
+    Places get a dense ordinal the first time they are linked to an amenity, or
+    registered by place(). An AND/OR amenity filter is then a few bitwise operations
+    over the bitmaps, whatever the number of place_amenities rows.
+    """
+
+    def __init__(self):
+        self._ordinals = {}     # place id -> ordinal
+        self._place_ids = []    # ordinal -> place id, None for a free ordinal
+        self._free = []
+        self._bitmaps = {}      # amenity id -> packed bits, little-endian within each byte
+        self._lock = threading.Lock()
+        # Bumped by every change, results computed from an older version are stale
+        self.version = 0
+
+    @classmethod
+    def from_links(cls, links):
+        """Builds the bitmaps from (place id, amenity id) rows of place_amenities"""
+        bitmaps = cls()
+        members = {}
+        for place_id, amenity_id in links:
+            ordinal = bitmaps._ordinals.get(place_id)
+            if ordinal is None:
+                ordinal = bitmaps._ordinals[place_id] = len(bitmaps._place_ids)
+                bitmaps._place_ids.append(place_id)
+            members.setdefault(amenity_id, []).append(ordinal)
+        for amenity_id, ordinals in members.items():
+            bits = np.zeros(len(bitmaps._place_ids), dtype=bool)
+            bits[ordinals] = True
+            bitmaps._bitmaps[amenity_id] = np.packbits(bits, bitorder='little')
+        return bitmaps
+
+    def _ordinal(self, place_id):
+        ordinal = self._ordinals.get(place_id)
+        if ordinal is None:
+            if self._free:
+                ordinal = self._free.pop()
+                self._place_ids[ordinal] = place_id
+            else:
+                ordinal = len(self._place_ids)
+                self._place_ids.append(place_id)
+            self._ordinals[place_id] = ordinal
+        return ordinal
+
+    def place(self, place_id):
+        """Ordinal of a place, assigned if it has none, for data kept per place alongside the bitmaps"""
+        with self._lock:
+            return self._ordinal(place_id)
+
+    def link(self, place_id, amenity_id):
+        with self._lock:
+            self.version += 1
+            ordinal = self._ordinal(place_id)
+            bitmap = self._bitmaps.get(amenity_id, np.zeros(0, dtype=np.uint8))
+            if ordinal // 8 >= len(bitmap):
+                bitmap = np.concatenate([bitmap, np.zeros(max(ordinal // 8 + 1, 2 * len(bitmap)) - len(bitmap),
+                                                          dtype=np.uint8)])
+            bitmap[ordinal // 8] |= 1 << (ordinal % 8)
+            self._bitmaps[amenity_id] = bitmap
+
+    def unlink(self, place_id, amenity_id):
+        with self._lock:
+            ordinal = self._ordinals.get(place_id)
+            bitmap = self._bitmaps.get(amenity_id)
+            if ordinal is not None and bitmap is not None and ordinal // 8 < len(bitmap):
+                bitmap[ordinal // 8] &= ~(1 << (ordinal % 8)) & 0xFF
+                self.version += 1
+
+    def drop_place(self, place_id):
+        """Clears a deleted place from every bitmap and frees its ordinal"""
+        with self._lock:
+            ordinal = self._ordinals.pop(place_id, None)
+            if ordinal is None:
+                return
+            for bitmap in self._bitmaps.values():
+                if ordinal // 8 < len(bitmap):
+                    bitmap[ordinal // 8] &= ~(1 << (ordinal % 8)) & 0xFF
+            self._place_ids[ordinal] = None
+            self._free.append(ordinal)
+            self.version += 1
+
+    def drop_amenity(self, amenity_id):
+        with self._lock:
+            if self._bitmaps.pop(amenity_id, None) is not None:
+                self.version += 1
+
+    def _filter(self, all_of, any_of, size):
+        """Packed bits of the ordinals passing the amenity filters, None without a filter; called under the lock"""
+        result = None
+        for amenity_id in all_of:
+            bitmap = self._bitmaps.get(amenity_id)
+            if bitmap is None:
+                return np.zeros(size, dtype=np.uint8)
+            result = self._fit(bitmap, size) if result is None else result & self._fit(bitmap, size)
+        if any_of:
+            union = np.zeros(size, dtype=np.uint8)
+            for amenity_id in any_of:
+                if amenity_id in self._bitmaps:
+                    union |= self._fit(self._bitmaps[amenity_id], size)
+            result = union if result is None else result & union
+        return result
+
+    def match(self, all_of=(), any_of=()):
+        """Ids of the places linked to every amenity of all_of and to at least one of any_of"""
+        with self._lock:
+            result = self._filter(all_of, any_of, (len(self._place_ids) + 7) // 8)
+            if result is None:
+                return []
+            ordinals = np.flatnonzero(np.unpackbits(result, bitorder='little'))
+            return [self._place_ids[ordinal] for ordinal in ordinals.tolist() if ordinal < len(self._place_ids)]
+
+    def select(self, all_of=(), any_of=()):
+        """Boolean mask over the ordinals of the places passing the amenity filters, every place
+        holding an ordinal without a filter"""
+        with self._lock:
+            size = len(self._place_ids)
+            mask = np.ones(size, dtype=bool)
+            mask[self._free] = False
+            result = self._filter(all_of, any_of, (size + 7) // 8)
+            if result is not None:
+                mask &= np.unpackbits(result, count=size, bitorder='little').astype(bool)
+            return mask
+
+    def counts(self, mask):
+        """Number of places of a mask from select() linked to each amenity"""
+        with self._lock:
+            size = (len(mask) + 7) // 8
+            packed = np.packbits(mask, bitorder='little')
+            return {amenity_id: int(np.unpackbits(self._fit(bitmap, size) & packed).sum())
+                    for amenity_id, bitmap in self._bitmaps.items()}
+
+    @staticmethod
+    def _fit(bitmap, size):
+        """Copy of a bitmap padded or cut to size bytes"""
+        if len(bitmap) >= size:
+            return bitmap[:size].copy()
+        return np.concatenate([bitmap, np.zeros(size - len(bitmap), dtype=np.uint8)])
+
+
+_bitmaps_lock = threading.Lock()
+
+
+def get_amenity_bitmaps(load_links):
+    """Returns the amenity bitmaps of the current app, built from load_links() on first use"""
+    bitmaps = current_app.extensions.get('amenity_bitmaps')
+    if bitmaps is None:
+        with _bitmaps_lock:
+            bitmaps = current_app.extensions.get('amenity_bitmaps')
+            if bitmaps is None:
+                bitmaps = current_app.extensions['amenity_bitmaps'] = AmenityBitmaps.from_links(load_links())
+    return bitmaps
+
+
+def register_bitmap_sync(session):
+    """Applies the amenity links added or removed by a transaction to the bitmaps once it commits.
+
+    Links are read from the relationship history of places and amenities, so only
+    writes made through the ORM by this process are seen.
+    """
+    @event.listens_for(session, 'after_flush')
+    def collect_links(session, flush_context):
+        changes = session.info.setdefault('amenity_bitmap_changes', [])
+        for obj in list(session.new) + list(session.dirty):
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name == 'places':
+                history = inspect(obj).attrs.amenities.history
+                changes.extend(('link', obj.id, amenity.id) for amenity in history.added)
+                changes.extend(('unlink', obj.id, amenity.id) for amenity in history.deleted)
+            elif table_name == 'amenities':
+                history = inspect(obj).attrs.places.history
+                changes.extend(('link', place.id, obj.id) for place in history.added)
+                changes.extend(('unlink', place.id, obj.id) for place in history.deleted)
+        for obj in session.deleted:
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name == 'places':
+                changes.append(('drop_place', obj.id, None))
+            elif table_name == 'amenities':
+                changes.append(('drop_amenity', None, obj.id))
+
+    @event.listens_for(session, 'after_commit')
+    def apply_links(session):
+        changes = session.info.pop('amenity_bitmap_changes', [])
+        if not changes or not has_app_context():
+            return
+        bitmaps = current_app.extensions.get('amenity_bitmaps')
+        if bitmaps is None:
+            # Not built yet, it will read the committed links
+            return
+        for change, place_id, amenity_id in changes:
+            if change == 'link':
+                bitmaps.link(place_id, amenity_id)
+            elif change == 'unlink':
+                bitmaps.unlink(place_id, amenity_id)
+            elif change == 'drop_place':
+                bitmaps.drop_place(place_id)
+            else:
+                bitmaps.drop_amenity(amenity_id)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_links(session):
+        session.info.pop('amenity_bitmap_changes', None)
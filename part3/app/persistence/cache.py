@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # Bumped by every invalidation, see set
+        self.generation = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, generation=None):
+        """Caches value under key. A read-through passes the generation read before loading value:
+        an invalidation since then may have come after the load, so value is refused and False returned."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+def get_entity_cache(table_name):
+    """Returns the cache of a table for the current app, None when ENTITY_CACHE disables it"""
+    caches = current_app.extensions.setdefault('entity_cache', {})
+    if table_name not in caches:
+        settings = current_app.config.get('ENTITY_CACHE', {}).get(table_name)
+        caches[table_name] = LRUCache(**settings) if settings else None
+    return caches[table_name]
+
+
+def entity_cache_stats(app):
+    """Hit/miss/eviction counters of every entity cache of the app"""
+    caches = app.extensions.get('entity_cache', {})
+    return {name: cache.stats() for name, cache in caches.items() if cache is not None}
+
+
+def snapshot(obj):
+    """Copies the column values of a loaded instance, safe to share between sessions"""
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(type(obj)).column_attrs}
+
+
+def restore(model, session, values):
+    """Attaches an instance rebuilt from a snapshot to the session without a SELECT"""
+    mapper = inspect(model)
+    key = mapper.identity_key_from_primary_key([values[column.key] for column in mapper.primary_key])
+    # An instance already in the session may hold unflushed changes, keep it
+    existing = session.identity_map.get(key)
+    if existing is not None:
+        return existing
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    return session.merge(obj, load=False)
+
+
+def register_invalidation(session):
+    """Invalidates cached rows written by a session once its transaction commits.
+
+    Listening on the session catches every write, including cascades that never
+    go through a repository method.
+    """
+    @event.listens_for(session, 'after_flush')
+    def collect_written(session, flush_context):
+        written = session.info.setdefault('entity_cache_written', set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name:
+                written.add((table_name, inspect(obj).identity or (obj.id,)))
+
+    @event.listens_for(session, 'after_commit')
+    def invalidate_written(session):
+        written = session.info.pop('entity_cache_written', set())
+        if not written or not has_app_context():
+            return
+        for table_name, identity in written:
+            cache = get_entity_cache(table_name)
+            if cache is not None:
+                cache.invalidate(identity[0])
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_written(session):
+        session.info.pop('entity_cache_written', None)
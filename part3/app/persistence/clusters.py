@@ -0,0 +1,281 @@
+import math
+import threading
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from app.persistence.row_hooks import RowHook, register_row_hook
+
+# Web Mercator stops here, as map tiles do
+MAX_LATITUDE = 85.0511287798
+
+
+def mercator_cells(lats, lons, size):
+    """Column and row of the points in a size x size Web Mercator grid, row 0 at the north"""
+    lats = np.clip(np.asarray(lats, dtype=float), -MAX_LATITUDE, MAX_LATITUDE)
+    lons = np.asarray(lons, dtype=float)
+    sines = np.sin(np.radians(lats))
+    xs = np.floor((lons + 180.0) / 360.0 * size)
+    ys = np.floor((0.5 - np.log((1 + sines) / (1 - sines)) / (4 * math.pi)) * size)
+    return np.clip(xs, 0, size - 1).astype(np.int64), np.clip(ys, 0, size - 1).astype(np.int64)
+
+
+class GridLevel:
+    """Aggregates of the non-empty cells of one grid: place count, coordinate sums and lowest price.
+
+    A cell is a slot of parallel arrays found through its key x * size + y. The lowest
+    price cannot be undone when a place leaves, it is marked stale and recomputed from
+    the finer level on the next read.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.slots = {}         # cell key -> slot
+        self._free = []
+        self.xs = np.zeros(0, dtype=np.int64)
+        self.ys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.lat_sums = np.zeros(0)
+        self.lon_sums = np.zeros(0)
+        self.min_prices = np.zeros(0)
+        self.stale = np.zeros(0, dtype=bool)
+
+    @classmethod
+    def from_cells(cls, size, xs, ys, lats, lons, prices):
+        """Aggregates the points of each cell, given the cell of every point"""
+        level = cls(size)
+        keys, inverse = np.unique(xs * size + ys, return_inverse=True)
+        level.xs, level.ys = keys // size, keys % size
+        level.counts = np.bincount(inverse, minlength=len(keys)).astype(np.int64)
+        level.lat_sums = np.bincount(inverse, weights=lats, minlength=len(keys))
+        level.lon_sums = np.bincount(inverse, weights=lons, minlength=len(keys))
+        level.min_prices = np.full(len(keys), np.inf)
+        np.minimum.at(level.min_prices, inverse, prices)
+        level.stale = np.zeros(len(keys), dtype=bool)
+        level.slots = dict(zip(keys.tolist(), range(len(keys))))
+        return level
+
+    def _slot(self, x, y):
+        key = x * self.size + y
+        slot = self.slots.get(key)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self.slots[key] = self._free.pop()
+            self.xs[slot], self.ys[slot] = x, y
+            self.counts[slot] = 0
+            self.lat_sums[slot] = self.lon_sums[slot] = 0.0
+            self.min_prices[slot] = np.inf
+            self.stale[slot] = False
+        return slot
+
+    def _grow(self):
+        old = len(self.counts)
+        extra = max(64, old)
+        self.xs = np.concatenate([self.xs, np.zeros(extra, dtype=np.int64)])
+        self.ys = np.concatenate([self.ys, np.zeros(extra, dtype=np.int64)])
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=np.int64)])
+        self.lat_sums = np.concatenate([self.lat_sums, np.zeros(extra)])
+        self.lon_sums = np.concatenate([self.lon_sums, np.zeros(extra)])
+        self.min_prices = np.concatenate([self.min_prices, np.full(extra, np.inf)])
+        self.stale = np.concatenate([self.stale, np.zeros(extra, dtype=bool)])
+        self._free.extend(range(old + extra - 1, old - 1, -1))
+
+    def add(self, x, y, lat, lon, price):
+        slot = self._slot(x, y)
+        self.counts[slot] += 1
+        self.lat_sums[slot] += lat
+        self.lon_sums[slot] += lon
+        self.min_prices[slot] = min(self.min_prices[slot], price)
+
+    def remove(self, x, y, lat, lon, price):
+        key = x * self.size + y
+        slot = self.slots[key]
+        self.counts[slot] -= 1
+        if self.counts[slot] == 0:
+            del self.slots[key]
+            self._free.append(slot)
+            return
+        self.lat_sums[slot] -= lat
+        self.lon_sums[slot] -= lon
+        if price <= self.min_prices[slot]:
+            self.stale[slot] = True
+
+    def visible(self, x_ranges, y_low, y_high):
+        """Slots of the non-empty cells within the column ranges and rows, visiting whichever is
+        smaller: the cells of the box or the non-empty cells of the level"""
+        cells = sum(high - low + 1 for low, high in x_ranges) * (y_high - y_low + 1)
+        if cells <= len(self.slots):
+            slots = self.slots
+            return [slot for low, high in x_ranges for x in range(low, high + 1)
+                    for slot in (slots.get(x * self.size + y) for y in range(y_low, y_high + 1)) if slot is not None]
+        used = np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+        xs, ys = self.xs[used], self.ys[used]
+        mask = (ys >= y_low) & (ys <= y_high) & np.logical_or.reduce([(xs >= low) & (xs <= high)
+                                                                       for low, high in x_ranges])
+        return used[mask].tolist()
+
+
+class ClusterGrid:
+    """Map clusters of the places: one GridLevel per zoom level, from 0 to max_zoom.
+
+    Level z splits the world in 2**z x 2**z tiles of cells_per_tile x cells_per_tile cells,
+    so a cell keeps the same size on screen at every zoom. A place is counted once per
+    level; a read only touches the cells visible in the box.
+    """
+
+    def __init__(self, max_zoom=14, cells_per_tile=4):
+        if cells_per_tile & (cells_per_tile - 1):
+            raise ValueError("cells_per_tile must be a power of two")
+        self.max_zoom = max_zoom
+        self.cells_per_tile = cells_per_tile
+        self.levels = [GridLevel(cells_per_tile << zoom) for zoom in range(max_zoom + 1)]
+        self._places = {}       # place id -> (latitude, longitude, price)
+        self._members = {}      # cell key of the finest level -> place ids
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows, **settings):
+        """Builds the grid from (id, latitude, longitude, price) rows, one vectorized pass per level"""
+        grid = cls(**settings)
+        rows = list(rows)
+        if not rows:
+            return grid
+        ids, lats, lons, prices = zip(*rows)
+        lats, lons, prices = (np.array(values, dtype=float) for values in (lats, lons, prices))
+        finest = grid.levels[-1]
+        xs, ys = mercator_cells(lats, lons, finest.size)
+        for place_id, lat, lon, price, key in zip(ids, lats.tolist(), lons.tolist(), prices.tolist(),
+                                                  (xs * finest.size + ys).tolist()):
+            grid._places[place_id] = (lat, lon, price)
+            grid._members.setdefault(key, set()).add(place_id)
+        for zoom in range(grid.max_zoom, -1, -1):
+            shift = grid.max_zoom - zoom
+            grid.levels[zoom] = GridLevel.from_cells(grid.levels[zoom].size, xs >> shift, ys >> shift,
+                                                     lats, lons, prices)
+        return grid
+
+    def __len__(self):
+        return len(self._places)
+
+    def _cells(self, lat, lon):
+        xs, ys = mercator_cells([lat], [lon], self.levels[-1].size)
+        return int(xs[0]), int(ys[0])
+
+    def put(self, place_id, lat, lon, price):
+        """Adds a place or moves it to its new coordinates and price"""
+        with self._lock:
+            self._remove(place_id)
+            price = price or 0.0
+            x, y = self._cells(lat, lon)
+            for zoom, level in enumerate(self.levels):
+                shift = self.max_zoom - zoom
+                level.add(x >> shift, y >> shift, lat, lon, price)
+            self._places[place_id] = (lat, lon, price)
+            self._members.setdefault(x * self.levels[-1].size + y, set()).add(place_id)
+
+    def remove(self, place_id):
+        with self._lock:
+            self._remove(place_id)
+
+    def _remove(self, place_id):
+        point = self._places.pop(place_id, None)
+        if point is None:
+            return
+        x, y = self._cells(point[0], point[1])
+        for zoom, level in enumerate(self.levels):
+            shift = self.max_zoom - zoom
+            level.remove(x >> shift, y >> shift, *point)
+        key = x * self.levels[-1].size + y
+        members = self._members[key]
+        members.discard(place_id)
+        if not members:
+            del self._members[key]
+
+    def _min_price(self, zoom, slot):
+        """Lowest price of a cell, recomputed from its finer cells or members when stale"""
+        level = self.levels[zoom]
+        if level.stale[slot]:
+            x, y = int(level.xs[slot]), int(level.ys[slot])
+            if zoom == self.max_zoom:
+                prices = (self._places[place_id][2] for place_id in self._members[x * level.size + y])
+            else:
+                finer = self.levels[zoom + 1]
+                children = (finer.slots.get((2 * x + dx) * finer.size + 2 * y + dy) for dx in (0, 1) for dy in (0, 1))
+                prices = (self._min_price(zoom + 1, child) for child in children if child is not None)
+            level.min_prices[slot] = min(prices)
+            level.stale[slot] = False
+        return level.min_prices[slot]
+
+    def clusters(self, bbox, zoom):
+        """Clusters of the places in the cells overlapping bbox at a map zoom level, as dicts of
+        centroid, count and lowest price; past max_zoom the finest cells are used"""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        zoom = max(0, min(int(zoom), self.max_zoom))
+        level = self.levels[zoom]
+        # Row 0 is the north
+        (west, east), (north, south) = mercator_cells([max_lat, min_lat], [min_lon, max_lon], level.size)
+        west, east, north, south = int(west), int(east), int(north), int(south)
+        x_ranges = [(west, east)] if min_lon <= max_lon else [(west, level.size - 1), (0, east)]
+        with self._lock:
+            slots = level.visible(x_ranges, north, south)
+            return [{
+                'latitude': round(float(level.lat_sums[slot] / level.counts[slot]), 6),
+                'longitude': round(float(level.lon_sums[slot] / level.counts[slot]), 6),
+                'count': int(level.counts[slot]),
+                'min_price': float(self._min_price(zoom, slot)),
+            } for slot in sorted(slots, key=lambda slot: (int(level.ys[slot]), int(level.xs[slot])))]
+
+
+_grid_lock = threading.Lock()
+
+
+def get_cluster_grid(load_rows):
+    """Returns the cluster grid of the current app, built from load_rows() on first use"""
+    grid = current_app.extensions.get('place_clusters')
+    if grid is None:
+        with _grid_lock:
+            grid = current_app.extensions.get('place_clusters')
+            if grid is None:
+                settings = current_app.config.get('PLACE_CLUSTERS', {})
+                grid = ClusterGrid.from_rows(load_rows(), max_zoom=settings.get('max_zoom', 14),
+                                             cells_per_tile=settings.get('cells_per_tile', 4))
+                current_app.extensions['place_clusters'] = grid
+    return grid
+
+
+def register_cluster_sync(session):
+    """Moves places in the cluster grid once the transaction writing them commits"""
+    @event.listens_for(session, 'after_flush')
+    def collect_points(session, flush_context):
+        points = session.info.setdefault('cluster_points', [])
+        for obj in list(session.new) + list(session.dirty):
+            if getattr(type(obj), '__tablename__', None) == 'places':
+                points.append((obj.id, obj.latitude, obj.longitude, obj.price))
+        for obj in session.deleted:
+            if getattr(type(obj), '__tablename__', None) == 'places':
+                points.append((obj.id, None, None, None))
+
+    @event.listens_for(session, 'after_commit')
+    def apply_points(session):
+        points = session.info.pop('cluster_points', [])
+        if not points or not has_app_context():
+            return
+        grid = current_app.extensions.get('place_clusters')
+        if grid is None:
+            # Not built yet, it will read the committed rows
+            return
+        for place_id, lat, lon, price in points:
+            if lat is None:
+                grid.remove(place_id)
+            else:
+                grid.put(place_id, lat, lon, price)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_points(session):
+        session.info.pop('cluster_points', None)
+
+    def collect_row_point(session, obj_id, row, state):
+        session.info.setdefault('cluster_points', []).append((obj_id, row.latitude, row.longitude, row.price))
+
+    columns = ('latitude', 'longitude', 'price')
+    register_row_hook('places', RowHook(columns, columns, after=collect_row_point))
@@ -0,0 +1,173 @@
+import threading
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import column, event, inspect, select, table
+from app.persistence.cache import LRUCache
+from app.persistence.row_hooks import RowHook, register_row_hook
+
+
+class PlaceFacets:
+    """Facet counters of the places, kept in NumPy arrays indexed by the place ordinals of the amenity bitmaps.
+
+    Each place has its price and the average rating of its reviews, as held by its
+    aggregate columns; amenity membership is read from the bitmaps. A filter
+    combination becomes one mask over the ordinals, and every facet count is a
+    reduction of that mask, so a facets request never groups the place_amenities or
+    reviews tables.
+    """
+
+    def __init__(self, bitmaps, price_bounds=(50, 100, 200, 500)):
+        self.bitmaps = bitmaps
+        # Price buckets: [0, b0), [b0, b1), ..., [bn, inf)
+        self.price_bounds = np.asarray(price_bounds, dtype=float)
+        self._price = np.zeros(64)
+        self._rating = np.zeros(64)
+        self._lock = threading.Lock()
+        self._version = 0
+
+    @classmethod
+    def from_rows(cls, bitmaps, places, price_bounds=(50, 100, 200, 500)):
+        """Builds the counters from (id, price, rating_avg) rows of places"""
+        facets = cls(bitmaps, price_bounds)
+        places = list(places)
+        ordinals = [bitmaps.place(place_id) for place_id, _, _ in places]
+        facets._grow(max(ordinals, default=0) + 1)
+        facets._price[ordinals] = [price for _, price, _ in places]
+        facets._rating[ordinals] = [rating for _, _, rating in places]
+        return facets
+
+    @property
+    def version(self):
+        """Changes with every write to the counters or the bitmaps, cached results of another version are stale"""
+        return self._version, self.bitmaps.version
+
+    def _grow(self, size):
+        """Resizes the per-ordinal arrays to at least size entries"""
+        if size <= len(self._price):
+            return
+        size = max(size, 2 * len(self._price))
+        self._price = np.concatenate([self._price, np.zeros(size - len(self._price))])
+        self._rating = np.concatenate([self._rating, np.zeros(size - len(self._rating))])
+
+    def put_place(self, place_id, price, rating=None):
+        """Adds a place or updates its price, and its average rating unless rating is None"""
+        with self._lock:
+            ordinal = self.bitmaps.place(place_id)
+            self._grow(ordinal + 1)
+            self._price[ordinal] = price
+            if rating is not None:
+                self._rating[ordinal] = rating
+            self._version += 1
+
+    def put_rating(self, place_id, rating):
+        """Updates the average rating of a place after its reviews changed"""
+        with self._lock:
+            ordinal = self.bitmaps.place(place_id)
+            self._grow(ordinal + 1)
+            self._rating[ordinal] = rating
+            self._version += 1
+
+    def count(self, min_price=None, max_price=None, all_of=(), any_of=()):
+        """Facet counts of the places passing the filters, computed from one mask:
+        total, per amenity id, per price bucket and per rating bucket (floor of the average
+        rating, 0 for unrated places)."""
+        with self._lock:
+            mask = self.bitmaps.select(all_of, any_of)
+            size = len(mask)
+            self._grow(size)
+            price = self._price[:size]
+            if min_price is not None:
+                mask &= price >= min_price
+            if max_price is not None:
+                mask &= price <= max_price
+            buckets = np.searchsorted(self.price_bounds, price[mask], side='right')
+            ratings = np.clip(np.floor(self._rating[:size][mask]).astype(np.int64), 0, 5)
+            return {
+                'total': int(np.count_nonzero(mask)),
+                'amenities': self.bitmaps.counts(mask),
+                'price': np.bincount(buckets, minlength=len(self.price_bounds) + 1).tolist(),
+                'rating': np.bincount(ratings, minlength=6).tolist(),
+            }
+
+
+_facets_lock = threading.Lock()
+
+
+def get_place_facets(bitmaps, load_places):
+    """Returns the facet counters of the current app over the given amenity bitmaps, built on first
+    use from the (id, price, rating_avg) rows returned by load_places()"""
+    facets = current_app.extensions.get('place_facets')
+    if facets is None:
+        with _facets_lock:
+            facets = current_app.extensions.get('place_facets')
+            if facets is None:
+                settings = current_app.config.get('PLACE_FACETS', {})
+                facets = PlaceFacets.from_rows(bitmaps, load_places(), price_bounds=settings.get('price_bounds', (50, 100, 200, 500)))
+                current_app.extensions['place_facets'] = facets
+    return facets
+
+
+def get_facet_cache():
+    """LRU cache of the facet counts of the current app, keyed by filters and facets version"""
+    cache = current_app.extensions.get('place_facet_cache')
+    if cache is None:
+        settings = current_app.config.get('PLACE_FACETS', {})
+        cache = current_app.extensions['place_facet_cache'] = LRUCache(settings.get('cache_size', 256),
+                                                                       settings.get('cache_ttl', 60))
+    return cache
+
+
+def register_facet_sync(session):
+    """Applies the prices and average ratings written by a transaction to the facet counters once
+    it commits; the amenity bitmaps follow the links and deleted places on their own.
+
+    Ratings change through the aggregate columns, which register_rating_sync updates behind
+    the ORM earlier in the same flush: the new averages of its rated places are read back
+    once the counters exist, a later build reads them from the rows. Only writes made by this
+    process are seen, through the ORM or the repositories' single-statement updates.
+    """
+    places = table('places', column('id'), column('rating_avg'))
+
+    @event.listens_for(session, 'after_flush')
+    def collect_facets(session, flush_context):
+        changes = session.info.setdefault('place_facet_changes', [])
+        for obj in session.new:
+            if getattr(type(obj), '__tablename__', None) == 'places':
+                changes.append(('put_place', obj.id, obj.price, 0.0))
+        for obj in session.dirty:
+            if getattr(type(obj), '__tablename__', None) == 'places' and inspect(obj).attrs.price.history.has_changes():
+                changes.append(('put_place', obj.id, obj.price))
+        rated = session.info.get('rated_places')
+        if rated and has_app_context() and current_app.extensions.get('place_facets') is not None:
+            averages = session.connection().execute(
+                select(places.c.id, places.c.rating_avg).where(places.c.id.in_(rated)))
+            changes.extend(('put_rating', place_id, rating) for place_id, rating in averages)
+
+    @event.listens_for(session, 'after_commit')
+    def apply_facets(session):
+        changes = session.info.pop('place_facet_changes', [])
+        if not changes or not has_app_context():
+            return
+        facets = current_app.extensions.get('place_facets')
+        if facets is None:
+            # Not built yet, it will read the committed rows
+            return
+        for change, *args in changes:
+            getattr(facets, change)(*args)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_facets(session):
+        session.info.pop('place_facet_changes', None)
+
+    def collect_row_price(session, obj_id, row, state):
+        session.info.setdefault('place_facet_changes', []).append(('put_place', obj_id, row.price))
+
+    def collect_row_rating(session, obj_id, row, state):
+        # The rating hook rerated the place ahead of the review update
+        if has_app_context() and current_app.extensions.get('place_facets') is not None:
+            average = session.connection().execute(
+                select(places.c.rating_avg).where(places.c.id == row.place_id)).scalar()
+            session.info.setdefault('place_facet_changes', []).append(('put_rating', row.place_id, average))
+
+    register_row_hook('places', RowHook(('price',), ('price',), after=collect_row_price))
+    register_row_hook('reviews', RowHook(('rating',), ('place_id',), after=collect_row_rating))
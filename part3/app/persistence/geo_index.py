@@ -0,0 +1,147 @@
+import heapq
+import math
+import threading
+import numpy as np
+
+# part2 and part3 are separate applications: each ships this module, the two copies are kept identical
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from one point to arrays of points, all in degrees"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GeoIndex:
+    """In-memory k-nearest-neighbour index of places over a latitude/longitude grid.
+
+    Coordinates live in NumPy arrays indexed by slot; each grid cell holds the slots
+    of its places. A query visits the cells closest to the point first and refines
+    the distances of their places with a vectorized haversine.
+    """
+
+    def __init__(self, cell_deg=1.0):
+        self.cell_deg = cell_deg
+        self.rows = math.ceil(180 / cell_deg)
+        self.cols = math.ceil(360 / cell_deg)
+        self._lats = np.empty(64)
+        self._lons = np.empty(64)
+        self._ids = []      # slot -> place id, None for a free slot
+        self._slots = {}    # place id -> slot
+        self._free = []
+        self._cells = {}    # (row, col) -> set of slots
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_points(cls, points, cell_deg=1.0):
+        """Builds an index from (id, latitude, longitude) tuples"""
+        index = cls(cell_deg)
+        points = list(points)
+        if not points:
+            return index
+        ids, lats, lons = zip(*points)
+        index._lats = np.array(lats, dtype=float)
+        index._lons = np.array(lons, dtype=float)
+        index._ids = list(ids)
+        index._slots = {obj_id: slot for slot, obj_id in enumerate(ids)}
+        rows = np.minimum(((index._lats + 90) // cell_deg).astype(int), index.rows - 1)
+        cols = ((index._lons + 180) // cell_deg).astype(int) % index.cols
+        for slot, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            index._cells.setdefault(cell, set()).add(slot)
+        return index
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _cell(self, lat, lon):
+        row = min(int((lat + 90) // self.cell_deg), self.rows - 1)
+        col = int((lon + 180) // self.cell_deg) % self.cols
+        return row, col
+
+    def put(self, obj_id, lat, lon):
+        """Adds a place, or moves it if it is already indexed"""
+        with self._lock:
+            if obj_id in self._slots:
+                self.remove(obj_id)
+            if self._free:
+                slot = self._free.pop()
+                self._ids[slot] = obj_id
+            else:
+                slot = len(self._ids)
+                if slot == len(self._lats):
+                    self._lats = np.resize(self._lats, max(2 * slot, 64))
+                    self._lons = np.resize(self._lons, max(2 * slot, 64))
+                self._ids.append(obj_id)
+            self._lats[slot], self._lons[slot] = lat, lon
+            self._slots[obj_id] = slot
+            self._cells.setdefault(self._cell(lat, lon), set()).add(slot)
+
+    def remove(self, obj_id):
+        """Drops a place, if indexed"""
+        with self._lock:
+            slot = self._slots.pop(obj_id, None)
+            if slot is None:
+                return
+            cell = self._cell(self._lats[slot], self._lons[slot])
+            self._cells[cell].discard(slot)
+            if not self._cells[cell]:
+                del self._cells[cell]
+            self._ids[slot] = None
+            self._free.append(slot)
+
+    def _cell_bound_km(self, lat, lon, cell):
+        """Lower bound of the distance from the point to anything in the cell.
+
+        hav(d) = hav(dlat) + cos(lat1) cos(lat2) hav(dlon), each term bounded below by the
+        cell's nearest latitude, nearest longitude and most poleward edge.
+        """
+        row, col = cell
+        south = row * self.cell_deg - 90
+        north = min(south + self.cell_deg, 90.0)
+        dlat = 0.0 if south <= lat <= north else min(abs(lat - south), abs(lat - north))
+        offset = (lon - (col * self.cell_deg - 180)) % 360
+        dlon = 0.0 if offset <= self.cell_deg else min(offset - self.cell_deg, 360 - offset)
+        cos_pole = math.cos(math.radians(max(abs(south), abs(north))))
+        h = math.sin(math.radians(dlat) / 2) ** 2 \
+            + math.cos(math.radians(lat)) * max(cos_pole, 0.0) * math.sin(math.radians(dlon) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, h)))
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """Returns up to k (place id, distance in km) pairs ordered by distance.
+
+        Cells are visited best-first by their lower bound: every cell has a neighbour
+        with a smaller bound, so growing from the point's cell never skips one, and the
+        search stops once the next bound exceeds the k-th distance found (or max_km).
+        """
+        limit = math.inf if max_km is None else max_km
+        with self._lock:
+            start = self._cell(lat, lon)
+            frontier = [(0.0, start)]
+            seen = {start}
+            best = []       # max-heap of (-distance, slot), at most k entries
+            visited = 0
+            while frontier and visited < len(self._slots):
+                bound, (row, col) = heapq.heappop(frontier)
+                if bound > limit or (len(best) == k and bound > -best[0][0]):
+                    break
+                slots = self._cells.get((row, col))
+                if slots:
+                    visited += len(slots)
+                    candidates = np.fromiter(slots, dtype=np.intp, count=len(slots))
+                    distances = haversine_km(lat, lon, self._lats[candidates], self._lons[candidates])
+                    for slot, distance in zip(candidates.tolist(), distances.tolist()):
+                        if distance > limit:
+                            continue
+                        if len(best) < k:
+                            heapq.heappush(best, (-distance, slot))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, slot))
+                for neighbour in ((row - 1, col), (row + 1, col),
+                                  (row, (col - 1) % self.cols), (row, (col + 1) % self.cols)):
+                    if 0 <= neighbour[0] < self.rows and neighbour not in seen:
+                        seen.add(neighbour)
+                        heapq.heappush(frontier, (self._cell_bound_km(lat, lon, neighbour), neighbour))
+            return [(self._ids[slot], -distance) for distance, slot in sorted(best, reverse=True)]
@@ -0,0 +1,355 @@
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+from operator import itemgetter
+from flask import current_app, has_app_context
+from sqlalchemy import DateTime, column, event, inspect, select, table
+from app.persistence.ratings import committed_value
+from app.persistence.row_hooks import RowHook, register_row_hook
+from app.persistence.versions import bump_versions, read_versions
+
+UNIX_EPOCH = datetime(1970, 1, 1)
+# Scores are kept relative to the epoch of their window; past e**REBASE_EXPONENT they are rescaled
+REBASE_EXPONENT = 50.0
+# Reviews older than this many time constants weigh less than 1e-13: a rebuild skips them
+HORIZON_TAUS = 30
+KINDS = ('trending', 'top')
+# Version row bumped in every transaction deleting a review or a place, or changing the rating or place
+# of a review: changes the catch-up after a checkpoint, which reads the newer reviews, cannot see
+RETRACTIONS = 'leaderboard_scores'
+
+
+def timestamp(value):
+    """Seconds since the Unix epoch of a naive UTC datetime, as stored in created_at"""
+    return (value - UNIX_EPOCH).total_seconds()
+
+
+def review_weights(rating):
+    """Weight of one review in each leaderboard: trending counts reviews, top counts stars (5 stars = 1)"""
+    return {'trending': 1.0, 'top': rating / 5.0}
+
+
+class TopK:
+    """The k best entries of a score dict, kept up to date as single scores change.
+
+    Rising scores are handled in O(log k) with a min-heap over the members. A member
+    whose score falls may be overtaken by an entry outside the top, which only a scan
+    of every score can tell: the next read rebuilds the top from the dict.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self._members = {}
+        self._heap = []     # (score, key), with outdated entries skipped lazily
+        self._stale = True
+
+    def update(self, key, score):
+        members = self._members
+        if key in members:
+            if score < members[key]:
+                self._stale = True
+            members[key] = score
+            self._push(score, key)
+            return
+        if self._stale:
+            return
+        if len(members) < self.k:
+            members[key] = score
+            self._push(score, key)
+            return
+        lowest, lowest_key = self._lowest()
+        if score > lowest:
+            del members[lowest_key]
+            members[key] = score
+            self._push(score, key)
+
+    def discard(self, key):
+        if self._members.pop(key, None) is not None:
+            self._stale = True
+
+    def invalidate(self):
+        self._stale = True
+
+    def _push(self, score, key):
+        heapq.heappush(self._heap, (score, key))
+        if len(self._heap) > 4 * self.k + 64:
+            self._heap = [(score, key) for key, score in self._members.items()]
+            heapq.heapify(self._heap)
+
+    def _lowest(self):
+        while True:
+            score, key = self._heap[0]
+            if self._members.get(key) == score:
+                return score, key
+            heapq.heappop(self._heap)
+
+    def ranked(self, scores):
+        """Members best first, rebuilt from scores if a member fell since the last read"""
+        if self._stale:
+            self._members = dict(heapq.nlargest(self.k, scores.items(), key=itemgetter(1)))
+            self._heap = [(score, key) for key, score in self._members.items()]
+            heapq.heapify(self._heap)
+            self._stale = False
+        return sorted(self._members.items(), key=lambda item: (-item[1], item[0]))
+
+
+class DecayedScores:
+    """Review scores of every place decaying exponentially with time constant tau seconds.
+
+    A review written at t adds weight * e**((t - epoch) / tau) to its place. Every score
+    shrinks by the same factor e**(-(now - epoch) / tau) as time passes, so the order
+    never changes by itself and nothing is recomputed until a review is written.
+    """
+
+    def __init__(self, tau, k, epoch):
+        self.tau = tau
+        self.epoch = epoch
+        self.scores = {kind: {} for kind in KINDS}
+        self.tops = {kind: TopK(k) for kind in KINDS}
+
+    def _growth(self, t):
+        exponent = (t - self.epoch) / self.tau
+        if exponent > REBASE_EXPONENT:
+            self.rebase(t)
+            exponent = 0.0
+        return math.exp(exponent)
+
+    def rebase(self, epoch):
+        """Moves the epoch forward, rescaling every score so it does not overflow"""
+        shrink = math.exp(-(epoch - self.epoch) / self.tau)
+        for kind in KINDS:
+            scores = self.scores[kind]
+            for key in scores:
+                scores[key] *= shrink
+            self.tops[kind].invalidate()
+        self.epoch = epoch
+
+    def add(self, place_id, t, rating, sign=1):
+        growth = self._growth(t)
+        for kind, weight in review_weights(rating).items():
+            delta = sign * weight * growth
+            scores = self.scores[kind]
+            score = scores.get(place_id, 0.0) + delta
+            # Removing the last review of a place leaves rounding residue
+            if sign < 0 and score <= abs(delta) * 1e-9:
+                scores.pop(place_id, None)
+                self.tops[kind].discard(place_id)
+                continue
+            scores[place_id] = score
+            self.tops[kind].update(place_id, score)
+
+    def drop_place(self, place_id):
+        for kind in KINDS:
+            self.scores[kind].pop(place_id, None)
+            self.tops[kind].discard(place_id)
+
+    def best(self, kind, n, now):
+        """The n best (place id, score) pairs of a kind, scores decayed to now"""
+        decay = math.exp(-(now - self.epoch) / self.tau)
+        return [(place_id, score * decay) for place_id, score in self.tops[kind].ranked(self.scores[kind])[:n]]
+
+
+class Leaderboard:
+    """Trending and top-rated places of every window, maintained from the review writes"""
+
+    def __init__(self, windows, k=100, now=None):
+        now = time.time() if now is None else now
+        # window name -> time constant in seconds
+        self.windows = {name: DecayedScores(tau, k, now) for name, tau in windows.items()}
+        self.watermark = None   # created_at of the newest review counted
+        self.last_checkpoint = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_review(self, place_id, created_at, rating, sign=1):
+        with self._lock:
+            t = timestamp(created_at)
+            for scores in self.windows.values():
+                scores.add(place_id, t, rating, sign)
+            if sign > 0 and (self.watermark is None or created_at > self.watermark):
+                self.watermark = created_at
+
+    def drop_place(self, place_id):
+        with self._lock:
+            for scores in self.windows.values():
+                scores.drop_place(place_id)
+
+    def best(self, window, kind, n, now=None):
+        """The n best (place id, score) pairs of a window, raises KeyError for an unknown window"""
+        with self._lock:
+            return self.windows[window].best(kind, n, time.time() if now is None else now)
+
+    def horizon(self, now=None):
+        """created_at before which reviews no longer count in any window"""
+        now = time.time() if now is None else now
+        return datetime.utcfromtimestamp(max(0.0, now - HORIZON_TAUS * max(
+            scores.tau for scores in self.windows.values())))
+
+    def checkpoint_rows(self):
+        """(checkpoints, scores) rows of leaderboard_checkpoints and leaderboard_scores"""
+        with self._lock:
+            saved_at = datetime.utcnow()
+            checkpoints = [{'window': name, 'epoch': scores.epoch, 'watermark': self.watermark, 'saved_at': saved_at}
+                           for name, scores in self.windows.items()]
+            rows = [{'window': name, 'place_id': place_id, 'trending': trending,
+                     'top': scores.scores['top'].get(place_id, 0.0)}
+                    for name, scores in self.windows.items()
+                    for place_id, trending in scores.scores['trending'].items()]
+            self.last_checkpoint = time.monotonic()
+            return checkpoints, rows
+
+    def restore(self, checkpoints, rows):
+        """Loads the scores of a checkpoint; False when it does not cover every window"""
+        checkpoints = {row.window: row for row in checkpoints}
+        if set(checkpoints) != set(self.windows) or len({row.watermark for row in checkpoints.values()}) > 1:
+            return False
+        with self._lock:
+            for name, scores in self.windows.items():
+                scores.epoch = checkpoints[name].epoch
+            for row in rows:
+                scores = self.windows.get(row.window)
+                if scores is not None:
+                    scores.scores['trending'][row.place_id] = row.trending
+                    if row.top > 0:
+                        scores.scores['top'][row.place_id] = row.top
+            self.watermark = next(iter(checkpoints.values())).watermark
+            return True
+
+
+def save_checkpoint(leaderboard, connection, checkpoints_table, scores_table):
+    """Replaces the stored checkpoint by the current scores of the leaderboard"""
+    # Read before the scores: a retraction committed in between invalidates the checkpoint rather than being lost
+    retractions = read_versions(connection, [RETRACTIONS]).get(RETRACTIONS)
+    checkpoints, rows = leaderboard.checkpoint_rows()
+    for checkpoint in checkpoints:
+        checkpoint['retractions'] = retractions
+    connection.execute(scores_table.delete())
+    connection.execute(checkpoints_table.delete())
+    connection.execute(checkpoints_table.insert(), checkpoints)
+    if rows:
+        connection.execute(scores_table.insert(), rows)
+
+
+def load_checkpoint(leaderboard, connection, checkpoints_table, scores_table):
+    """Restores the stored checkpoint into an empty leaderboard; False when there is none usable,
+    or when reviews were deleted or re-rated since it was saved"""
+    checkpoints = connection.execute(checkpoints_table.select()).all()
+    if not checkpoints:
+        return False
+    retractions = read_versions(connection, [RETRACTIONS]).get(RETRACTIONS)
+    if retractions is None or any(row.retractions != retractions for row in checkpoints):
+        return False
+    return leaderboard.restore(checkpoints, connection.execute(scores_table.select()).all())
+
+
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard(load):
+    """Returns the leaderboard of the current app, filled by load(leaderboard) on first use"""
+    leaderboard = current_app.extensions.get('leaderboard')
+    if leaderboard is None:
+        with _leaderboard_lock:
+            leaderboard = current_app.extensions.get('leaderboard')
+            if leaderboard is None:
+                settings = current_app.config.get('LEADERBOARD', {})
+                leaderboard = Leaderboard(settings.get('windows', {'24h': 86400, '7d': 604800, '30d': 2592000}),
+                                          settings.get('k', 100))
+                load(leaderboard)
+                current_app.extensions['leaderboard'] = leaderboard
+    return leaderboard
+
+
+def checkpoint_in_background(app):
+    """Saves a checkpoint of the leaderboard of app, from a thread of its own"""
+    from app import db
+    from app.models.place_scores import leaderboard_checkpoints, leaderboard_scores
+
+    with app.app_context():
+        try:
+            with db.engine.begin() as connection:
+                save_checkpoint(app.extensions['leaderboard'], connection, leaderboard_checkpoints, leaderboard_scores)
+        except Exception as e:
+            app.logger.warning("Could not checkpoint the leaderboard: %s", e)
+
+
+def register_leaderboard_sync(session):
+    """Applies the reviews written by a transaction to the leaderboard once it commits.
+
+    Old values come from the attribute history, so rating changes and deletions are
+    exact; a row hook reads them ahead of the single-statement review update. Both bump
+    the RETRACTIONS version in the writing transaction, so that a later start discards
+    the checkpoints saved before them.
+    """
+    reviews = table('reviews', column('id'), column('created_at', DateTime), column('rating'))
+
+    @event.listens_for(session, 'after_flush')
+    def collect_reviews(session, flush_context):
+        changes = session.info.setdefault('leaderboard_changes', [])
+        collected = len(changes)
+        for obj in session.new:
+            if getattr(type(obj), '__tablename__', None) == 'reviews':
+                changes.append((obj.place_id, obj.created_at, obj.rating, 1))
+        for obj in session.dirty:
+            if getattr(type(obj), '__tablename__', None) != 'reviews':
+                continue
+            state = inspect(obj)
+            if state.attrs.rating.history.has_changes() or state.attrs.place_id.history.has_changes():
+                changes.append((committed_value(state, 'place_id'), obj.created_at,
+                                committed_value(state, 'rating'), -1))
+                changes.append((obj.place_id, obj.created_at, obj.rating, 1))
+        for obj in session.deleted:
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name == 'reviews':
+                state = inspect(obj)
+                changes.append((committed_value(state, 'place_id'), obj.created_at,
+                                committed_value(state, 'rating'), -1))
+            elif table_name == 'places':
+                changes.append((obj.id, None, None, 0))
+        if any(sign <= 0 for _, _, _, sign in changes[collected:]):
+            bump_versions(session.connection(), [RETRACTIONS])
+
+    @event.listens_for(session, 'after_commit')
+    def apply_reviews(session):
+        changes = session.info.pop('leaderboard_changes', [])
+        if not changes or not has_app_context():
+            return
+        leaderboard = current_app.extensions.get('leaderboard')
+        if leaderboard is None:
+            # Not loaded yet, it will read the committed reviews
+            return
+        for place_id, created_at, rating, sign in changes:
+            if sign == 0:
+                leaderboard.drop_place(place_id)
+            else:
+                leaderboard.add_review(place_id, created_at, rating, sign)
+        interval = current_app.config.get('LEADERBOARD', {}).get('checkpoint_interval')
+        if interval and time.monotonic() - leaderboard.last_checkpoint > interval:
+            # Claimed before the thread starts, so concurrent commits do not start another one
+            leaderboard.last_checkpoint = time.monotonic()
+            threading.Thread(target=checkpoint_in_background, args=(current_app._get_current_object(),),
+                             daemon=True).start()
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_reviews(session):
+        session.info.pop('leaderboard_changes', None)
+
+    def read_rerated(session, review_id, values):
+        # The stored checkpoints still count the old rating
+        bump_versions(session.connection(), [RETRACTIONS])
+        if has_app_context() and current_app.extensions.get('leaderboard') is not None:
+            # The rating being replaced and the age of the review
+            return session.connection().execute(
+                select(reviews.c.created_at, reviews.c.rating).where(reviews.c.id == review_id)).first()
+        return None
+
+    def collect_rerated(session, review_id, row, previous):
+        if previous is not None:
+            session.info.setdefault('leaderboard_changes', []).extend([
+                (row.place_id, previous.created_at, previous.rating, -1),
+                (row.place_id, previous.created_at, row.rating, 1),
+            ])
+
+    register_row_hook('reviews', RowHook(('rating',), ('place_id', 'rating'), before=read_rerated,
+                                         after=collect_rerated))
@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(created_at, obj_id):
+    """Encodes the (created_at, id) key of the last row of a page into an opaque cursor."""
+    raw = json.dumps([created_at.isoformat(), obj_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodes a cursor produced by encode_cursor, raises ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, obj_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), str(obj_id)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+
+def encode_key_cursor(sort, value, obj_id):
+    """Encodes the (value, id) key of the last row of a page sorted by another column than created_at."""
+    raw = json.dumps([sort, value, obj_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_key_cursor(cursor, sort):
+    """Decodes a cursor produced by encode_key_cursor for the same sort, raises ValueError otherwise."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, value, obj_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError("Invalid cursor")
+    return value, str(obj_id)
+
+
+def encode_rowid_cursor(rowid):
+    """Encodes the rowid of the last row of a page into an opaque cursor."""
+    raw = json.dumps([rowid])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_rowid_cursor(cursor):
+    """Decodes a cursor produced by encode_rowid_cursor, raises ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        (rowid,) = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return int(rowid)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
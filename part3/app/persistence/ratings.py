@@ -0,0 +1,126 @@
+from datetime import datetime
+from sqlalchemy import bindparam, case, event, func, inspect, select, text, update
+from app.persistence.row_hooks import RowHook, register_row_hook
+
+STARS = (1, 2, 3, 4, 5)
+# Columns of places holding the aggregates of their reviews
+AGGREGATE_COLUMNS = ('review_count', 'rating_sum', 'rating_avg') + tuple(f'rating_{star}' for star in STARS)
+
+
+def aggregate_delta_statement(places):
+    """UPDATE adding deltas to the aggregates of one place, run with executemany over the touched places.
+    Every SET reads the values from before the statement, so rating_avg is computed from the deltas."""
+    count = places.c.review_count + bindparam('d_count')
+    total = places.c.rating_sum + bindparam('d_sum')
+    values = {
+        'review_count': count,
+        'rating_sum': total,
+        'rating_avg': case((count > 0, func.round(total * 1.0 / count, 4)), else_=0.0),
+    }
+    for star in STARS:
+        values[f'rating_{star}'] = places.c[f'rating_{star}'] + bindparam(f'd_{star}')
+    return update(places).where(places.c.id == bindparam('place_id')).values(**values)
+
+
+def rerate_statement():
+    """UPDATE moving one review of a place from its current rating to :rating and setting its
+    updated_at to :updated_at, run before the review itself is updated so that the old rating can
+    still be read"""
+    old = "(SELECT rating FROM reviews WHERE id = :review_id)"
+    stars = ', '.join(f"rating_{star} = rating_{star} - ({old} = {star}) + (:rating = {star})" for star in STARS)
+    return text(
+        f"UPDATE places SET rating_sum = rating_sum - {old} + :rating, "
+        f"rating_avg = CASE WHEN review_count > 0 "
+        f"THEN round((rating_sum - {old} + :rating) * 1.0 / review_count, 4) ELSE 0.0 END, {stars}, "
+        f"updated_at = :updated_at "
+        f"WHERE id = (SELECT place_id FROM reviews WHERE id = :review_id)"
+    )
+
+
+def recompute_aggregates(connection, places, reviews):
+    """Recomputes the aggregates of every place from its reviews in two statements"""
+    connection.execute(update(places).values(**{name: 0 for name in AGGREGATE_COLUMNS}))
+    totals = (
+        select(
+            reviews.c.place_id,
+            func.count().label('review_count'),
+            func.sum(reviews.c.rating).label('rating_sum'),
+            *(func.sum(case((reviews.c.rating == star, 1), else_=0)).label(f'rating_{star}') for star in STARS),
+        )
+        .group_by(reviews.c.place_id)
+        .subquery()
+    )
+    values = {name: totals.c[name] for name in AGGREGATE_COLUMNS if name != 'rating_avg'}
+    values['rating_avg'] = func.round(totals.c.rating_sum * 1.0 / totals.c.review_count, 4)
+    connection.execute(update(places).where(places.c.id == totals.c.place_id).values(**values))
+
+
+def register_rating_sync(session, metadata):
+    """Adds the reviews written by a flush to the aggregates of their places, in the same transaction.
+
+    Listening on the session covers the facade, the cascades (a deleted user takes
+    their reviews along) and any other ORM write; a row hook applies rerate_statement
+    ahead of the single-statement review update.
+    """
+    @event.listens_for(session, 'after_flush')
+    def update_aggregates(session, flush_context):
+        deltas = {}
+
+        def add(place_id, rating, sign):
+            delta = deltas.setdefault(place_id, dict.fromkeys(['d_count', 'd_sum'] + [f'd_{s}' for s in STARS], 0))
+            delta['d_count'] += sign
+            delta['d_sum'] += sign * rating
+            if rating in STARS:
+                delta[f'd_{rating}'] += sign
+
+        for obj in session.new:
+            if getattr(type(obj), '__tablename__', None) == 'reviews':
+                add(obj.place_id, obj.rating, 1)
+        for obj in session.deleted:
+            if getattr(type(obj), '__tablename__', None) == 'reviews':
+                state = inspect(obj)
+                add(committed_value(state, 'place_id'), committed_value(state, 'rating'), -1)
+        for obj in session.dirty:
+            if getattr(type(obj), '__tablename__', None) != 'reviews':
+                continue
+            state = inspect(obj)
+            if state.attrs.rating.history.has_changes() or state.attrs.place_id.history.has_changes():
+                add(committed_value(state, 'place_id'), committed_value(state, 'rating'), -1)
+                add(obj.place_id, obj.rating, 1)
+        deltas = {place_id: delta for place_id, delta in deltas.items() if any(delta.values())}
+        if not deltas:
+            return
+        session.connection().execute(aggregate_delta_statement(metadata.tables['places']),
+                                     [dict(delta, place_id=place_id) for place_id, delta in deltas.items()])
+        # The rows changed behind the ORM: refresh loaded places and their cached copies
+        session.info.setdefault('rated_places', set()).update(deltas)
+        session.info.setdefault('entity_cache_written', set()).update(('places', (place_id,)) for place_id in deltas)
+
+    @event.listens_for(session, 'after_flush_postexec')
+    def expire_aggregates(session, flush_context):
+        rated = session.info.pop('rated_places', None)
+        if not rated:
+            return
+        for obj in list(session.identity_map.values()):
+            if getattr(type(obj), '__tablename__', None) == 'places' and obj.id in rated:
+                session.expire(obj, AGGREGATE_COLUMNS)
+
+    def rerate(session, review_id, values):
+        # Same transaction as the review update, ahead of it while the old rating can be read
+        session.execute(rerate_statement(), {'review_id': review_id, 'rating': values['rating'],
+                                             'updated_at': datetime.utcnow()})
+
+    def collect_rerated(session, review_id, row, state):
+        session.info.setdefault('entity_cache_written', set()).add(('places', (row.place_id,)))
+
+    register_row_hook('reviews', RowHook(('rating',), ('place_id',), before=rerate, after=collect_rerated))
+
+
+def committed_value(state, key):
+    """Value of an attribute as last loaded from the database"""
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return state.attrs[key].value
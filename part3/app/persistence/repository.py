@@ -1,4 +1,10 @@
 from abc import ABC, abstractmethod
+from sqlalchemy import Float, and_, cast, literal_column, or_, select, update
+from app.persistence.pagination import encode_cursor, decode_cursor, encode_key_cursor, decode_key_cursor
+from app.persistence.cache import get_entity_cache, snapshot, restore
+from app.persistence.row_hooks import row_hooks
+from app.persistence.search import marked_html
+from app.persistence.versions import mark_changed
 
 class Repository(ABC):
     @abstractmethod
@@ -40,28 +46,189 @@ class InMemoryRepository(Repository):
         return next((obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value), None)
 
 class SQLAlchemyRepository(Repository):
+    # FullTextIndex over the model's table, kept in sync by update_returning and searched by search_page
+    full_text = None
+
     def __init__(self, model):
         self.model = model
     def add(self, obj):
         from app import db
         db.session.add(obj)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except Exception:
+            # Leave the session usable after a failed insert (e.g. a unique constraint)
+            db.session.rollback()
+            raise
+    def _cache(self):
+        return get_entity_cache(self.model.__tablename__)
     def get(self, obj_id):
-        return self.model.query.get(obj_id)
+        # Read-through: cached rows are re-attached to the session without a SELECT
+        cache = self._cache()
+        if cache is None:
+            return self.model.query.get(obj_id)
+        from app import db
+        values = cache.get(obj_id)
+        if values is not None:
+            return restore(self.model, db.session, values)
+        # Taken before the SELECT: a write invalidating the row meanwhile makes set refuse what it read
+        generation = cache.generation
+        obj = self.model.query.get(obj_id)
+        if obj is not None:
+            cache.set(obj_id, snapshot(obj), generation)
+        return obj
+    def get_stamp(self, obj_id):
+        """Returns the (id, updated_at) row of an object, None if it does not exist: enough to validate
+        a cached copy without loading the object"""
+        from app import db
+        return db.session.execute(
+            select(self.model.id, self.model.updated_at).where(self.model.id == obj_id)
+        ).first()
     def get_all(self):
+        # Not cached: one entry holding the whole table would escape the maxsize of the cache
         return self.model.query.all()
+    def columns_query(self, fields):
+        """Returns a query selecting only the given columns, plus the pagination keys, as row tuples"""
+        unknown = set(fields) - set(self.model.PUBLIC_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        from app import db
+        names = dict.fromkeys(('id', 'created_at') + tuple(fields))
+        return db.session.query(*(getattr(self.model, name) for name in names))
+    def get_page(self, limit, cursor=None, query=None, descending=False, sort_by=None):
+        """Returns one page of objects ordered by (created_at, id), or (sort_by, id), and the cursor of the next page.
+        A limit of None returns an iterator over every remaining object instead, read STREAM_CHUNK_SIZE rows
+        at a time so that memory does not grow with the table."""
+        query = query if query is not None else self.model.query
+        sort_col, id_col = getattr(self.model, sort_by or 'created_at'), self.model.id
+        if cursor:
+            if sort_by:
+                value, obj_id = decode_key_cursor(cursor, sort_by)
+            else:
+                value, obj_id = decode_cursor(cursor)
+            if descending:
+                query = query.filter(or_(
+                    sort_col < value,
+                    and_(sort_col == value, id_col < obj_id)
+                ))
+            else:
+                query = query.filter(or_(
+                    sort_col > value,
+                    and_(sort_col == value, id_col > obj_id)
+                ))
+        if descending:
+            query = query.order_by(sort_col.desc(), id_col.desc())
+        else:
+            query = query.order_by(sort_col, id_col)
+        if limit is None:
+            from flask import current_app
+            return iter(query.yield_per(current_app.config.get('STREAM_CHUNK_SIZE', 500))), None
+        # Fetch one extra row to know whether another page follows
+        objs = query.limit(limit + 1).all()
+        if len(objs) <= limit:
+            return objs, None
+        objs = objs[:limit]
+        if sort_by:
+            return objs, encode_key_cursor(sort_by, getattr(objs[-1], sort_by), objs[-1].id)
+        return objs, encode_cursor(objs[-1].created_at, objs[-1].id)
+    def _updatable(self, data):
+        """Keeps the keys of data that the model allows an update to write"""
+        return {key: value for key, value in data.items() if key in self.model.UPDATABLE_FIELDS}
     def update(self, obj_id, data):
         obj = self.get(obj_id)
         if obj:
-            for key, value in data.items():
-                setattr(obj, key, value)
-            from app import db
-            db.session.commit()
+            self.update_instance(obj, data)
+        return obj
+    def update_instance(self, obj, data):
+        """Applies data to an already loaded instance and commits, without reloading it"""
+        for key, value in self._updatable(data).items():
+            setattr(obj, key, value)
+        from app import db
+        db.session.commit()
+        return obj
+    def update_returning(self, obj_id, data, fields, *, where=None, **values):
+        """Updates a row with a single UPDATE ... RETURNING statement, without loading it.
+        Keyword values are written as is, for columns with their own path (such as a password hash).
+        where adds a condition the row must meet, such as its owner, checked by the same statement.
+        No flush takes place, so the row hooks of the table (see app.persistence.row_hooks) keep the
+        in-memory structures in step; the row also holds the columns they read.
+        Without any column to write, the row is only read, by the same conditions.
+        Returns a row tuple holding the given fields, None if no row has this id or meets where."""
+        from app import db
+        values = dict(self._updatable(data), **values)
+        conditions = (self.model.id == obj_id, *(() if where is None else (where,)))
+        if not values:
+            return db.session.execute(select(*self._returned(fields)).where(*conditions)).first()
+        hooks = row_hooks(self.model.__tablename__, values)
+        names = dict.fromkeys(fields)
+        for hook in hooks:
+            names.update(dict.fromkeys(hook.reads))
+        stmt = (
+            update(self.model)
+            .where(*conditions)
+            .values(**values)
+            .returning(*self._returned(names))
+            .execution_options(synchronize_session=False)
+        )
+        states = [hook.before(db.session, obj_id, values) if hook.before else None for hook in hooks]
+        # No mapper event fires for this statement, so the full-text index is patched here
+        reindex = self.full_text is not None and self.full_text.touches(values)
+        if reindex:
+            self.full_text.unindex(db.session.connection(), obj_id)
+        row = db.session.execute(stmt).first()
+        if row is None:
+            # Nothing was updated: undo the full-text removal and whatever the hooks wrote first
+            db.session.rollback()
+            return row
+        for hook, state in zip(hooks, states):
+            if hook.after:
+                hook.after(db.session, obj_id, row, state)
+        if reindex:
+            self.full_text.index(db.session.connection(), obj_id)
+        mark_changed(db.session, self.model.__tablename__)
+        db.session.commit()
+        # No ORM flush took place, so drop the cached copy explicitly
+        cache = self._cache()
+        if cache is not None:
+            cache.invalidate(obj_id)
+        return row
+    def _returned(self, names):
+        """Columns of names for a RETURNING clause. SQLite returns a whole REAL value as an integer
+        there, so float columns are cast back"""
+        for name in names:
+            column = getattr(self.model, name)
+            yield cast(column, Float).label(name) if isinstance(column.type, Float) else column
+    def search_page(self, q, limit, cursor=None, query=None):
+        """Returns one page of (object, marked text) pairs matching the free text q, best BM25 rank first,
+        and the cursor of the next page. Marked text maps each indexed column to HTML with <mark> around the
+        matched terms."""
+        fts = self.full_text
+        rank, rowid = fts.rank(), fts.table.c.rowid
+        query = query if query is not None else self.model.query
+        query = (
+            query.add_columns(rank.label('rank'), rowid.label('fts_rowid'), *(fts.marked(name) for name in fts.columns))
+            .join(fts.table, fts.table.c.rowid == literal_column(f'{self.model.__tablename__}.rowid'))
+            .filter(fts.match(q))
+        )
+        if cursor:
+            last_rank, last_rowid = decode_key_cursor(cursor, 'rank')
+            query = query.filter(or_(rank > last_rank, and_(rank == last_rank, rowid > int(last_rowid))))
+        rows = query.order_by(rank, rowid).limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_key_cursor('rank', rows[-1].rank, rows[-1].fts_rowid)
+        return [
+            (row[0], {name: marked_html(getattr(row, f'{name}_marked')) for name in fts.columns})
+            for row in rows
+        ], next_cursor
     def delete(self, obj_id):
+        """Deletes an object, returns it, None if it did not exist"""
         obj = self.get(obj_id)
         if obj:
             from app import db
             db.session.delete(obj)
             db.session.commit()
+        return obj
     def get_by_attribute(self, attr_name, attr_value):
         return self.model.query.filter_by(**{attr_name: attr_value}).first()
@@ -0,0 +1,36 @@
+"""Hooks run around the single-statement updates of SQLAlchemyRepository.update_returning.
+
+Those updates write a row without an ORM flush, so the session listeners keeping the
+in-memory indexes and counters in step never see them. Each listener registers a row
+hook next to itself instead: the repository runs the hooks of the table in the writing
+transaction, and they record their changes in session.info as the listener's after_flush
+does, for its after_commit to apply or its after_rollback to discard.
+"""
+
+_hooks = {}     # table name -> [RowHook]
+
+
+class RowHook:
+    """What a single-statement update of a table triggers.
+
+    watches: columns whose update runs the hook.
+    reads: columns of the updated row the hook needs, added to the RETURNING clause.
+    before(session, obj_id, values): runs ahead of the UPDATE, for what the row holds before it;
+    returns a state handed to after.
+    after(session, obj_id, row, state): runs once the UPDATE wrote the row, not if no row matched.
+    """
+
+    def __init__(self, watches, reads=(), before=None, after=None):
+        self.watches = frozenset(watches)
+        self.reads = tuple(reads)
+        self.before = before
+        self.after = after
+
+
+def register_row_hook(table_name, hook):
+    _hooks.setdefault(table_name, []).append(hook)
+
+
+def row_hooks(table_name, values):
+    """The hooks of a table watching any of the columns written by values, in registration order"""
+    return [hook for hook in _hooks.get(table_name, ()) if hook.watches & values.keys()]
@@ -0,0 +1,15 @@
+from sqlalchemy import inspect
+
+
+def missing_indexes(engine, metadata):
+    """Lists the (table, index) pairs declared on the models but absent from the live schema"""
+    inspector = inspect(engine)
+    live_tables = set(inspector.get_table_names())
+    missing = []
+    for table in metadata.sorted_tables:
+        # A missing table gets all its indexes from db.create_all()
+        if table.name not in live_tables:
+            continue
+        live = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend((table.name, index.name) for index in table.indexes if index.name not in live)
+    return missing
@@ -0,0 +1,141 @@
+import html
+import re
+from sqlalchemy import column, event, inspect, literal_column, table, text
+
+# Sentinels around the matched terms of highlight()/snippet(), swapped for <mark> once the text is escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+class FullTextIndex:
+    """External-content FTS5 table over text columns of a table, keyed by the rowid of its rows.
+
+    The FTS table stores only the index: the text stays in the content table. It is
+    kept in sync from the write path (mapper events for ORM flushes, hooks for the
+    single-statement updates) inside the transaction doing the write.
+    """
+
+    def __init__(self, name, content, columns, weights, snippets=()):
+        self.name = name
+        self.content = content
+        self.columns = columns
+        self.weights = weights
+        # Long columns are returned as a snippet around the match, the others highlighted whole
+        self.snippets = snippets
+        self.table = table(name, column('rowid'), *(column(col) for col in columns))
+        column_list = ', '.join(columns)
+        self._delete = text(
+            f"INSERT INTO {name}({name}, rowid, {column_list}) "
+            f"SELECT 'delete', rowid, {column_list} FROM {content} WHERE id = :id"
+        )
+        self._insert = text(
+            f"INSERT INTO {name}(rowid, {column_list}) SELECT rowid, {column_list} FROM {content} WHERE id = :id"
+        )
+
+    def install(self, connection):
+        """Creates the FTS table if missing and fills it from the content table (SQLite only)"""
+        if connection.dialect.name != 'sqlite':
+            return
+        if inspect(connection).has_table(self.name):
+            return
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {self.name} USING fts5({', '.join(self.columns)}, "
+            f"content='{self.content}', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+        ))
+        self.rebuild(connection)
+
+    def rebuild(self, connection):
+        """Rebuilds the whole index from the content table in one pass"""
+        connection.execute(text(f"INSERT INTO {self.name}({self.name}) VALUES ('rebuild')"))
+
+    def drop(self, connection):
+        if connection.dialect.name == 'sqlite':
+            connection.execute(text(f"DROP TABLE IF EXISTS {self.name}"))
+
+    def touches(self, values):
+        """True when a write of these column values changes the indexed text"""
+        return any(column in values for column in self.columns)
+
+    def unindex(self, connection, obj_id):
+        """Removes a row from the index; must run while the row still holds its indexed text"""
+        if connection.dialect.name == 'sqlite':
+            connection.execute(self._delete, {'id': obj_id})
+
+    def index(self, connection, obj_id):
+        """Adds a row to the index from its current text"""
+        if connection.dialect.name == 'sqlite':
+            connection.execute(self._insert, {'id': obj_id})
+
+    def attach(self, model):
+        """Keeps the index of model's table in step with the ORM: created and dropped with the
+        table, and patched on every flushed insert, text update and delete"""
+        def text_changed(target):
+            state = inspect(target)
+            return any(state.attrs[column].history.has_changes() for column in self.columns)
+
+        @event.listens_for(model.__table__, 'after_create')
+        def create_index(target, connection, **kw):
+            self.install(connection)
+
+        @event.listens_for(model.__table__, 'before_drop')
+        def drop_index(target, connection, **kw):
+            self.drop(connection)
+
+        @event.listens_for(model, 'after_insert')
+        def index_inserted(mapper, connection, target):
+            self.index(connection, target.id)
+
+        @event.listens_for(model, 'before_update')
+        def unindex_updated(mapper, connection, target):
+            if text_changed(target):
+                self.unindex(connection, target.id)
+
+        @event.listens_for(model, 'after_update')
+        def index_updated(mapper, connection, target):
+            if text_changed(target):
+                self.index(connection, target.id)
+
+        @event.listens_for(model, 'before_delete')
+        def unindex_deleted(mapper, connection, target):
+            self.unindex(connection, target.id)
+
+    def match(self, q):
+        """Filter clause matching the free text q"""
+        return literal_column(self.name).op('MATCH')(match_query(q))
+
+    def rank(self):
+        """BM25 score of the current match, lower is better, with the column weights applied"""
+        return literal_column(f"bm25({self.name}, {', '.join(str(weight) for weight in self.weights)})")
+
+    def marked(self, name, tokens=16):
+        """The text of an indexed column with the matched terms marked, as a snippet for long columns"""
+        position = self.columns.index(name)
+        if name in self.snippets:
+            return literal_column(
+                f"snippet({self.name}, {position}, '{MARK_START}', '{MARK_END}', '…', {tokens})"
+            ).label(f'{name}_marked')
+        return literal_column(
+            f"highlight({self.name}, {position}, '{MARK_START}', '{MARK_END}')"
+        ).label(f'{name}_marked')
+
+
+PLACES_FTS = FullTextIndex('places_fts', 'places', ('title', 'description'), weights=(10.0, 1.0),
+                           snippets=('description',))
+REVIEWS_FTS = FullTextIndex('reviews_fts', 'reviews', ('text',), weights=(1.0,), snippets=('text',))
+
+
+def match_query(q):
+    """Turns free text into an FTS5 query: every word must match, the last one as a prefix.
+    Words are quoted, so FTS5 operators typed by the user are searched as plain words."""
+    words = re.findall(r'\w+', q or '')
+    if not words:
+        raise ValueError("q must contain at least one word")
+    phrases = ['"' + word.replace('"', '""') + '"' for word in words]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+def marked_html(value):
+    """HTML-escapes a highlight()/snippet() result and wraps its matched terms in <mark>"""
+    if value is None:
+        return None
+    return html.escape(value).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
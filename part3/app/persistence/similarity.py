@@ -0,0 +1,318 @@
+import math
+import threading
+import time
+from collections import Counter
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from app.persistence.geo_index import EARTH_RADIUS_KM
+from app.persistence.row_hooks import RowHook, register_row_hook
+
+
+def unit_vectors(lats, lons):
+    """Points of the unit sphere for latitudes and longitudes in degrees, one (x, y, z) row each"""
+    lats, lons = np.radians(lats), np.radians(lons)
+    return np.column_stack([np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)])
+
+
+class PlaceVectors:
+    """Feature vectors of the places in NumPy arrays indexed by slot, for "similar places".
+
+    A place is its amenities (one column per amenity, 1 when linked), the logarithm of
+    its price and its position on the unit sphere. The similarity of two places mixes
+    the cosine of their amenity columns, exp(-|log price ratio| / price_scale) and
+    exp(-distance / distance_km); one query scores every place in a few array operations.
+    """
+
+    def __init__(self, weights=None, price_scale=0.5, distance_km=50.0):
+        weights = weights or {'amenities': 0.5, 'price': 0.2, 'location': 0.3}
+        self.weights = (weights['amenities'], weights['price'], weights['location'])
+        self.price_scale = price_scale
+        self.distance_km = distance_km
+        self._ids = []          # slot -> place id, None for a free slot
+        self._slots = {}        # place id -> slot
+        self._free = []
+        self._alive = np.zeros(64, dtype=bool)
+        self._log_price = np.zeros(64)
+        self._xyz = np.zeros((64, 3))
+        self._amenities = np.zeros((64, 8), dtype=np.float32)
+        self._amenity_counts = np.zeros(64, dtype=np.float32)
+        self._columns = {}      # amenity id -> column of _amenities
+        self._free_columns = []
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_rows(cls, places, links, **settings):
+        """Builds the vectors from (id, price, latitude, longitude) and (place id, amenity id) rows"""
+        vectors = cls(**settings)
+        places = list(places)
+        if places:
+            ids, prices, lats, lons = zip(*places)
+            vectors._ids = list(ids)
+            vectors._slots = {place_id: slot for slot, place_id in enumerate(ids)}
+            vectors._grow_rows(len(ids))
+            vectors._alive[:len(ids)] = True
+            vectors._log_price[:len(ids)] = np.log1p(np.maximum(np.array(prices, dtype=float), 0.0))
+            vectors._xyz[:len(ids)] = unit_vectors(np.array(lats, dtype=float), np.array(lons, dtype=float))
+        rows, columns = [], []
+        for place_id, amenity_id in links:
+            slot = vectors._slots.get(place_id)
+            if slot is not None:
+                rows.append(slot)
+                columns.append(vectors._column(amenity_id))
+        vectors._amenities[rows, columns] = 1.0
+        vectors._amenity_counts[:len(vectors._alive)] = vectors._amenities.sum(axis=1)
+        return vectors
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _grow_rows(self, size):
+        if size <= len(self._alive):
+            return
+        size = max(size, 2 * len(self._alive))
+        extra = size - len(self._alive)
+        self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+        self._log_price = np.concatenate([self._log_price, np.zeros(extra)])
+        self._xyz = np.vstack([self._xyz, np.zeros((extra, 3))])
+        self._amenities = np.vstack([self._amenities, np.zeros((extra, self._amenities.shape[1]), dtype=np.float32)])
+        self._amenity_counts = np.concatenate([self._amenity_counts, np.zeros(extra, dtype=np.float32)])
+
+    def _column(self, amenity_id):
+        column = self._columns.get(amenity_id)
+        if column is None:
+            if self._free_columns:
+                column = self._free_columns.pop()
+            else:
+                column = len(self._columns)
+                if column == self._amenities.shape[1]:
+                    self._amenities = np.hstack([self._amenities, np.zeros_like(self._amenities)])
+            self._columns[amenity_id] = column
+        return column
+
+    def put_place(self, place_id, price, lat, lon):
+        """Adds a place or updates its price and position"""
+        with self._lock:
+            slot = self._slots.get(place_id)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                    self._ids[slot] = place_id
+                else:
+                    slot = len(self._ids)
+                    self._ids.append(place_id)
+                    self._grow_rows(slot + 1)
+                self._slots[place_id] = slot
+                self._alive[slot] = True
+            self._log_price[slot] = math.log1p(max(price, 0.0))
+            self._xyz[slot] = unit_vectors(np.array([lat]), np.array([lon]))[0]
+
+    def drop_place(self, place_id):
+        with self._lock:
+            slot = self._slots.pop(place_id, None)
+            if slot is None:
+                return
+            self._alive[slot] = False
+            self._amenities[slot] = 0.0
+            self._amenity_counts[slot] = 0.0
+            self._ids[slot] = None
+            self._free.append(slot)
+
+    def link(self, place_id, amenity_id, linked=True):
+        with self._lock:
+            slot = self._slots.get(place_id)
+            if slot is None:
+                return
+            column = self._column(amenity_id)
+            if bool(self._amenities[slot, column]) != linked:
+                self._amenities[slot, column] = 1.0 if linked else 0.0
+                self._amenity_counts[slot] += 1.0 if linked else -1.0
+
+    def unlink(self, place_id, amenity_id):
+        self.link(place_id, amenity_id, linked=False)
+
+    def drop_amenity(self, amenity_id):
+        with self._lock:
+            column = self._columns.pop(amenity_id, None)
+            if column is not None:
+                self._amenity_counts -= self._amenities[:, column]
+                self._amenities[:, column] = 0.0
+                self._free_columns.append(column)
+
+    def similar(self, place_id, k):
+        """Up to k (place id, similarity) pairs most similar to a place, best first; similarity is in [0, 1]"""
+        with self._lock:
+            slot = self._slots.get(place_id)
+            if slot is None:
+                return []
+            size = len(self._ids)
+            amenities, counts = self._amenities[:size], self._amenity_counts[:size]
+            overlap = amenities @ amenities[slot]
+            norms = np.sqrt(counts * counts[slot])
+            cosine = np.divide(overlap, norms, out=np.zeros(size, dtype=np.float32), where=norms > 0)
+            price = np.exp(-np.abs(self._log_price[:size] - self._log_price[slot]) / self.price_scale)
+            chord = np.linalg.norm(self._xyz[:size] - self._xyz[slot], axis=1)
+            distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+            location = np.exp(-distance / self.distance_km)
+            weight_amenities, weight_price, weight_location = self.weights
+            scores = (weight_amenities * cosine + weight_price * price + weight_location * location) \
+                / sum(self.weights)
+            scores[~self._alive[:size]] = -np.inf
+            scores[slot] = -np.inf
+            k = min(k, len(self._slots) - 1)
+            if k <= 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            return [(self._ids[i], float(scores[i])) for i in best.tolist()]
+
+
+class NeighbourCache:
+    """Neighbour lists of the most requested places, kept for ttl seconds.
+
+    Requests are counted per place; a background thread recomputes the lists of the
+    hottest places before they expire, so those pages never wait for a similarity query.
+
+    A committed write to a place drops its list and every list it appears in. A place
+    that became similar enough to enter a list it is missing from is not looked for:
+    such a list stays stale until it expires or is refreshed, ttl seconds at most.
+    """
+
+    def __init__(self, size=100, ttl=300.0):
+        self.size = size
+        self.ttl = ttl
+        self.hits = Counter()
+        self._lists = {}        # place id -> (computed at, neighbours)
+        self._lock = threading.Lock()
+        # Bumped by every drop, see put
+        self.generation = 0
+
+    def get(self, place_id, k):
+        with self._lock:
+            self.hits[place_id] += 1
+            entry = self._lists.get(place_id)
+        if entry is None or entry[0] < time.monotonic() - self.ttl or len(entry[1]) < k:
+            return None
+        return entry[1][:k]
+
+    def put(self, place_id, neighbours, generation=None):
+        """Keeps the list of a place. With the generation read before computing it, a list that a
+        drop since then may have made stale is refused."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._lists[place_id] = (time.monotonic(), neighbours)
+            # Only the hot places are worth keeping
+            if len(self._lists) > 2 * self.size:
+                hot = {place_id for place_id, _ in self.hits.most_common(self.size)}
+                self._lists = {key: value for key, value in self._lists.items() if key in hot}
+
+    def drop(self, place_ids):
+        """Drops the lists of the places and the lists they appear in"""
+        place_ids = set(place_ids)
+        with self._lock:
+            self.generation += 1
+            self._lists = {key: (computed_at, neighbours) for key, (computed_at, neighbours) in self._lists.items()
+                           if key not in place_ids and not any(obj_id in place_ids for obj_id, _ in neighbours)}
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._lists = {}
+
+    def refresh(self, vectors, k):
+        """Recomputes the lists of the hottest places, then halves every count so that interest fades"""
+        with self._lock:
+            hot = [place_id for place_id, _ in self.hits.most_common(self.size)]
+            self.hits = Counter({place_id: count // 2 for place_id, count in self.hits.items() if count > 1})
+        for place_id in hot:
+            generation = self.generation
+            self.put(place_id, vectors.similar(place_id, k), generation)
+
+
+def refresh_neighbours(app, interval):
+    """Body of the thread refreshing the neighbour lists of the hot places of app"""
+    while True:
+        time.sleep(interval)
+        vectors, cache = app.extensions.get('place_vectors'), app.extensions.get('place_neighbours')
+        if vectors is not None and cache is not None:
+            cache.refresh(vectors, app.config.get('SIMILAR_PLACES', {}).get('max_k', 50))
+
+
+_vectors_lock = threading.Lock()
+
+
+def get_place_vectors(load_rows):
+    """Returns the place vectors and neighbour cache of the current app, built on first use from
+    load_rows(), which returns the (places, links) rows of PlaceVectors.from_rows"""
+    vectors = current_app.extensions.get('place_vectors')
+    if vectors is None:
+        with _vectors_lock:
+            vectors = current_app.extensions.get('place_vectors')
+            if vectors is None:
+                settings = current_app.config.get('SIMILAR_PLACES', {})
+                vectors = PlaceVectors.from_rows(
+                    *load_rows(), weights=settings.get('weights'),
+                    price_scale=settings.get('price_scale', 0.5), distance_km=settings.get('distance_km', 50.0))
+                current_app.extensions['place_neighbours'] = NeighbourCache(settings.get('hot_places', 100),
+                                                                            settings.get('ttl', 300.0))
+                current_app.extensions['place_vectors'] = vectors
+                interval = settings.get('refresh_interval')
+                if interval:
+                    threading.Thread(target=refresh_neighbours, args=(current_app._get_current_object(), interval),
+                                     daemon=True).start()
+    return vectors, current_app.extensions['place_neighbours']
+
+
+def register_vector_sync(session):
+    """Patches the place vectors with the places and amenity links written by a transaction once it commits"""
+    @event.listens_for(session, 'after_flush')
+    def collect_vectors(session, flush_context):
+        changes = session.info.setdefault('place_vector_changes', [])
+        for obj in list(session.new) + list(session.dirty):
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name == 'places':
+                changes.append(('put_place', obj.id, obj.price, obj.latitude, obj.longitude))
+                history = inspect(obj).attrs.amenities.history
+                changes.extend(('link', obj.id, amenity.id) for amenity in history.added)
+                changes.extend(('unlink', obj.id, amenity.id) for amenity in history.deleted)
+            elif table_name == 'amenities':
+                history = inspect(obj).attrs.places.history
+                changes.extend(('link', place.id, obj.id) for place in history.added)
+                changes.extend(('unlink', place.id, obj.id) for place in history.deleted)
+        for obj in session.deleted:
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name == 'places':
+                changes.append(('drop_place', obj.id))
+            elif table_name == 'amenities':
+                changes.append(('drop_amenity', obj.id))
+
+    @event.listens_for(session, 'after_commit')
+    def apply_vectors(session):
+        changes = session.info.pop('place_vector_changes', [])
+        if not changes or not has_app_context():
+            return
+        vectors = current_app.extensions.get('place_vectors')
+        if vectors is None:
+            # Not built yet, it will read the committed rows
+            return
+        # Places first: a new place is linked to its amenities in the same transaction
+        for change, *args in sorted(changes, key=lambda change: change[0] != 'put_place'):
+            getattr(vectors, change)(*args)
+        neighbours = current_app.extensions['place_neighbours']
+        if any(change == 'drop_amenity' for change, *_ in changes):
+            # Every place having the amenity moved
+            neighbours.clear()
+        else:
+            neighbours.drop(place_id for _, place_id, *_ in changes)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_vectors(session):
+        session.info.pop('place_vector_changes', None)
+
+    def collect_row_vector(session, obj_id, row, state):
+        session.info.setdefault('place_vector_changes', []).append(
+            ('put_place', obj_id, row.price, row.latitude, row.longitude))
+
+    columns = ('price', 'latitude', 'longitude')
+    register_row_hook('places', RowHook(columns, columns, after=collect_row_vector))
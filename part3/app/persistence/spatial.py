@@ -0,0 +1,141 @@
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import Column, Float, Integer, MetaData, Table, and_, event, inspect, or_, literal_column, select, text, union_all
+from app.persistence.geo_index import GeoIndex
+from app.persistence.row_hooks import RowHook, register_row_hook
+
+# R*Tree side index of the places coordinates, keyed by the rowid of the place.
+# Kept out of db.metadata: create_all() cannot create virtual tables.
+place_rtree = Table(
+    'places_rtree', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('min_lon', Float), Column('max_lon', Float),
+    Column('min_lat', Float), Column('max_lat', Float),
+)
+
+# Triggers keep the R*Tree in sync with every write to places, whatever issues it
+PLACE_RTREE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat)",
+    "CREATE TRIGGER IF NOT EXISTS places_rtree_insert AFTER INSERT ON places BEGIN "
+    "INSERT INTO places_rtree VALUES (new.rowid, new.longitude, new.longitude, new.latitude, new.latitude); END",
+    "CREATE TRIGGER IF NOT EXISTS places_rtree_update AFTER UPDATE OF latitude, longitude ON places BEGIN "
+    "UPDATE places_rtree SET min_lon = new.longitude, max_lon = new.longitude, "
+    "min_lat = new.latitude, max_lat = new.latitude WHERE id = new.rowid; END",
+    "CREATE TRIGGER IF NOT EXISTS places_rtree_delete AFTER DELETE ON places BEGIN "
+    "DELETE FROM places_rtree WHERE id = old.rowid; END",
+)
+
+
+def install_place_rtree(connection):
+    """Creates the R*Tree and its triggers if missing, then indexes the places it lacks (SQLite only)"""
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in PLACE_RTREE_DDL:
+        connection.execute(text(statement))
+    connection.execute(text(
+        "INSERT INTO places_rtree SELECT rowid, longitude, longitude, latitude, latitude FROM places "
+        "WHERE rowid NOT IN (SELECT id FROM places_rtree)"
+    ))
+
+
+def rebuild_place_rtree(connection):
+    """Refills the R*Tree from places, needed after a VACUUM renumbered the rowids"""
+    connection.execute(text("DELETE FROM places_rtree"))
+    install_place_rtree(connection)
+
+
+def has_place_rtree(engine):
+    """True when the database holds the R*Tree of the places"""
+    return engine.dialect.name == 'sqlite' and inspect(engine).has_table('places_rtree')
+
+
+def parse_bbox(value):
+    """Parses 'minLon,minLat,maxLon,maxLat'. minLon may exceed maxLon for a box crossing the antimeridian."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be minLon,minLat,maxLon,maxLat")
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("bbox longitudes must be between -180 and 180")
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox latitudes must be between -90 and 90, minLat first")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def bbox_filter(model, bbox, use_rtree=True):
+    """Filter clause keeping the places whose coordinates fall in the box"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    # Across the antimeridian the box is two boxes, one on each side
+    lon_ranges = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180.0), (-180.0, max_lon)]
+    exact = and_(
+        model.latitude.between(min_lat, max_lat),
+        or_(*(model.longitude.between(low, high) for low, high in lon_ranges)),
+    )
+    if not use_rtree:
+        return exact
+    # The R*Tree holds 32-bit bounds rounded outwards: an overlap test on it never misses
+    # a place on the edge of the box, and the exact test on the columns drops the extras
+    boxes = [
+        select(place_rtree.c.id).where(
+            place_rtree.c.max_lon >= low, place_rtree.c.min_lon <= high,
+            place_rtree.c.max_lat >= min_lat, place_rtree.c.min_lat <= max_lat,
+        )
+        for low, high in lon_ranges
+    ]
+    rowids = boxes[0] if len(boxes) == 1 else union_all(*boxes)
+    return and_(literal_column(f'{model.__tablename__}.rowid').in_(rowids), exact)
+
+
+_geo_index_lock = threading.Lock()
+
+
+def get_place_geo_index(load_points):
+    """Returns the kNN index of the places of the current app, built from load_points() on first use"""
+    index = current_app.extensions.get('place_geo_index')
+    if index is None:
+        with _geo_index_lock:
+            index = current_app.extensions.get('place_geo_index')
+            if index is None:
+                index = GeoIndex.from_points(load_points(), current_app.config.get('GEO_INDEX_CELL_DEG', 1.0))
+                current_app.extensions['place_geo_index'] = index
+    return index
+
+
+def register_geo_index_sync(session):
+    """Moves places in the in-memory kNN index once the transaction writing them commits.
+
+    The index only sees writes made by this process, through the ORM or a repository.
+    """
+    @event.listens_for(session, 'after_flush')
+    def collect_moves(session, flush_context):
+        moves = session.info.setdefault('geo_index_moves', [])
+        for obj in list(session.new) + list(session.dirty):
+            if getattr(type(obj), '__tablename__', None) == 'places':
+                moves.append((obj.id, obj.latitude, obj.longitude))
+        for obj in session.deleted:
+            if getattr(type(obj), '__tablename__', None) == 'places':
+                moves.append((obj.id, None, None))
+
+    @event.listens_for(session, 'after_commit')
+    def apply_moves(session):
+        moves = session.info.pop('geo_index_moves', [])
+        if not moves or not has_app_context():
+            return
+        index = current_app.extensions.get('place_geo_index')
+        if index is None:
+            # Not loaded yet, it will read the committed rows
+            return
+        for obj_id, lat, lon in moves:
+            if lat is None:
+                index.remove(obj_id)
+            else:
+                index.put(obj_id, lat, lon)
+
+    @event.listens_for(session, 'after_rollback')
+    def discard_moves(session):
+        session.info.pop('geo_index_moves', None)
+
+    def collect_row_move(session, obj_id, row, state):
+        session.info.setdefault('geo_index_moves', []).append((obj_id, row.latitude, row.longitude))
+
+    register_row_hook('places', RowHook(('latitude', 'longitude'), ('latitude', 'longitude'), after=collect_row_move))
@@ -0,0 +1,55 @@
+from sqlalchemy import event, insert, select, update
+from app.models.table_versions import initial_version, table_versions
+
+# A write to a table also changes what these tables serve: reviews update the aggregates of their place
+DEPENDENT_TABLES = {'reviews': ('places',)}
+
+
+def with_dependents(tables):
+    """tables and the tables whose responses they change"""
+    tables = set(tables)
+    return sorted(tables.union(*(DEPENDENT_TABLES.get(table, ()) for table in tables)))
+
+
+def bump_versions(connection, tables):
+    """Increments the version of tables in the transaction of connection: the new versions become
+    visible to every process when it commits, and vanish with it on rollback"""
+    names = with_dependents(tables)
+    result = connection.execute(update(table_versions).where(table_versions.c.name.in_(names))
+                                .values(version=table_versions.c.version + 1))
+    if result.rowcount < len(names):
+        # A database created before the table_versions rows were seeded
+        present = set(connection.execute(select(table_versions.c.name)
+                                          .where(table_versions.c.name.in_(names))).scalars())
+        connection.execute(insert(table_versions), [{'name': name, 'version': initial_version()}
+                                                    for name in names if name not in present])
+
+
+def read_versions(connection, tables):
+    """{table: version} of the tables that have a version row"""
+    return dict(connection.execute(select(table_versions.c.name, table_versions.c.version)
+                                   .where(table_versions.c.name.in_(set(tables)))).all())
+
+
+def read_stamp(connection, tables):
+    """Version of the data read from tables, such as places=1812,users=977. A table without a
+    version row yet reads as '-', which its first write replaces."""
+    versions = read_versions(connection, tables)
+    return ','.join(f'{name}={versions.get(name, "-")}' for name in sorted(set(tables)))
+
+
+def mark_changed(session, table):
+    """Bumps the version of a table written outside the ORM, such as by a single-statement update,
+    in the transaction of session"""
+    bump_versions(session.connection(), [table])
+
+
+def register_version_sync(session):
+    """Bumps the version of every table a flush writes to, in the same transaction"""
+    @event.listens_for(session, 'after_flush')
+    def bump_flushed_tables(session, flush_context):
+        tables = {getattr(type(obj), '__tablename__', None)
+                  for obj in list(session.new) + list(session.dirty) + list(session.deleted)}
+        tables.discard(None)
+        if tables:
+            bump_versions(session.connection(), tables)
@@ -2,6 +2,7 @@ from app.models.user import User
 from app.models.place import Place
 from app.models.review import Review
 from app.models.amenity import Amenity
+from app.utils.passwords import get_password_hasher
 
 
 from app.services.repositories.user_repository import UserRepository
@@ -29,6 +30,10 @@ class HBnBFacade:
         """Retrieves a user by ID."""
         return self.user_repo.get(user_id)
 
+    def get_user_stamp(self, user_id):
+        """Retrieves the (id, updated_at) row of a user without loading it, None if not found."""
+        return self.user_repo.get_stamp(user_id)
+
     def get_user_by_email(self, email):
         """Retrieves a user by email using the specific UserRepository method."""
         
@@ -38,14 +43,34 @@ class HBnBFacade:
         """Retrieves all users."""
         return self.user_repo.get_all()
 
-    def update_user(self, user_id, user_data):
-        """Updates a user by ID."""
-        user = self.user_repo.get(user_id)
+    def get_users_page(self, limit, cursor=None, fields=None):
+        """Retrieves one page of users and the cursor of the next page.
+        With fields, only those columns are read and rows are returned instead of users."""
+        query = self.user_repo.columns_query(fields) if fields else None
+        return self.user_repo.get_page(limit, cursor, query=query)
+
+    def update_user(self, user_id, user_data, user=None):
+        """Updates a user by ID, reusing the instance when the caller already loaded it."""
+        if user is None:
+            user = self.user_repo.get(user_id)
         if user:
-            self.user_repo.update(user_id, user_data)
-            return self.user_repo.get(user_id)
+            return self.user_repo.update_instance(user, user_data)
         return None
 
+    def update_user_returning(self, user_id, user_data, fields=User.PUBLIC_FIELDS):
+        """Updates a user in one statement and returns the given fields as a row, None if not found.
+        A new password is hashed before the statement and written along with the other fields."""
+        values = {}
+        if user_data.get('password'):
+            values['password'] = get_password_hasher().hash(user_data['password'])
+        return self.user_repo.update_returning(user_id, user_data, fields, **values)
+
+    def rehash_password_if_needed(self, user, password):
+        """Rehashes a just verified password when the configured bcrypt cost changed."""
+        if user.password_needs_rehash():
+            user.hash_password(password)
+            self.user_repo.update_instance(user, {})
+
     def delete_user(self, user_id):
         """Deletes a user by ID."""
         return self.user_repo.delete(user_id)
@@ -61,18 +86,32 @@ class HBnBFacade:
         """Retrieves an amenity by ID."""
         return self.amenity_repo.get(amenity_id)
 
+    def get_amenity_stamp(self, amenity_id):
+        """Retrieves the (id, updated_at) row of an amenity without loading it, None if not found."""
+        return self.amenity_repo.get_stamp(amenity_id)
+
     def get_all_amenities(self):
         """Retrieves all amenities."""
         return self.amenity_repo.get_all()
 
-    def update_amenity(self, amenity_id, amenity_data):
-        """Updates an amenity by ID."""
-        amenity = self.amenity_repo.get(amenity_id)
+    def get_amenities_page(self, limit, cursor=None, fields=None):
+        """Retrieves one page of amenities and the cursor of the next page.
+        With fields, only those columns are read and rows are returned instead of amenities."""
+        query = self.amenity_repo.columns_query(fields) if fields else None
+        return self.amenity_repo.get_page(limit, cursor, query=query)
+
+    def update_amenity(self, amenity_id, amenity_data, amenity=None):
+        """Updates an amenity by ID, reusing the instance when the caller already loaded it."""
+        if amenity is None:
+            amenity = self.amenity_repo.get(amenity_id)
         if amenity:
-            self.amenity_repo.update(amenity_id, amenity_data)
-            return self.amenity_repo.get(amenity_id)
+            return self.amenity_repo.update_instance(amenity, amenity_data)
         return None
 
+    def update_amenity_returning(self, amenity_id, amenity_data, fields=Amenity.PUBLIC_FIELDS):
+        """Updates an amenity in one statement and returns the given fields as a row, None if not found."""
+        return self.amenity_repo.update_returning(amenity_id, amenity_data, fields)
+
     def delete_amenity(self, amenity_id):
         """Deletes an amenity by ID."""
         return self.amenity_repo.delete(amenity_id)
@@ -86,28 +125,118 @@ class HBnBFacade:
             'description': place_data.get('description'),
             'price': place_data['price'],
             'latitude': place_data['latitude'],
-            'longitude': place_data['longitude']
+            'longitude': place_data['longitude'],
+            'owner_id': place_data['owner_id']
         }
         place = Place(**place_pure_data)
+        for amenity_id in place_data.get('amenities', []):
+            amenity = self.amenity_repo.get(amenity_id)
+            if not amenity:
+                raise ValueError(f"Amenity with ID {amenity_id} not found.")
+            place.amenities.append(amenity)
         self.place_repo.add(place)
         return place
 
-    def get_place(self, place_id):
-        """Retrieves a place by ID."""
+    def get_place(self, place_id, expand=()):
+        """Retrieves a place by ID, optionally with its relations eagerly loaded."""
+        if expand:
+            return self.place_repo.get_expanded(place_id, expand)
         return self.place_repo.get(place_id)
 
+    def get_place_stamp(self, place_id):
+        """Retrieves the (id, updated_at) row of a place without loading it, None if not found."""
+        return self.place_repo.get_stamp(place_id)
+
     def get_all_places(self):
         """Retrieves all places."""
         return self.place_repo.get_all()
 
-    def update_place(self, place_id, place_data):
-        """Updates a place by ID."""
-        place = self.place_repo.get(place_id)
-        if place:
-        
-            self.place_repo.update(place_id, place_data)
-            return self.place_repo.get(place_id)
-        return None
+    def get_places_page(self, limit, cursor=None, expand=(), fields=None,
+                        min_price=None, max_price=None, sort='created_at', amenities=(), amenities_any=()):
+        """Retrieves one page of places, with the expanded relations batch-loaded, and the cursor of the next page.
+        With fields, only those columns are read and rows are returned instead of places.
+        min_price/max_price bound the price; sort is created_at, price, rating (average), or any prefixed with - for descending.
+        Places must have every amenity id of amenities and at least one of amenities_any."""
+        if fields and expand:
+            raise ValueError("fields and expand cannot be combined")
+        if sort not in self.place_repo.SORTS:
+            raise ValueError(f"Cannot sort by {sort}, use one of: {', '.join(self.place_repo.SORTS)}")
+        sort_by, descending = self.place_repo.SORTS[sort]
+        if fields:
+            # The cursor of a price-sorted page is built from the price of its last row
+            query = self.place_repo.columns_query(tuple(fields) + ((sort_by,) if sort_by else ()))
+        else:
+            query = self.place_repo.expanded_query(expand)
+        query = self.place_repo.price_query(query, min_price, max_price)
+        query = self.place_repo.amenity_query(query, amenities, amenities_any)
+        return self.place_repo.get_page(limit, cursor, query=query, descending=descending, sort_by=sort_by)
+
+    def get_place_facets(self, min_price=None, max_price=None, amenities=(), amenities_any=()):
+        """Counts the places passing the filters of get_places_page: in total, per amenity,
+        per price bucket and per average rating, from the in-memory facet counters."""
+        counts = self.place_repo.facet_counts(min_price, max_price, amenities, amenities_any)
+        bounds = [0] + [float(bound) for bound in self.place_repo.facets().price_bounds] + [None]
+        return {
+            'total': counts['total'],
+            'amenities': [{'id': amenity.id, 'name': amenity.name, 'count': counts['amenities'].get(amenity.id, 0)}
+                          for amenity in self.amenity_repo.get_all()],
+            'price': [{'min': low, 'max': high, 'count': count}
+                      for low, high, count in zip(bounds, bounds[1:], counts['price'])],
+            # Average rating rounded down, 0 for places without reviews
+            'rating': [{'rating': rating, 'count': count} for rating, count in enumerate(counts['rating'])],
+        }
+
+    def get_best_places(self, kind, window, limit):
+        """Retrieves the trending (most reviewed) or top (best rated) places of a window such as 7d,
+        as (place, score) pairs best first; reviews weigh less the older they are."""
+        return self.place_repo.best_places(kind, window, limit)
+
+    def get_place_clusters(self, bbox, zoom):
+        """Retrieves the map clusters of the places in bbox (minLon, minLat, maxLon, maxLat) at a map
+        zoom level: centroid, count and lowest price of every non-empty grid cell in view."""
+        return self.place_repo.cluster_grid().clusters(bbox, zoom)
+
+    def search_places_page(self, bbox, limit, cursor=None, fields=None):
+        """Retrieves one page of the places inside bbox (minLon, minLat, maxLon, maxLat) and the cursor of the next page."""
+        return self.place_repo.get_bbox_page(bbox, limit, cursor, fields)
+
+    def search_places_text(self, q, limit, cursor=None, bbox=None):
+        """Retrieves one page of (place, highlight) pairs matching the free text q, best match first,
+        and the cursor of the next page. bbox optionally restricts the places to a bounding box."""
+        return self.place_repo.search_page(q, limit, cursor, bbox)
+
+    def update_place(self, place_id, place_data, place=None):
+        """Updates a place by ID, reusing the instance when the caller already loaded it."""
+        if place is None:
+            place = self.place_repo.get(place_id)
+        if not place:
+            return None
+        if 'amenities' in place_data:
+            amenities = []
+            for amenity_id in place_data['amenities']:
+                amenity = self.amenity_repo.get(amenity_id)
+                if not amenity:
+                    raise ValueError(f"Amenity with ID {amenity_id} not found.")
+                amenities.append(amenity)
+            place.amenities = amenities
+        return self.place_repo.update_instance(place, place_data)
+
+    def update_place_returning(self, place_id, place_data, fields=Place.SERIALIZED_FIELDS, owner_id=None):
+        """Updates a place's columns in one statement and returns the given fields as a row, None if not found
+        or, when owner_id is given, owned by someone else."""
+        where = None if owner_id is None else Place.owner_id == owner_id
+        return self.place_repo.update_returning(place_id, place_data, fields, where=where)
+
+    def get_nearby_places(self, lat, lon, k, max_km=None):
+        """Retrieves up to k (place, distance in km) pairs around a point, nearest first."""
+        return self.place_repo.nearest(lat, lon, k, max_km)
+
+    def get_similar_places(self, place_id, k):
+        """Retrieves up to k (place, similarity in [0, 1]) pairs of the places most like a place, by
+        amenities, price and location, most similar first; None if the place does not exist."""
+        if not self.place_repo.get(place_id):
+            return None
+        return self.place_repo.similar(place_id, k)
 
     def delete_place(self, place_id):
         """Deletes a place by ID."""
@@ -119,7 +248,9 @@ class HBnBFacade:
         
         review_pure_data = {
             'text': review_data['text'],
-            'rating': review_data['rating']
+            'rating': review_data['rating'],
+            'user_id': review_data['user_id'],
+            'place_id': review_data['place_id']
         }
         review = Review(**review_pure_data)
         self.review_repo.add(review)
@@ -129,19 +260,55 @@ class HBnBFacade:
         """Retrieves a review by ID."""
         return self.review_repo.get(review_id)
 
+    def get_review_stamp(self, review_id):
+        """Retrieves the (id, updated_at) row of a review without loading it, None if not found."""
+        return self.review_repo.get_stamp(review_id)
+
     def get_all_reviews(self):
         """Retrieves all reviews."""
         return self.review_repo.get_all()
 
-    def update_review(self, review_id, review_data):
-        """Updates a review by ID."""
-        review = self.review_repo.get(review_id)
+    def get_reviews_page(self, limit, cursor=None, fields=None):
+        """Retrieves one page of reviews and the cursor of the next page.
+        With fields, only those columns are read and rows are returned instead of reviews."""
+        query = self.review_repo.columns_query(fields) if fields else None
+        return self.review_repo.get_page(limit, cursor, query=query)
+
+    def search_reviews_page(self, q, limit, cursor=None):
+        """Retrieves one page of (review, highlight) pairs matching the free text q, best match first,
+        and the cursor of the next page."""
+        return self.review_repo.search_page(q, limit, cursor)
+
+    def has_reviewed(self, user_id, place_id):
+        """Checks whether a user already reviewed a place."""
+        return self.review_repo.exists_review(user_id, place_id)
+
+    def get_reviews_by_place(self, place_id, limit=None, cursor=None, newest_first=True):
+        """Retrieves one page of the reviews of a place and the cursor of the next page."""
+        return self.review_repo.get_reviews_by_place(place_id, limit, cursor, newest_first)
+
+    def update_review(self, review_id, review_data, review=None):
+        """Updates a review by ID, reusing the instance when the caller already loaded it."""
+        if review is None:
+            review = self.review_repo.get(review_id)
         if review:
-        
-            self.review_repo.update(review_id, review_data)
-            return self.review_repo.get(review_id)
+            return self.review_repo.update_instance(review, review_data)
         return None
 
+    def update_review_returning(self, review_id, review_data, fields=Review.PUBLIC_FIELDS):
+        """Updates a review in one statement and returns the given fields as a row, None if not found."""
+        return self.review_repo.update_returning(review_id, review_data, fields)
+
     def delete_review(self, review_id):
         """Deletes a review by ID."""
         return self.review_repo.delete(review_id)
+
+    # --- Autocomplete ---
+    def autocomplete(self, q, kind, limit):
+        """Suggests the places (kind 'place', by title) or amenities (kind 'amenity', by name) having a word
+        that starts with q, most reviewed places or most used amenities first."""
+        if kind == 'place':
+            return [{'id': obj_id, 'title': title} for obj_id, title in self.place_repo.title_index().complete(q, limit)]
+        if kind == 'amenity':
+            return [{'id': obj_id, 'name': name} for obj_id, name in self.amenity_repo.name_index().complete(q, limit)]
+        raise ValueError("type must be place or amenity")
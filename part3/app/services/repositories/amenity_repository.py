@@ -1,6 +1,19 @@
+from sqlalchemy import func, select
 from app.models.amenity import Amenity
+from app.models.place_amenities import place_amenities
+from app.persistence.autocomplete import get_prefix_index
 from app.persistence.repository import SQLAlchemyRepository
 
 class AmenityRepository(SQLAlchemyRepository):
     def __init__(self):
         super().__init__(Amenity)
+
+    def name_index(self):
+        """Prefix index of the amenity names, ranked by number of places, loaded on first use"""
+        from app import db
+        return get_prefix_index('amenities', lambda: db.session.execute(
+            select(self.model.id, self.model.name, func.count(place_amenities.c.place_id))
+            .outerjoin(place_amenities, place_amenities.c.amenity_id == self.model.id)
+            .group_by(self.model.id)
+        ).all())
+
@@ -1,6 +1,227 @@
+import json
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.orm import joinedload, selectinload
 from app.models.place import Place
+from app.models.place_amenities import place_amenities
+from app.models.place_scores import leaderboard_checkpoints, leaderboard_scores
+from app.models.review import Review
+from app.persistence.autocomplete import get_prefix_index
+from app.persistence.bitmaps import get_amenity_bitmaps
+from app.persistence.clusters import get_cluster_grid
+from app.persistence.facets import get_facet_cache, get_place_facets
+from app.persistence.leaderboard import get_leaderboard, load_checkpoint, save_checkpoint
 from app.persistence.repository import SQLAlchemyRepository
+from app.persistence.pagination import decode_rowid_cursor, encode_rowid_cursor
+from app.persistence.search import PLACES_FTS
+from app.persistence.similarity import get_place_vectors
+from app.persistence.spatial import bbox_filter, get_place_geo_index, has_place_rtree
 
 class PlaceRepository(SQLAlchemyRepository):
+    # Relations that ?expand= may ask for, each loaded with one batched query per page
+    EXPANDABLE = {
+        'owner': lambda: joinedload(Place.owner),
+        'amenities': lambda: selectinload(Place.amenities),
+        'reviews': lambda: selectinload(Place.reviews),
+    }
+
+    # ?sort= values: (column paged by, None meaning created_at; descending)
+    SORTS = {
+        'created_at': (None, False),
+        '-created_at': (None, True),
+        'price': ('price', False),
+        '-price': ('price', True),
+        'rating': ('rating_avg', False),
+        '-rating': ('rating_avg', True),
+    }
+
+    full_text = PLACES_FTS
+
     def __init__(self):
         super().__init__(Place)
+
+    def price_query(self, query=None, min_price=None, max_price=None):
+        """Restricts a query to the places priced within [min_price, max_price], either bound optional"""
+        query = query if query is not None else self.model.query
+        if min_price is not None:
+            query = query.filter(self.model.price >= min_price)
+        if max_price is not None:
+            query = query.filter(self.model.price <= max_price)
+        return query
+
+    def expanded_query(self, expand=()):
+        """Returns a query that eagerly loads the requested relations"""
+        unknown = set(expand) - set(self.EXPANDABLE)
+        if unknown:
+            raise ValueError(f"Cannot expand: {', '.join(sorted(unknown))}")
+        return self.model.query.options(*(self.EXPANDABLE[name]() for name in expand))
+
+    def get_expanded(self, place_id, expand=()):
+        """Retrieves a place with the requested relations already loaded"""
+        return self.expanded_query(expand).filter_by(id=place_id).first()
+
+    def amenity_bitmaps(self):
+        """The per-amenity bitmaps of the places, built from place_amenities on first use"""
+        from app import db
+        return get_amenity_bitmaps(
+            lambda: db.session.execute(select(place_amenities.c.place_id, place_amenities.c.amenity_id)).all()
+        )
+
+    def amenity_query(self, query=None, all_of=(), any_of=()):
+        """Restricts a query to the places having every amenity of all_of and one of any_of"""
+        query = query if query is not None else self.model.query
+        if not all_of and not any_of:
+            return query
+        place_ids = self.amenity_bitmaps().match(all_of, any_of)
+        # One JSON parameter whatever the number of matches, expanded by SQLite's json_each
+        matches = select(func.json_each(json.dumps(place_ids)).table_valued('value').c.value)
+        return query.filter(self.model.id.in_(matches))
+
+    def _use_rtree(self):
+        """Whether the database holds the places R*Tree, checked once per app"""
+        from flask import current_app
+        from app import db
+        use_rtree = current_app.extensions.get('place_rtree')
+        if use_rtree is None:
+            use_rtree = current_app.extensions['place_rtree'] = has_place_rtree(db.engine)
+        return use_rtree
+
+    def facets(self):
+        """The facet counters of the places over their amenity bitmaps, built from the prices and
+        average ratings of the places on first use"""
+        from app import db
+        return get_place_facets(self.amenity_bitmaps(), lambda: db.session.execute(
+            select(self.model.id, self.model.price, self.model.rating_avg)).all())
+
+    def facet_counts(self, min_price=None, max_price=None, all_of=(), any_of=()):
+        """Facet counts of the places passing the filters, cached per filter combination until the next write"""
+        facets = self.facets()
+        cache = get_facet_cache()
+        # Amenity order does not change the result, share one entry
+        key = (facets.version, min_price, max_price, tuple(sorted(set(all_of))), tuple(sorted(set(any_of))))
+        counts = cache.get(key)
+        if counts is None:
+            counts = facets.count(min_price, max_price, all_of, any_of)
+            cache.set(key, counts)
+        return counts
+
+    def leaderboard(self, rebuild=False):
+        """The trending and top-rated scores of the places, loaded on first use from the last checkpoint
+        plus the reviews written since, or from every review recent enough to count when rebuild is set"""
+        from app import db
+
+        def load(leaderboard):
+            since = leaderboard.horizon()
+            connection = db.session.connection()
+            if not rebuild and load_checkpoint(leaderboard, connection, leaderboard_checkpoints, leaderboard_scores):
+                since = max(since, leaderboard.watermark) if leaderboard.watermark else since
+            reviews = db.session.execute(
+                select(Review.place_id, Review.created_at, Review.rating).where(Review.created_at > since)
+            )
+            for place_id, created_at, rating in reviews:
+                leaderboard.add_review(place_id, created_at, rating)
+        if rebuild:
+            from flask import current_app
+            current_app.extensions.pop('leaderboard', None)
+        return get_leaderboard(load)
+
+    def save_leaderboard(self):
+        """Checkpoints the leaderboard so that the next start only reads the reviews written after it"""
+        from app import db
+        with db.engine.begin() as connection:
+            save_checkpoint(self.leaderboard(), connection, leaderboard_checkpoints, leaderboard_scores)
+
+    def best_places(self, kind, window, limit):
+        """Returns up to limit (place, score) pairs of the trending or top leaderboard of a window, best first"""
+        try:
+            hits = self.leaderboard().best(window, kind, limit)
+        except KeyError:
+            raise ValueError(f"Unknown window {window}, use one of: {', '.join(self.leaderboard().windows)}")
+        if not hits:
+            return []
+        places = {place.id: place for place in
+                  self.model.query.filter(self.model.id.in_([place_id for place_id, _ in hits]))}
+        # A place deleted by another process may still be ranked here
+        return [(places[place_id], score) for place_id, score in hits if place_id in places]
+
+    def title_index(self):
+        """Prefix index of the place titles, ranked by number of reviews, loaded on first use"""
+        from app import db
+        return get_prefix_index('places', lambda: db.session.execute(
+            select(self.model.id, self.model.title, self.model.review_count)
+        ).all())
+
+    def vectors(self):
+        """Feature vectors of the places and the neighbour cache of the hot ones, built on first use"""
+        from app import db
+        return get_place_vectors(lambda: (
+            db.session.execute(select(self.model.id, self.model.price, self.model.latitude,
+                                      self.model.longitude)).all(),
+            db.session.execute(select(place_amenities.c.place_id, place_amenities.c.amenity_id)).all(),
+        ))
+
+    def similar(self, place_id, k):
+        """Returns up to k (place, similarity) pairs of the places most like place_id, most similar first"""
+        from flask import current_app
+        vectors, neighbours = self.vectors()
+        hits = neighbours.get(place_id, k)
+        if hits is None:
+            max_k = current_app.config.get('SIMILAR_PLACES', {}).get('max_k', 50)
+            generation = neighbours.generation
+            hits = vectors.similar(place_id, max(k, max_k))
+            neighbours.put(place_id, hits, generation)
+            hits = hits[:k]
+        if not hits:
+            return []
+        places = {place.id: place for place in
+                  self.model.query.filter(self.model.id.in_([obj_id for obj_id, _ in hits]))}
+        # A place deleted since the list was computed is skipped
+        return [(places[obj_id], score) for obj_id, score in hits if obj_id in places]
+
+    def cluster_grid(self):
+        """The per-zoom grid aggregates of the places for map clusters, built from the table on first use"""
+        from app import db
+        return get_cluster_grid(lambda: db.session.execute(
+            select(self.model.id, self.model.latitude, self.model.longitude, self.model.price)
+        ).all())
+
+    def get_bbox_page(self, bbox, limit, cursor=None, fields=None):
+        """Returns one page of the places inside bbox and the cursor of the next page.
+        Through the R*Tree the page follows the rowid, so SQLite only reads the rows it returns
+        instead of sorting every match; without it the page falls back to get_page."""
+        query = self.columns_query(fields) if fields else self.model.query
+        use_rtree = self._use_rtree()
+        query = query.filter(bbox_filter(self.model, bbox, use_rtree))
+        if not use_rtree:
+            return self.get_page(limit, cursor, query=query)
+        rowid = literal_column('places.rowid')
+        if cursor:
+            query = query.filter(rowid > decode_rowid_cursor(cursor))
+        rows = query.add_columns(rowid.label('rowid')).order_by(rowid).limit(limit + 1).all()
+        next_cursor = encode_rowid_cursor(rows[limit - 1].rowid) if len(rows) > limit else None
+        rows = rows[:limit]
+        # Projected rows keep the extra rowid column, row_to_dict ignores it
+        return (rows if fields else [row[0] for row in rows]), next_cursor
+
+    def search_page(self, q, limit, cursor=None, bbox=None):
+        """Full-text search of the titles and descriptions, optionally restricted to the places inside bbox"""
+        query = self.model.query
+        if bbox is not None:
+            query = query.filter(bbox_filter(self.model, bbox, self._use_rtree()))
+        return super().search_page(q, limit, cursor, query=query)
+
+    def geo_index(self):
+        """The in-memory kNN index of the places, loaded from the table on first use"""
+        from app import db
+        return get_place_geo_index(
+            lambda: db.session.query(self.model.id, self.model.latitude, self.model.longitude).all()
+        )
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """Returns up to k (place, distance in km) pairs ordered by great-circle distance"""
+        hits = self.geo_index().nearest(lat, lon, k, max_km)
+        if not hits:
+            return []
+        places = {place.id: place for place in
+                  self.model.query.filter(self.model.id.in_([obj_id for obj_id, _ in hits]))}
+        # A place deleted by another process may still be indexed here
+        return [(places[obj_id], distance) for obj_id, distance in hits if obj_id in places]
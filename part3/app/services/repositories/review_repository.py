@@ -1,6 +1,20 @@
+from app import db
 from app.models.review import Review
 from app.persistence.repository import SQLAlchemyRepository
+from app.persistence.search import REVIEWS_FTS
 
 class ReviewRepository(SQLAlchemyRepository):
+    full_text = REVIEWS_FTS
+
     def __init__(self):
         super().__init__(Review)
+
+    def get_reviews_by_place(self, place_id, limit=None, cursor=None, newest_first=True):
+        """Returns one page of the reviews of a place, served by the (place_id, created_at) index."""
+        query = self.model.query.filter_by(place_id=place_id)
+        return self.get_page(limit, cursor, query=query, descending=newest_first)
+
+    def exists_review(self, user_id, place_id):
+        """Returns True if the user already reviewed the place (EXISTS on the unique index)."""
+        query = self.model.query.filter_by(user_id=user_id, place_id=place_id)
+        return db.session.query(query.exists()).scalar()
@@ -0,0 +1,39 @@
+import hashlib
+from flask import Response, request
+from werkzeug.http import http_date
+from app.persistence.versions import read_stamp
+
+
+def entity_tag(*parts):
+    """Strong entity tag of a representation, a hash of what it is built from"""
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest() + '"'
+
+
+def table_stamp(*tables):
+    """Version stamp of the data of tables, read from the database: changed by every committed write
+    to any of them, whichever process made it"""
+    from app import db
+    return read_stamp(db.session.connection(), tables)
+
+
+def list_tag(*tables):
+    """Entity tag of a list read from tables: their versions, plus the query string and Accept header
+    that shape the response"""
+    return entity_tag(table_stamp(*tables), request.full_path, request.headers.get('Accept'))
+
+
+def conditional(etag, last_modified=None):
+    """Checks the validators of a GET against the request: returns the ETag and Last-Modified headers
+    of the representation, and the 304 response to send instead of it when the client's copy is current.
+    If-None-Match takes precedence over If-Modified-Since."""
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        # HTTP dates have whole seconds, updated_at is naive UTC
+        last_modified = last_modified.replace(microsecond=0)
+        headers['Last-Modified'] = http_date(last_modified)
+    if request.if_none_match:
+        current = request.if_none_match.contains_weak(etag.strip('"'))
+    else:
+        since = request.if_modified_since
+        current = last_modified is not None and since is not None and last_modified <= since.replace(tzinfo=None)
+    return headers, (Response(status=304, headers=headers) if current else None)
@@ -0,0 +1,17 @@
+from datetime import datetime
+from flask import request
+
+
+def get_fields_args(default=None):
+    """Reads ?fields=a,b,c from the query string, falling back to default"""
+    fields = tuple(name.strip() for name in request.args.get('fields', '').split(',') if name.strip())
+    return fields or default
+
+
+def row_to_dict(row, fields):
+    """Builds the JSON dict of a projected row, keeping only the requested fields"""
+    data = {}
+    for name in fields:
+        value = getattr(row, name)
+        data[name] = value.isoformat() if isinstance(value, datetime) else value
+    return data
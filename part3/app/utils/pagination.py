@@ -0,0 +1,14 @@
+from flask import current_app, request
+
+
+def get_page_args():
+    """Reads ?limit= and ?cursor= from the query string, bounding limit by the config"""
+    default = current_app.config.get('DEFAULT_PAGE_SIZE', 20)
+    maximum = current_app.config.get('MAX_PAGE_SIZE', 100)
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, maximum)), request.args.get('cursor')
+
+
+def page_headers(next_cursor):
+    """Headers advertising the cursor of the next page, empty on the last page"""
+    return {'X-Next-Cursor': next_cursor} if next_cursor else {}
@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+
+class HasherBusy(Exception):
+    """Raised when too many password operations are already waiting for a worker"""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded pool of worker threads.
+
+    At most `workers` hashes run at once, so a login burst cannot take every CPU
+    away from the cheap requests. Past `max_pending` queued operations new ones
+    are rejected with HasherBusy instead of piling up behind the pool.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=32):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+            self._slots.release()
+
+    def _call(self, fn, *args):
+        """Runs fn on the pool and waits for its result"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Too many password operations in progress, try again later")
+        with self._lock:
+            self.queued += 1
+        return self._executor.submit(self._run, fn, *args).result()
+
+    def hash(self, password):
+        """Hashes a password with the configured cost"""
+        from app import bcrypt
+        return self._call(bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def check(self, pw_hash, password):
+        """Checks a password against a stored hash"""
+        from app import bcrypt
+        return self._call(bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """True when the hash was made with another cost than the configured one"""
+        try:
+            return int(pw_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return True
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'rounds': self.rounds,
+            'queued': self.queued,
+            'running': self.running,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+
+def get_password_hasher():
+    """Returns the password hasher of the current app, created on first use"""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        settings = current_app.config.get('PASSWORD_HASHER', {})
+        hasher = PasswordHasher(rounds=current_app.config.get('BCRYPT_LOG_ROUNDS', 12), **settings)
+        current_app.extensions['password_hasher'] = hasher
+    return hasher
+
+
+def password_hasher_stats(app):
+    """Queue depth and counters of the app's password hasher, None before first use"""
+    hasher = app.extensions.get('password_hasher')
+    return hasher.stats() if hasher is not None else None
@@ -0,0 +1,67 @@
+import json
+from operator import attrgetter
+from flask import make_response
+
+try:
+    import orjson
+except ImportError:     # optional: the standard library encoder is used instead
+    orjson = None
+
+_encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+def dumps(data):
+    """Compact JSON of data as UTF-8 bytes, encoded by orjson when it is installed"""
+    if orjson is not None:
+        # Swagger documents key their responses by status code
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return _encode(data).encode()
+
+
+def output_json(data, code, headers=None):
+    """flask-restx representation of application/json through dumps"""
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    response.content_type = 'application/json'
+    return response
+
+
+def iso_timestamps(obj):
+    """created_at and updated_at of a model instance in ISO format, formatted once per version:
+    they are kept on the instance until either timestamp is replaced"""
+    created_at, updated_at = obj.created_at, obj.updated_at
+    memo = vars(obj).get('_iso_timestamps')
+    if memo is not None and memo[0] is created_at and memo[1] is updated_at:
+        return memo[2], memo[3]
+    created, updated = (value.isoformat() if value is not None else None for value in (created_at, updated_at))
+    # Not a mapped attribute: written around the SQLAlchemy instrumentation
+    vars(obj)['_iso_timestamps'] = (created_at, updated_at, created, updated)
+    return created, updated
+
+
+class FieldExtractor:
+    """Builds the JSON dict of a model instance: columns read with one attrgetter call,
+    computed fields, then the ISO timestamps. Made once per model, at class definition."""
+
+    def __init__(self, fields, computed=None):
+        self.fields = tuple(fields)
+        self._values = attrgetter(*self.fields) if len(self.fields) > 1 else \
+            (lambda obj, getter=attrgetter(*self.fields): (getter(obj),))
+        self.computed = tuple((computed or {}).items())
+
+    def __call__(self, obj):
+        data = dict(zip(self.fields, self._values(obj)))
+        for name, compute in self.computed:
+            data[name] = compute(obj)
+        data['created_at'], data['updated_at'] = iso_timestamps(obj)
+        return data
+
+    def from_row(self, row):
+        """Same dict from a row tuple holding the fields, the columns the computed fields read and
+        both timestamps, such as one returned by an UPDATE ... RETURNING"""
+        data = dict(zip(self.fields, self._values(row)))
+        for name, compute in self.computed:
+            data[name] = compute(row)
+        data['created_at'], data['updated_at'] = (value.isoformat() if value is not None else None
+                                                  for value in (row.created_at, row.updated_at))
+        return data
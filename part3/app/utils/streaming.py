@@ -0,0 +1,50 @@
+from flask import Response, request, stream_with_context
+from app.utils.serializer import dumps
+
+NDJSON = 'application/x-ndjson'
+# Items serialized before a chunk is handed to the server
+ITEMS_PER_WRITE = 100
+
+
+def wants_ndjson():
+    """Whether the client asked for newline-delimited JSON with Accept: application/x-ndjson"""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+
+def _chunks(items, to_dict, separator):
+    """JSON documents of the items joined by separator, a few at a time"""
+    buffer = []
+    for item in items:
+        buffer.append(dumps(to_dict(item)))
+        if len(buffer) == ITEMS_PER_WRITE:
+            yield separator.join(buffer)
+            buffer = []
+    if buffer:
+        yield separator.join(buffer)
+
+
+def stream_ndjson(items, to_dict):
+    """Response writing one JSON document per line as the items are read, in constant memory"""
+    def generate():
+        for chunk in _chunks(items, to_dict, b'\n'):
+            yield chunk + b'\n'
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+
+def stream_json_array(items, to_dict):
+    """Response writing a JSON array as the items are read, in constant memory"""
+    def generate():
+        yield b'['
+        separator = b''
+        for chunk in _chunks(items, to_dict, b','):
+            yield separator + chunk
+            separator = b','
+        yield b']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def stream_list(items, to_dict):
+    """Streams the items as NDJSON when the client asked for it, as a JSON array otherwise"""
+    if wants_ndjson():
+        return stream_ndjson(items, to_dict)
+    return stream_json_array(items, to_dict)
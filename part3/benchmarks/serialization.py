@@ -0,0 +1,88 @@
+"""Rows per second of the place serialization, before and after app/utils/serializer.py.
+
+Run from part3: python -m benchmarks.serialization [rows]
+
+"before" is the former Place.to_dict (a dict literal, isoformat on every call)
+encoded by the standard json module as flask-restx does; "after" is the
+FieldExtractor of Place encoded by dumps (orjson when installed).
+"""
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import insert
+from app import create_app, db
+from app.models.place import Place
+from app.models.user import User
+from app.utils import serializer
+
+
+def legacy_to_dict(place):
+    return {
+        'id': place.id,
+        'title': place.title,
+        'description': place.description,
+        'price': place.price,
+        'latitude': place.latitude,
+        'longitude': place.longitude,
+        'review_count': place.review_count,
+        'rating_sum': place.rating_sum,
+        'rating_avg': place.rating_avg,
+        'rating_histogram': {str(star): getattr(place, f'rating_{star}') for star in range(1, 6)},
+        'created_at': place.created_at.isoformat(),
+        'updated_at': place.updated_at.isoformat()
+    }
+
+
+def rate(rows, serialize, repeat=3):
+    """Best rows per second of serialize(rows) over a few runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize(rows)
+        best = min(best, time.perf_counter() - start)
+    return len(rows) / best
+
+
+def main(count=20000):
+    app = create_app('config.TestingConfig')
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name='Bench', last_name='User', email='bench@example.com', password='x')
+        db.session.add(owner)
+        db.session.commit()
+        now = datetime.utcnow()
+        db.session.execute(insert(Place), [
+            {'id': str(uuid.uuid4()), 'title': f'Place {i}', 'description': 'A quiet flat near the park',
+             'price': 10.0 + i % 300, 'latitude': 45.0, 'longitude': 3.0, 'owner_id': owner.id,
+             'created_at': now, 'updated_at': now}
+            for i in range(count)
+        ])
+        db.session.commit()
+        places = Place.query.all()
+
+        cases = [
+            ('to_dict, first call', lambda rows: [legacy_to_dict(p) for p in rows],
+             lambda rows: [p.to_dict() for p in rows]),
+            ('to_dict, cached instance', lambda rows: [legacy_to_dict(p) for p in rows],
+             lambda rows: [p.to_dict() for p in rows]),
+            ('to_dict + JSON encode', lambda rows: json.dumps([legacy_to_dict(p) for p in rows]).encode(),
+             lambda rows: serializer.dumps([p.to_dict() for p in rows])),
+        ]
+        print(f"{count} places, encoder: {'orjson' if serializer.orjson else 'json'}")
+        for name, before, after in cases:
+            if name == 'to_dict, first call':
+                # Drop the memoized timestamps so that every call formats them
+                for place in places:
+                    vars(place).pop('_iso_timestamps', None)
+                old = rate(places, before, repeat=1)
+                new = rate(places, after, repeat=1)
+            else:
+                old, new = rate(places, before), rate(places, after)
+            print(f"{name:26} before {old:>10,.0f} rows/s   after {new:>10,.0f} rows/s   x{new / old:.1f}")
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -5,11 +5,72 @@ class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///hbnb.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     DEBUG = False
+    # Page size bounds for the list endpoints (?limit=)
+    DEFAULT_PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+    # Rows read per round trip when a list is streamed (Accept: application/x-ndjson and admin exports)
+    STREAM_CHUNK_SIZE = 500
+    # Log a warning at startup for every model index missing from the database
+    CHECK_SCHEMA_INDEXES = True
+    # Read-through LRU+TTL cache of repository get/get_all, per table (maxsize entries, ttl seconds).
+    # Tables missing here are not cached.
+    ENTITY_CACHE = {
+        'places': {'maxsize': 4096, 'ttl': 300},
+        'users': {'maxsize': 2048, 'ttl': 300},
+        'amenities': {'maxsize': 256, 'ttl': 3600},
+    }
+    # Keep an SQLite R*Tree of the places coordinates for /places/search?bbox=
+    PLACE_RTREE = True
+    # In-memory kNN index of the places for /places/nearby: grid cell size in degrees, built at startup
+    GEO_INDEX_CELL_DEG = 1.0
+    GEO_INDEX_PRELOAD = True
+    # Create the SQLite FTS5 indexes behind /places/search?q= and /reviews/search at startup if missing
+    FULL_TEXT_SEARCH = True
+    # /places/facets: upper bounds of the price buckets, and the LRU cache of the counts per filter combination
+    PLACE_FACETS = {'price_bounds': (50, 100, 200, 500), 'cache_size': 256, 'cache_ttl': 60}
+    # Build the /autocomplete prefix indexes of place titles and amenity names at startup
+    AUTOCOMPLETE_PRELOAD = True
+    # /places/top and /places/trending: decay time constant of each ?window= in seconds, places kept per
+    # leaderboard, and seconds between two checkpoints saved after a review write (None to disable)
+    LEADERBOARD = {
+        'windows': {'24h': 86400, '7d': 604800, '30d': 2592000},
+        'k': 100,
+        'checkpoint_interval': 600,
+    }
+    # /places/clusters: deepest zoom level aggregated (deeper zooms use its cells), and grid cells
+    # along a 256 px map tile side, a power of two
+    PLACE_CLUSTERS = {'max_zoom': 14, 'cells_per_tile': 4}
+    # /places/<id>/similar: weight of each feature, log-price difference and distance in km at which
+    # their similarity falls to 1/e, longest list served, and how many of the most requested places
+    # get their list recomputed every refresh_interval seconds (None to disable) and kept ttl seconds
+    SIMILAR_PLACES = {
+        'weights': {'amenities': 0.5, 'price': 0.2, 'location': 0.3},
+        'price_scale': 0.5,
+        'distance_km': 50.0,
+        'max_k': 50,
+        'hot_places': 100,
+        'refresh_interval': 60,
+        'ttl': 300,
+    }
+    # bcrypt cost; hashes made with another cost are redone at the next login
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    # bcrypt runs on this many worker threads; past max_pending waiting operations requests get a 503
+    PASSWORD_HASHER = {'workers': 2, 'max_pending': 32}
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    BCRYPT_LOG_ROUNDS = 4
+    # The in-memory test database is shared by every thread, checkpoints are saved explicitly
+    LEADERBOARD = dict(Config.LEADERBOARD, checkpoint_interval=None)
+    # Neighbour lists are refreshed explicitly
+    SIMILAR_PLACES = dict(Config.SIMILAR_PLACES, refresh_interval=None)
+
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
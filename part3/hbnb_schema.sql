@@ -30,6 +30,14 @@ CREATE TABLE places (
     latitude FLOAT NOT NULL CHECK (latitude >= -90.0 AND latitude <= 90.0),   -- GPS validation
     longitude FLOAT NOT NULL CHECK (longitude >= -180.0 AND longitude <= 180.0), -- GPS validation
     owner_id CHAR(36) NOT NULL,                 -- Foreign key to users
+    review_count INT NOT NULL DEFAULT 0,        -- Aggregates of the reviews, maintained by the application
+    rating_sum INT NOT NULL DEFAULT 0,
+    rating_avg FLOAT NOT NULL DEFAULT 0,
+    rating_1 INT NOT NULL DEFAULT 0,            -- Histogram: reviews per star
+    rating_2 INT NOT NULL DEFAULT 0,
+    rating_3 INT NOT NULL DEFAULT 0,
+    rating_4 INT NOT NULL DEFAULT 0,
+    rating_5 INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE
@@ -66,6 +74,33 @@ CREATE TABLE place_amenities (
     FOREIGN KEY (amenity_id) REFERENCES amenities(id) ON DELETE CASCADE
 );
 
+-- Checkpoints of the trending/top-rated leaderboards, one per window (scores relative to its epoch)
+CREATE TABLE leaderboard_checkpoints (
+    window VARCHAR(16) PRIMARY KEY,             -- 24h, 7d, 30d
+    epoch FLOAT NOT NULL,                       -- Unix time the scores are relative to
+    watermark TIMESTAMP,                        -- created_at of the last review counted
+    saved_at TIMESTAMP NOT NULL,
+    retractions BIGINT                          -- table_versions of leaderboard_scores when saved
+);
+
+CREATE TABLE leaderboard_scores (
+    window VARCHAR(16) NOT NULL,
+    place_id CHAR(36) NOT NULL,
+    trending FLOAT NOT NULL,                    -- Decayed review count
+    top FLOAT NOT NULL,                         -- Decayed stars / 5
+    PRIMARY KEY (window, place_id)
+);
+
+-- Change counter of every table, bumped by each transaction writing to it (validates the list ETags)
+CREATE TABLE table_versions (
+    name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+INSERT INTO table_versions (name, version) VALUES
+    ('users', 0), ('places', 0), ('amenities', 0), ('reviews', 0), ('place_amenities', 0),
+    ('leaderboard_checkpoints', 0), ('leaderboard_scores', 0);
+
 -- ================================================
 -- 2. INITIAL DATA INSERTION
 -- ================================================
@@ -106,6 +141,35 @@ CREATE INDEX idx_reviews_place ON reviews(place_id);
 -- Index on amenity name for faster searches
 CREATE INDEX idx_amenities_name ON amenities(name);
 
+-- Composite indexes for the paginated access paths (owner's places, place's reviews)
+CREATE INDEX idx_places_owner_created ON places(owner_id, created_at);
+CREATE INDEX idx_reviews_place_created ON reviews(place_id, created_at, id);
+CREATE INDEX idx_places_price ON places(price, id);
+CREATE INDEX idx_places_rating ON places(rating_avg, id);
+
+-- Coordinates of the places for bounding-box search (SQLite R*Tree, keyed by places.rowid)
+CREATE VIRTUAL TABLE places_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+INSERT INTO places_rtree SELECT rowid, longitude, longitude, latitude, latitude FROM places;
+CREATE TRIGGER places_rtree_insert AFTER INSERT ON places BEGIN
+    INSERT INTO places_rtree VALUES (new.rowid, new.longitude, new.longitude, new.latitude, new.latitude);
+END;
+CREATE TRIGGER places_rtree_update AFTER UPDATE OF latitude, longitude ON places BEGIN
+    UPDATE places_rtree SET min_lon = new.longitude, max_lon = new.longitude,
+        min_lat = new.latitude, max_lat = new.latitude WHERE id = new.rowid;
+END;
+CREATE TRIGGER places_rtree_delete AFTER DELETE ON places BEGIN
+    DELETE FROM places_rtree WHERE id = old.rowid;
+END;
+
+-- Full-text indexes (SQLite FTS5, external content keyed by rowid). The application keeps them in
+-- sync on its own writes; after writing the tables directly, run `flask rebuild-search-index`.
+CREATE VIRTUAL TABLE places_fts USING fts5(title, description, content='places', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2');
+INSERT INTO places_fts(places_fts) VALUES ('rebuild');
+CREATE VIRTUAL TABLE reviews_fts USING fts5(text, content='reviews', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2');
+INSERT INTO reviews_fts(reviews_fts) VALUES ('rebuild');
+
 -- ================================================
 -- 4. CRUD OPERATIONS TESTING
 -- ================================================
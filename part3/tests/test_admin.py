@@ -0,0 +1,57 @@
+import json
+import unittest
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+
+
+class TestAdminApi(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        admin = User(first_name="Admin", last_name="User", email="admin@example.com", password="x", is_admin=True)
+        owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        db.session.add_all([admin, owner])
+        db.session.flush()
+        db.session.add_all([Place(title=f"Place {i}", price=float(i), latitude=0.0, longitude=0.0,
+                                  owner_id=owner.id) for i in range(3)])
+        db.session.commit()
+        self.admin_id, self.owner_id = admin.id, owner.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def headers(self, user_id, is_admin, **extra):
+        token = create_access_token(identity=user_id, additional_claims={'is_admin': is_admin})
+        return dict(extra, Authorization=f'Bearer {token}')
+
+    def test_lists_are_streamed(self):
+        response = self.client.get('/api/v1/admin/places',
+                                   headers=self.headers(self.admin_id, True, Accept='application/x-ndjson'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        places = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(place['title'] for place in places), ['Place 0', 'Place 1', 'Place 2'])
+        users = self.client.get('/api/v1/admin/users', headers=self.headers(self.admin_id, True))
+        self.assertEqual(sorted(user['email'] for user in users.json), ['admin@example.com', 'owner@example.com'])
+        self.assertNotIn('password', users.json[0])
+
+    def test_admin_only(self):
+        response = self.client.get('/api/v1/admin/users', headers=self.headers(self.owner_id, False))
+        self.assertEqual(response.status_code, 403)
+
+    def test_delete_place(self):
+        place_id = Place.query.first().id
+        url = f'/api/v1/admin/places/{place_id}'
+        self.assertEqual(self.client.delete(url, headers=self.headers(self.admin_id, True)).status_code, 200)
+        self.assertEqual(self.client.delete(url, headers=self.headers(self.admin_id, True)).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import random
+import time
+import unittest
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.amenity import Amenity
+from app.models.review import Review
+from app.persistence.autocomplete import PrefixIndex
+from app.services import facade
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        words = ['sunny', 'sun', 'loft', 'lodge', 'lake', 'café', 'Cabin', 'city']
+        items = [(f"id{i}", ' '.join(rng.choices(words, k=2)), rng.randrange(50)) for i in range(2000)]
+        index = PrefixIndex.from_items(items[:1000])
+        for obj_id, label, popularity in items[1000:]:
+            index.put(obj_id, label, popularity)
+        for obj_id, _, _ in items[::7]:
+            index.remove(obj_id)
+        alive = {obj_id: (label, popularity) for obj_id, label, popularity in items}
+        for obj_id, _, _ in items[::7]:
+            del alive[obj_id]
+        for prefix in ('s', 'su', 'SUNN', 'l', 'lo', 'cafe', 'cab', 'x'):
+            expected = sorted(
+                (obj_id for obj_id, (label, _) in alive.items()
+                 if any(word.startswith(prefix.lower()) for word in label.lower().replace('é', 'e').split())),
+                key=lambda obj_id: (-alive[obj_id][1], alive[obj_id][0], obj_id))[:10]
+            self.assertEqual([obj_id for obj_id, _ in index.complete(prefix, 10)], expected, prefix)
+
+    def test_keystroke_is_fast(self):
+        rng = random.Random(5)
+        syllables = ['ka', 'lo', 'mi', 'su', 'ra', 'te', 'no', 'vi']
+        index = PrefixIndex.from_items(
+            (str(i), ' '.join(''.join(rng.choices(syllables, k=3)) for _ in range(3)), rng.randrange(1000))
+            for i in range(50000))
+        for prefix in ('k', 'ka', 'kal', 'kalo'):
+            index.complete(prefix)
+        start = time.perf_counter()
+        for prefix in ('k', 'ka', 'kal', 'kalo') * 250:
+            index.complete(prefix)
+        self.assertLess((time.perf_counter() - start) / 1000, 0.001)
+
+
+class TestAutocompleteApi(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        self.guest = User(first_name="Guest", last_name="User", email="guest@example.com", password="x")
+        self.wifi, self.washer = Amenity(name="WiFi"), Amenity(name="Washer")
+        db.session.add_all([self.owner, self.guest, self.wifi, self.washer])
+        db.session.flush()
+        self.loft = Place(title="Sunny loft", price=10.0, latitude=45.0, longitude=3.0, owner_id=self.owner.id,
+                          amenities=[self.washer])
+        self.suite = Place(title="Sun suite", price=10.0, latitude=45.0, longitude=3.0, owner_id=self.owner.id)
+        db.session.add_all([self.loft, self.suite])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def suggest(self, q, kind='place'):
+        response = self.client.get(f'/api/v1/autocomplete/?q={q}&type={kind}')
+        self.assertEqual(response.status_code, 200)
+        return [item.get('title') or item.get('name') for item in response.json]
+
+    def test_suggestions_follow_writes(self):
+        self.assertEqual(self.suggest('su'), ['Sun suite', 'Sunny loft'])
+        self.assertEqual(self.suggest('lo'), ['Sunny loft'])
+        self.assertEqual(self.suggest('w', 'amenity'), ['Washer', 'WiFi'])
+        # Reviews and links make entries more popular
+        facade.create_review({'text': 'Ok', 'rating': 4, 'user_id': self.guest.id, 'place_id': self.loft.id})
+        self.assertEqual(self.suggest('su'), ['Sunny loft', 'Sun suite'])
+        self.suite.amenities = [self.wifi]
+        place = Place(title="Sunset view", price=10.0, latitude=45.0, longitude=3.0, owner_id=self.owner.id,
+                      amenities=[self.wifi])
+        db.session.add(place)
+        db.session.commit()
+        self.assertEqual(self.suggest('w', 'amenity'), ['WiFi', 'Washer'])
+        facade.update_place_returning(self.suite.id, {'title': 'Lake suite'})
+        self.assertEqual(self.suggest('la'), ['Lake suite'])
+        db.session.delete(db.session.get(Place, place.id))
+        db.session.delete(db.session.get(Place, self.suite.id))
+        db.session.commit()
+        self.assertEqual(self.suggest('su'), ['Sunny loft'])
+        self.assertEqual(self.suggest('w', 'amenity'), ['Washer', 'WiFi'])
+
+    def test_invalid_type(self):
+        self.assertEqual(self.client.get('/api/v1/autocomplete/?q=a&type=user').status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from werkzeug.http import http_date
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.models.amenity import Amenity
+from app.models.table_versions import table_versions
+from app.services import facade
+from app.persistence.versions import bump_versions
+
+
+class TestConditionalGet(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        self.guest = User(first_name="Guest", last_name="User", email="guest@example.com", password="x")
+        db.session.add_all([self.owner, self.guest])
+        db.session.flush()
+        self.place = Place(title="Loft", price=80.0, latitude=1.0, longitude=2.0, owner_id=self.owner.id)
+        db.session.add(self.place)
+        db.session.commit()
+        self.place_id, self.guest_id = self.place.id, self.guest.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={'If-None-Match': response.headers['ETag']})
+
+    def test_matching_etag_is_not_modified(self):
+        url = f'/api/v1/places/{self.place_id}'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first.headers)
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.get_data(), b'')
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        # A list of tags, and weak comparison
+        weak = self.client.get(url, headers={'If-None-Match': f'"other", W/{first.headers["ETag"]}'})
+        self.assertEqual(weak.status_code, 304)
+        self.assertEqual(self.client.get('/api/v1/places/unknown', headers={'If-None-Match': '*'}).status_code, 404)
+
+    def test_every_detail_endpoint_validates(self):
+        review = Review(text="Nice", rating=4, user_id=self.guest_id, place_id=self.place_id)
+        db.session.add(review)
+        db.session.commit()
+        for url in (f'/api/v1/users/{self.guest_id}', f'/api/v1/reviews/{review.id}'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+    def test_update_changes_the_tag(self):
+        url = f'/api/v1/places/{self.place_id}'
+        first = self.client.get(url)
+        facade.place_repo.update_returning(self.place_id, {'price': 95.0}, ('id',))
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json['price'], 95.0)
+        self.assertNotEqual(second.headers['ETag'], first.headers['ETag'])
+
+    def test_new_review_changes_the_place(self):
+        url = f'/api/v1/places/{self.place_id}'
+        first = self.client.get(url)
+        db.session.add(Review(text="Nice", rating=5, user_id=self.guest_id, place_id=self.place_id))
+        db.session.commit()
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json['review_count'], 1)
+
+    def test_expanded_place_follows_the_owner(self):
+        url = f'/api/v1/places/{self.place_id}?expand=owner'
+        first = self.client.get(url)
+        self.assertNotIn('Last-Modified', first.headers)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.assertNotEqual(self.client.get(f'/api/v1/places/{self.place_id}').headers['ETag'],
+                            first.headers['ETag'])
+        facade.user_repo.update_returning(self.owner.id, {'first_name': 'Renamed'}, ('id',))
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_if_modified_since(self):
+        url = f'/api/v1/places/{self.place_id}'
+        last_modified = self.client.get(url).headers['Last-Modified']
+        self.assertEqual(self.client.get(url, headers={'If-Modified-Since': last_modified}).status_code, 304)
+        earlier = http_date(datetime.utcnow() - timedelta(days=1))
+        self.assertEqual(self.client.get(url, headers={'If-Modified-Since': earlier}).status_code, 200)
+        # If-None-Match wins over If-Modified-Since
+        response = self.client.get(url, headers={'If-None-Match': '"other"', 'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_reads_only_the_stamp(self):
+        url = f'/api/v1/places/{self.place_id}'
+        first = self.client.get(url)
+        statements = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('places.updated_at', statements[0])
+        self.assertNotIn('places.title', statements[0])
+
+    def test_not_modified_list_reads_only_the_versions(self):
+        url = '/api/v1/places/?limit=5'
+        first = self.client.get(url)
+        statements = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('table_versions', statements[0])
+
+    def test_list_tag_follows_writes(self):
+        url = '/api/v1/places/?limit=5'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        # Another query string is another representation
+        other = self.client.get('/api/v1/places/?limit=6', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(other.status_code, 200)
+        reviews = self.client.get(f'/api/v1/reviews/places/{self.place_id}/reviews')
+        db.session.add(Place(title="Flat", price=50.0, latitude=0.0, longitude=0.0, owner_id=self.owner.id))
+        db.session.commit()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+        # Writing places does not stale the user list, reviews stale their place
+        users = self.client.get('/api/v1/users/')
+        self.assertEqual(self.revalidate('/api/v1/users/', users).status_code, 304)
+        self.assertEqual(self.revalidate(f'/api/v1/reviews/places/{self.place_id}/reviews', reviews).status_code, 200)
+
+    def test_list_tag_follows_writes_of_other_processes(self):
+        url = '/api/v1/users/'
+        first = self.client.get(url)
+        # Another worker commits a write through its own connection, without this session's events
+        with db.engine.begin() as connection:
+            connection.execute(User.__table__.update().values(first_name='Renamed'))
+            bump_versions(connection, ['users'])
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_list_tag_without_version_row(self):
+        url = '/api/v1/amenities/'
+        db.session.execute(table_versions.delete().where(table_versions.c.name == 'amenities'))
+        db.session.commit()
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        db.session.add(Amenity(name="WiFi"))
+        db.session.commit()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_rolled_back_write_keeps_the_tag(self):
+        url = '/api/v1/amenities/'
+        first = self.client.get(url)
+        db.session.add(Place(title="Flat", price=50.0, latitude=0.0, longitude=0.0, owner_id=self.owner.id))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
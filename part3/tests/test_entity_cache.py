@@ -0,0 +1,82 @@
+import unittest
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.persistence.cache import LRUCache, entity_cache_stats
+from app.services import facade
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expiration(self):
+        cache = LRUCache(maxsize=2, ttl=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.expirations, 1)
+
+    def test_write_after_invalidation_is_refused(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        generation = cache.generation
+        # A writer commits and invalidates while the reader loads the old row
+        cache.invalidate('a')
+        self.assertFalse(cache.set('a', 'old', generation))
+        self.assertIsNone(cache.get('a'))
+        self.assertTrue(cache.set('a', 'new', cache.generation))
+
+
+class TestEntityCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        db.session.add(owner)
+        db.session.flush()
+        place = Place(title="Cached", price=10.0, latitude=1.0, longitude=1.0, owner_id=owner.id)
+        db.session.add(place)
+        db.session.commit()
+        self.place_id = place.id
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_hit_after_first_read(self):
+        self.client.get(f'/api/v1/places/{self.place_id}')
+        self.client.get(f'/api/v1/places/{self.place_id}')
+        stats = entity_cache_stats(self.app)['places']
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_get_all_is_not_cached(self):
+        facade.get_all_places()
+        self.assertEqual(entity_cache_stats(self.app).get('places', {'size': 0})['size'], 0)
+
+    def test_write_invalidates(self):
+        self.client.get(f'/api/v1/places/{self.place_id}')
+        facade.update_place(self.place_id, {'title': "Renamed"})
+        db.session.remove()
+        response = self.client.get(f'/api/v1/places/{self.place_id}')
+        self.assertEqual(response.get_json()['title'], "Renamed")
+
+        facade.delete_place(self.place_id)
+        db.session.remove()
+        response = self.client.get(f'/api/v1/places/{self.place_id}')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
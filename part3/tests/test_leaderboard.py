@@ -0,0 +1,135 @@
+import math
+import random
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.persistence.leaderboard import DecayedScores, TopK
+from app.services import facade
+
+
+class TestDecayedScores(unittest.TestCase):
+    def test_topk_follows_any_update(self):
+        rng = random.Random(7)
+        scores, top = {}, TopK(5)
+        for _ in range(2000):
+            key = rng.randrange(40)
+            scores[key] = scores.get(key, 0.0) + rng.uniform(-1, 2)
+            top.update(key, scores[key])
+            if rng.random() < 0.1:
+                self.assertEqual([score for _, score in top.ranked(scores)],
+                                 sorted(scores.values(), reverse=True)[:5])
+
+    def test_scores_match_direct_decay_across_rebase(self):
+        tau, now = 3600.0, 1_000_000.0
+        scores = DecayedScores(tau, 10, epoch=0.0)
+        reviews = [(f"p{i % 4}", now - 500 * i, 1 + i % 5) for i in range(30)]
+        for place_id, t, rating in reviews:
+            scores.add(place_id, t, rating)
+        # The first review was e**277 past the epoch, which moved to it
+        self.assertEqual(scores.epoch, reviews[0][1])
+        for place_id, score in scores.best('top', 4, now):
+            expected = sum(rating / 5 * math.exp(-(now - t) / tau) for p, t, rating in reviews if p == place_id)
+            self.assertAlmostEqual(score, expected, places=9)
+
+
+class TestLeaderboardApi(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        self.guests = [User(first_name="Guest", last_name=str(i), email=f"guest{i}@example.com", password="x")
+                       for i in range(4)]
+        db.session.add_all([self.owner] + self.guests)
+        db.session.flush()
+        self.places = [Place(title=f"Place {i}", price=10.0, latitude=45.0, longitude=3.0, owner_id=self.owner.id)
+                       for i in range(3)]
+        db.session.add_all(self.places)
+        db.session.flush()
+        now = datetime.utcnow()
+        # Place 0: many old reviews; Place 1: two fresh ones; Place 2: one fresh five-star review
+        for guest in self.guests:
+            db.session.add(Review(text="Old", rating=3, user_id=guest.id, place_id=self.places[0].id,
+                                  created_at=now - timedelta(days=20)))
+        for guest in self.guests[:2]:
+            db.session.add(Review(text="New", rating=2, user_id=guest.id, place_id=self.places[1].id,
+                                  created_at=now - timedelta(hours=1)))
+        db.session.add(Review(text="New", rating=5, user_id=self.guests[3].id, place_id=self.places[2].id,
+                              created_at=now - timedelta(hours=1)))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def titles(self, kind, window='7d'):
+        response = self.client.get(f'/api/v1/places/{kind}?window={window}')
+        self.assertEqual(response.status_code, 200)
+        return [place['title'] for place in response.json]
+
+    def test_windows_weigh_recent_reviews(self):
+        self.assertEqual(self.titles('trending'), ['Place 1', 'Place 2', 'Place 0'])
+        self.assertEqual(self.titles('trending', '30d'), ['Place 0', 'Place 1', 'Place 2'])
+        self.assertEqual(self.titles('top'), ['Place 2', 'Place 1', 'Place 0'])
+        self.assertEqual(self.client.get('/api/v1/places/top?window=1y').status_code, 400)
+
+    def test_scores_follow_review_writes(self):
+        self.titles('top')
+        review = Review.query.filter_by(place_id=self.places[2].id).one()
+        facade.update_review_returning(review.id, {'rating': 1})
+        self.assertEqual(self.titles('top'), ['Place 1', 'Place 2', 'Place 0'])
+        facade.update_review(review.id, {'rating': 5})
+        self.assertEqual(self.titles('top')[0], 'Place 2')
+        facade.delete_review(review.id)
+        self.assertEqual(self.titles('top'), ['Place 1', 'Place 0'])
+        db.session.delete(db.session.get(Place, self.places[1].id))
+        db.session.commit()
+        self.assertEqual(self.titles('trending'), ['Place 0'])
+
+    def test_restart_reads_checkpoint_and_newer_reviews(self):
+        before = self.client.get('/api/v1/places/trending').json
+        facade.place_repo.save_leaderboard()
+        # Reviews up to the checkpoint are not read again: the scores survive their removal
+        db.session.execute(text("DELETE FROM reviews WHERE place_id = :id"), {'id': self.places[0].id})
+        db.session.add(Review(text="Fresh", rating=4, user_id=self.guests[0].id, place_id=self.places[2].id))
+        db.session.commit()
+        self.app.extensions.pop('leaderboard')
+        after = self.client.get('/api/v1/places/trending').json
+        self.assertEqual([place['title'] for place in after], ['Place 2', 'Place 1', 'Place 0'])
+        self.assertAlmostEqual(after[2]['score'], before[2]['score'], places=4)
+
+        result = self.app.test_cli_runner().invoke(args=['rebuild-leaderboard'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(self.titles('trending'), ['Place 2', 'Place 1'])
+
+
+    def test_restart_discards_checkpoint_after_retractions(self):
+        self.titles('top')
+        facade.place_repo.save_leaderboard()
+        review = Review.query.filter_by(place_id=self.places[2].id).one()
+        facade.update_review_returning(review.id, {'rating': 1})
+        for review in Review.query.filter_by(place_id=self.places[1].id).all():
+            facade.delete_review(review.id)
+        self.app.extensions.pop('leaderboard')
+        # The checkpoint still counts the old rating and the deleted reviews: rebuilt from the table instead
+        self.assertEqual(self.titles('top'), ['Place 2', 'Place 0'])
+        top = self.client.get('/api/v1/places/top').json
+        self.assertLess(top[0]['score'], 0.25)
+
+        # A checkpoint saved after them is used again
+        facade.place_repo.save_leaderboard()
+        db.session.execute(text("DELETE FROM reviews WHERE place_id = :id"), {'id': self.places[0].id})
+        db.session.commit()
+        self.app.extensions.pop('leaderboard')
+        self.assertEqual(self.titles('top'), ['Place 2', 'Place 0'])
+
+
+if __name__ == "__main__":
+    unittest.main()
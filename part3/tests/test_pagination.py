@@ -0,0 +1,57 @@
+import unittest
+import json
+from datetime import datetime
+from app import create_app, db
+from app.models.amenity import Amenity
+
+
+class TestCursorPagination(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        # Several rows share the same created_at to exercise the id tie-breaker
+        for i in range(25):
+            created_at = datetime(2024, 1, 1) if i < 15 else datetime(2024, 1, 2)
+            db.session.add(Amenity(name=f"Amenity {i:02d}", created_at=created_at))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_walk_all_pages(self):
+        names = []
+        cursor = None
+        while True:
+            url = '/api/v1/amenities/?limit=4'
+            if cursor:
+                url += f'&cursor={cursor}'
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            names.extend(item['name'] for item in json.loads(response.data))
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        self.assertEqual(len(names), 25)
+        self.assertEqual(len(set(names)), 25)
+
+    def test_default_page_size_is_bounded(self):
+        response = self.client.get('/api/v1/amenities/?limit=100000')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(json.loads(response.data)), self.app.config['MAX_PAGE_SIZE'])
+
+        response = self.client.get('/api/v1/amenities/')
+        self.assertEqual(len(json.loads(response.data)), self.app.config['DEFAULT_PAGE_SIZE'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/v1/amenities/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
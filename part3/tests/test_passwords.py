@@ -0,0 +1,59 @@
+import threading
+import unittest
+from app import create_app, db
+from app.models.user import User
+from app.services import facade
+from app.utils.passwords import HasherBusy, PasswordHasher, get_password_hasher
+
+
+class TestPasswordHasher(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_create_user_hashes_once(self):
+        user = facade.create_user({"first_name": "A", "last_name": "B", "email": "a@example.com",
+                                   "password": "secret1"})
+        self.assertTrue(user.verify_password("secret1"))
+        self.assertFalse(user.password_needs_rehash())
+        self.assertEqual(get_password_hasher().stats()['completed'], 2)
+
+    def test_login_rehashes_on_cost_change(self):
+        user = User(first_name="A", last_name="B", email="a@example.com", password="x")
+        user.hash_password("secret1")
+        db.session.add(user)
+        db.session.commit()
+        get_password_hasher().rounds = 5
+
+        response = self.client.post('/api/v1/auth/login', json={"email": "a@example.com", "password": "secret1"})
+        self.assertEqual(response.status_code, 200)
+        db.session.expire_all()
+        self.assertTrue(db.session.get(User, user.id).password.startswith('$2b$05$'))
+
+    def test_full_queue_is_rejected(self):
+        hasher = PasswordHasher(rounds=4, workers=1, max_pending=1)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+        worker = threading.Thread(target=hasher._call, args=(block,))
+        worker.start()
+        started.wait()
+        with self.assertRaises(HasherBusy):
+            hasher._call(lambda: None)
+        release.set()
+        worker.join()
+        self.assertEqual(hasher.stats()['rejected'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import random
+import unittest
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.persistence.clusters import ClusterGrid, mercator_cells
+from app.services import facade
+
+
+def brute_clusters(places, bbox, zoom, cells_per_tile=4):
+    """Clusters computed from scratch, for comparison"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    size = cells_per_tile << zoom
+    (west, east), (north, south) = mercator_cells([max_lat, min_lat], [min_lon, max_lon], size)
+    cells = {}
+    for lat, lon, price in places.values():
+        xs, ys = mercator_cells([lat], [lon], size)
+        x, y = int(xs[0]), int(ys[0])
+        if north <= y <= south and (west <= x <= east if min_lon <= max_lon else (x >= west or x <= east)):
+            cells.setdefault((y, x), []).append((lat, lon, price))
+    return [{
+        'latitude': round(sum(lat for lat, _, _ in points) / len(points), 6),
+        'longitude': round(sum(lon for _, lon, _ in points) / len(points), 6),
+        'count': len(points),
+        'min_price': min(price for _, _, price in points),
+    } for _, points in sorted(cells.items())]
+
+
+class TestClusterGrid(unittest.TestCase):
+    def assertClustersEqual(self, actual, expected):
+        self.assertEqual([(c['count'], c['min_price']) for c in actual],
+                         [(c['count'], c['min_price']) for c in expected])
+        for a, b in zip(actual, expected):
+            self.assertAlmostEqual(a['latitude'], b['latitude'], places=5)
+            self.assertAlmostEqual(a['longitude'], b['longitude'], places=5)
+
+    def test_matches_brute_force_across_writes(self):
+        rng = random.Random(11)
+        places = {f"p{i}": (rng.uniform(40, 52), rng.uniform(-5, 10), float(rng.randrange(20, 400)))
+                  for i in range(400)}
+        grid = ClusterGrid.from_rows([(key, *point) for key, point in places.items()], max_zoom=8)
+        for i in range(150):
+            place_id = f"p{rng.randrange(500)}"
+            if place_id in places and rng.random() < 0.4:
+                del places[place_id]
+                grid.remove(place_id)
+            else:
+                places[place_id] = (rng.uniform(40, 52), rng.uniform(-5, 10), float(rng.randrange(20, 400)))
+                grid.put(place_id, *places[place_id])
+        for bbox in [(-5, 40, 10, 52), (0, 45, 3, 48), (2.2, 48.7, 2.5, 49.0)]:
+            for zoom in (0, 3, 6, 8):
+                self.assertClustersEqual(grid.clusters(bbox, zoom), brute_clusters(places, bbox, zoom))
+        # Deeper zooms reuse the finest cells
+        self.assertEqual(grid.clusters((-5, 40, 10, 52), 12), grid.clusters((-5, 40, 10, 52), 8))
+
+    def test_antimeridian_box(self):
+        places = {'fiji': (-17.7, 178.0, 90.0), 'samoa': (-13.8, -171.8, 60.0), 'paris': (48.85, 2.35, 10.0)}
+        grid = ClusterGrid.from_rows([(key, *point) for key, point in places.items()])
+        clusters = grid.clusters((170, -30, -160, 0), 0)
+        self.assertEqual(sorted(c['min_price'] for c in clusters), [60.0, 90.0])
+
+
+class TestPlaceClustersApi(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        db.session.add(self.owner)
+        db.session.flush()
+        self.places = [Place(title=f"Paris {i}", price=50.0 + i, latitude=48.85 + i / 1000, longitude=2.35,
+                             owner_id=self.owner.id) for i in range(3)]
+        self.places.append(Place(title="Lyon", price=40.0, latitude=45.76, longitude=4.84, owner_id=self.owner.id))
+        db.session.add_all(self.places)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def clusters(self, zoom, bbox='-5,40,10,52'):
+        response = self.client.get(f'/api/v1/places/clusters?bbox={bbox}&zoom={zoom}')
+        self.assertEqual(response.status_code, 200)
+        return [(cluster['count'], cluster['min_price']) for cluster in response.json]
+
+    def test_cells_merge_as_zoom_decreases(self):
+        self.assertEqual(self.clusters(10), [(3, 50.0), (1, 40.0)])
+        self.assertEqual(self.clusters(2), [(4, 40.0)])
+        self.assertEqual(self.clusters(10, bbox='4,45,5,46'), [(1, 40.0)])
+
+    def test_grid_follows_writes(self):
+        self.clusters(2)
+        facade.update_place_returning(self.places[3].id, {'latitude': 48.851, 'longitude': 2.351, 'price': 45.0})
+        db.session.delete(db.session.get(Place, self.places[0].id))
+        db.session.commit()
+        self.assertEqual(self.clusters(10), [(3, 45.0)])
+        facade.update_place_returning(self.places[3].id, {'price': 90.0})
+        self.assertEqual(self.clusters(2), [(3, 51.0)])
+
+    def test_invalid_arguments(self):
+        self.assertEqual(self.client.get('/api/v1/places/clusters?zoom=3').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/places/clusters?bbox=0,0,1,1').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/places/clusters?bbox=0,0,1,1&zoom=-1').status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.amenity import Amenity
+from app.models.review import Review
+from app.persistence.bitmaps import AmenityBitmaps
+from app.persistence.facets import PlaceFacets
+from app.services import facade
+
+
+class TestPlaceFacets(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        self.guests = [User(first_name="Guest", last_name=str(i), email=f"guest{i}@example.com", password="x")
+                       for i in range(3)]
+        self.amenities = [Amenity(name=name) for name in ("WiFi", "Pool", "Parking")]
+        db.session.add_all([self.owner] + self.guests + self.amenities)
+        db.session.flush()
+        # Prices 0, 40, ..., 760: five per bucket of (50, 100, 200, 500) except the first and last ones
+        self.places = [Place(title=f"Place {i}", price=40.0 * i, latitude=45.0, longitude=3.0,
+                             owner_id=self.owner.id, amenities=self.amenities[:i % 4]) for i in range(20)]
+        db.session.add_all(self.places)
+        db.session.flush()
+        for i, place in enumerate(self.places[:6]):
+            for guest in self.guests[:i % 3 + 1]:
+                db.session.add(Review(text="Ok", rating=i % 5 + 1, user_id=guest.id, place_id=place.id))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def facets(self, query=''):
+        response = self.client.get(f'/api/v1/places/facets?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def expected(self, places):
+        """Facet counts recomputed from the ORM objects"""
+        amenities = {amenity.name: sum(amenity in place.amenities for place in places) for amenity in self.amenities}
+        prices = [0] * 5
+        ratings = [0] * 6
+        for place in places:
+            prices[sum(place.price >= bound for bound in (50, 100, 200, 500))] += 1
+            rated = [review.rating for review in place.reviews]
+            ratings[int(sum(rated) / len(rated)) if rated else 0] += 1
+        return amenities, prices, ratings
+
+    def assertFacets(self, data, places):
+        amenities, prices, ratings = self.expected(places)
+        self.assertEqual(data['facets']['total'], len(places))
+        self.assertEqual({amenity['name']: amenity['count'] for amenity in data['facets']['amenities']}, amenities)
+        self.assertEqual([bucket['count'] for bucket in data['facets']['price']], prices)
+        self.assertEqual([bucket['count'] for bucket in data['facets']['rating']], ratings)
+
+    def test_counts_follow_filters(self):
+        data = self.facets('limit=5')
+        self.assertEqual(len(data['places']), 5)
+        self.assertFacets(data, self.places)
+        self.assertEqual(data['facets']['price'][-1], {'min': 500.0, 'max': None, 'count': 7})
+
+        pool = self.amenities[1].id
+        data = self.facets(f'amenities={pool}&max_price=400')
+        self.assertFacets(data, [place for place in self.places
+                                 if self.amenities[1] in place.amenities and place.price <= 400])
+        self.assertEqual(len(data['places']), data['facets']['total'])
+
+    def test_counts_follow_writes(self):
+        self.facets()
+        place = self.places[0]
+        place.price = 1000.0
+        place.amenities = [self.amenities[2]]
+        db.session.delete(self.places[1])
+        db.session.add(Review(text="Bad", rating=1, user_id=self.guests[2].id, place_id=self.places[3].id))
+        db.session.commit()
+        facade.update_review_returning(self.places[2].reviews[0].id, {'rating': 5})
+        facade.update_place_returning(self.places[4].id, {'price': 45.0})
+        db.session.expire_all()
+        self.assertFacets(self.facets(), Place.query.all())
+
+    def test_repeated_filters_hit_the_cache(self):
+        first = self.facets('min_price=100')
+        hits = self.app.extensions['place_facet_cache'].stats()['hits']
+        self.assertEqual(self.facets('min_price=100'), first)
+        self.assertEqual(self.app.extensions['place_facet_cache'].stats()['hits'], hits + 1)
+        place = Place(title="New", price=150.0, latitude=45.0, longitude=3.0, owner_id=self.owner.id)
+        db.session.add(place)
+        db.session.commit()
+        self.assertEqual(self.facets('min_price=100')['facets']['total'], first['facets']['total'] + 1)
+
+    def test_unknown_amenity_matches_nothing(self):
+        facets = PlaceFacets.from_rows(AmenityBitmaps.from_links([('a', 'wifi')]), [('a', 10.0, 0.0), ('b', 20.0, 4.5)])
+        counts = facets.count(all_of=('pool',))
+        self.assertEqual(counts['total'], 0)
+        self.assertEqual(counts['amenities'], {'wifi': 0})
+        counts = facets.count()
+        self.assertEqual((counts['total'], counts['amenities'], counts['rating']), (2, {'wifi': 1}, [1, 0, 0, 0, 1, 0]))
+
+    def test_deleted_place_frees_its_ordinal(self):
+        self.facets()
+        bitmaps = self.app.extensions['amenity_bitmaps']
+        ordinal = bitmaps.place(self.places[3].id)
+        db.session.delete(self.places[3])
+        db.session.commit()
+        place = Place(title="New", price=45.0, latitude=45.0, longitude=3.0, owner_id=self.owner.id)
+        db.session.add(place)
+        db.session.commit()
+        # The new place takes the freed ordinal without the rating of the deleted one
+        self.assertEqual(bitmaps.place(place.id), ordinal)
+        self.assertFacets(self.facets(), Place.query.all())
+
+
+if __name__ == "__main__":
+    unittest.main()
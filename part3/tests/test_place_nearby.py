@@ -0,0 +1,60 @@
+import unittest
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.services import facade
+
+
+class TestPlaceNearby(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        db.session.add(self.owner)
+        db.session.flush()
+        self.paris = Place(title="Paris", price=10.0, latitude=48.8566, longitude=2.3522, owner_id=self.owner.id)
+        self.lyon = Place(title="Lyon", price=10.0, latitude=45.7640, longitude=4.8357, owner_id=self.owner.id)
+        self.tokyo = Place(title="Tokyo", price=10.0, latitude=35.6762, longitude=139.6503, owner_id=self.owner.id)
+        db.session.add_all([self.paris, self.lyon, self.tokyo])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def nearby(self, query):
+        return self.client.get(f'/api/v1/places/nearby?{query}')
+
+    def test_ordered_by_distance(self):
+        response = self.nearby('lat=48.85&lon=2.35&k=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([place['title'] for place in response.json], ['Paris', 'Lyon', 'Tokyo'])
+        self.assertAlmostEqual(response.json[1]['distance_km'], 391.5, delta=2)
+
+    def test_k_and_max_km(self):
+        self.assertEqual(len(self.nearby('lat=48.85&lon=2.35&k=1').json), 1)
+        self.assertEqual([place['title'] for place in self.nearby('lat=48.85&lon=2.35&max_km=500').json],
+                         ['Paris', 'Lyon'])
+
+    def test_index_follows_writes(self):
+        self.nearby('lat=0&lon=0')  # loads the index
+        facade.update_place_returning(self.tokyo.id, {'latitude': 48.86, 'longitude': 2.35})
+        kyoto = Place(title="Kyoto", price=10.0, latitude=35.0116, longitude=135.7681, owner_id=self.owner.id)
+        db.session.add(kyoto)
+        db.session.delete(self.paris)
+        db.session.commit()
+        self.assertEqual([place['title'] for place in self.nearby('lat=48.85&lon=2.35&k=2').json], ['Tokyo', 'Lyon'])
+        self.assertEqual(self.nearby('lat=35&lon=135&k=1').json[0]['title'], 'Kyoto')
+
+    def test_invalid_point(self):
+        self.assertEqual(self.nearby('lat=48.85').status_code, 400)
+        self.assertEqual(self.nearby('lat=91&lon=0').status_code, 400)
+        self.assertEqual(self.nearby('lat=0&lon=0&max_km=-1').status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+import json
+from sqlalchemy import event
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.amenity import Amenity
+from app.models.review import Review
+
+
+class TestPlaceListQueries(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        self.users = [User(first_name="User", last_name=str(i), email=f"user{i}@example.com", password="x")
+                      for i in range(5)]
+        self.amenities = [Amenity(name=name) for name in ("WiFi", "Pool", "Parking")]
+        db.session.add_all(self.users + self.amenities)
+        db.session.flush()
+        for i in range(30):
+            place = Place(title=f"Place {i}", description="A place", price=10.0 * i, latitude=45.0,
+                          longitude=3.0, owner_id=self.users[i % 5].id, amenities=self.amenities[:i % 4])
+            db.session.add(place)
+            db.session.flush()
+            for user in self.users[:i % 3]:
+                if user.id != place.owner_id:
+                    db.session.add(Review(text="Nice", rating=4, user_id=user.id, place_id=place.id))
+        db.session.commit()
+        db.session.expunge_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def count_statements(self, url):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            # The version read behind the ETag is covered by test_conditional_get
+            if 'table_versions' not in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        return response, len(statements)
+
+    def test_expand_uses_fixed_number_of_queries(self):
+        response, small = self.count_statements('/api/v1/places/?limit=5&expand=owner,amenities,reviews')
+        self.assertEqual(response.status_code, 200)
+        response, large = self.count_statements('/api/v1/places/?limit=30&expand=owner,amenities,reviews')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(small, large)
+
+        data = json.loads(response.data)
+        self.assertEqual(len(data), 30)
+        for place in data:
+            self.assertIn('email', place['owner'])
+            self.assertIsInstance(place['amenities'], list)
+            self.assertIsInstance(place['reviews'], list)
+
+    def test_expand_detail(self):
+        place_id = json.loads(self.client.get('/api/v1/places/?limit=1').data)[0]['id']
+        response = self.client.get(f'/api/v1/places/{place_id}?expand=owner')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertIn('owner', data)
+        self.assertNotIn('reviews', data)
+
+    def test_sparse_fields(self):
+        response, statements = self.count_statements('/api/v1/places/?limit=10&fields=id,title,price')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statements, 1)
+        for place in json.loads(response.data):
+            self.assertEqual(set(place), {'id', 'title', 'price'})
+
+    def test_sparse_fields_reject_private_columns(self):
+        response = self.client.get('/api/v1/users/?fields=id,password')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/v1/places/?fields=title&expand=owner')
+        self.assertEqual(response.status_code, 400)
+
+    def walk(self, url):
+        """Follows X-Next-Cursor from url and returns every place of every page"""
+        places, cursor = [], None
+        while True:
+            response = self.client.get(url + (f'&cursor={cursor}' if cursor else ''))
+            self.assertEqual(response.status_code, 200)
+            places.extend(json.loads(response.data))
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                return places
+
+    def test_price_range_and_sort(self):
+        places = self.walk('/api/v1/places/?limit=4&min_price=50&max_price=200&sort=-price&fields=id,price')
+        self.assertEqual([place['price'] for place in places], [10.0 * i for i in range(20, 4, -1)])
+        places = self.walk('/api/v1/places/?limit=7&sort=price')
+        self.assertEqual([place['price'] for place in places], [10.0 * i for i in range(30)])
+
+    def test_price_cursor_is_bound_to_its_sort(self):
+        response = self.client.get('/api/v1/places/?limit=2&sort=price')
+        cursor = response.headers['X-Next-Cursor']
+        self.assertEqual(self.client.get(f'/api/v1/places/?limit=2&cursor={cursor}').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/places/?sort=title').status_code, 400)
+
+    def amenity_id(self, name):
+        return Amenity.query.filter_by(name=name).one().id
+
+    def test_amenity_filters(self):
+        wifi, pool, parking = (self.amenity_id(name) for name in ("WiFi", "Pool", "Parking"))
+        places = self.walk(f'/api/v1/places/?limit=4&amenities={wifi},{pool}&sort=price')
+        self.assertEqual([place['price'] for place in places], [10.0 * i for i in range(30) if i % 4 >= 2])
+        places = self.walk(f'/api/v1/places/?limit=50&amenities_any={parking},{pool}&max_price=100')
+        self.assertEqual(sorted(place['price'] for place in places), [10.0 * i for i in range(11) if i % 4 >= 2])
+        self.assertEqual(self.walk('/api/v1/places/?amenities=nope'), [])
+
+    def test_amenity_bitmaps_follow_link_changes(self):
+        wifi, parking = self.amenity_id("WiFi"), self.amenity_id("Parking")
+        self.assertEqual(len(self.walk(f'/api/v1/places/?limit=50&amenities={parking}')), 7)
+        place = db.session.get(Place, self.walk('/api/v1/places/?limit=1')[0]['id'])
+        place.amenities = [db.session.get(Amenity, parking)]
+        db.session.commit()
+        self.assertEqual(len(self.walk(f'/api/v1/places/?limit=50&amenities={parking}')), 8)
+        db.session.delete(db.session.get(Place, self.walk(f'/api/v1/places/?limit=1&amenities={parking}')[0]['id']))
+        db.session.delete(db.session.get(Amenity, wifi))
+        db.session.commit()
+        self.assertEqual(len(self.walk(f'/api/v1/places/?limit=50&amenities={parking}')), 7)
+        self.assertEqual(self.walk(f'/api/v1/places/?amenities={wifi}'), [])
+
+    def test_unknown_expand(self):
+        response = self.client.get('/api/v1/places/?expand=secrets')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
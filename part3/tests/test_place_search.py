@@ -0,0 +1,73 @@
+import unittest
+from sqlalchemy import text
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+
+
+class TestPlaceSearch(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        db.session.add(owner)
+        db.session.flush()
+        # A 10x10 grid of places around Paris, plus two on each side of the antimeridian
+        self.grid = [Place(title=f"Paris {i}", price=10.0, latitude=48.80 + (i // 10) * 0.01,
+                           longitude=2.30 + (i % 10) * 0.01, owner_id=owner.id) for i in range(100)]
+        self.east = Place(title="Fiji", price=10.0, latitude=-17.7, longitude=178.0, owner_id=owner.id)
+        self.west = Place(title="Samoa", price=10.0, latitude=-13.8, longitude=-172.0, owner_id=owner.id)
+        db.session.add_all(self.grid + [self.east, self.west])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def search(self, bbox, **params):
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.client.get(f'/api/v1/places/search?bbox={bbox}&{query}')
+
+    def test_bbox_pages_cover_every_place_once(self):
+        seen, cursor = [], None
+        while True:
+            response = self.search('2.3,48.8,2.395,48.895', limit=30, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            seen.extend(place['id'] for place in response.json)
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), sorted(place.id for place in self.grid))
+
+    def test_bbox_is_restrictive(self):
+        response = self.search('2.3,48.8,2.315,48.815', fields='id,latitude,longitude')
+        self.assertEqual(len(response.json), 4)
+        self.assertEqual(set(response.json[0]), {'id', 'latitude', 'longitude'})
+
+    def test_antimeridian(self):
+        response = self.search('170,-20,-170,-10')
+        self.assertEqual({place['title'] for place in response.json}, {'Fiji', 'Samoa'})
+
+    def test_rtree_follows_writes(self):
+        place = self.grid[0]
+        place.longitude = 100.0
+        db.session.commit()
+        self.assertEqual(len(self.search('99,48,101,49').json), 1)
+        db.session.delete(place)
+        db.session.commit()
+        self.assertEqual(self.search('99,48,101,49').json, [])
+        count = db.session.execute(text("SELECT count(*) FROM places_rtree")).scalar()
+        self.assertEqual(count, Place.query.count())
+
+    def test_invalid_bbox(self):
+        self.assertEqual(self.client.get('/api/v1/places/search').status_code, 400)
+        self.assertEqual(self.search('1,2,3').status_code, 400)
+        self.assertEqual(self.search('0,50,1,40').status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+
+
+class TestPlaceUpdate(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        self.other = User(first_name="Other", last_name="User", email="other@example.com", password="x")
+        db.session.add_all([self.owner, self.other])
+        db.session.flush()
+        self.place = Place(title="Loft", price=80.0, latitude=1.0, longitude=2.0, owner_id=self.owner.id)
+        db.session.add(self.place)
+        db.session.commit()
+        self.place_id, self.owner_id, self.other_id = self.place.id, self.owner.id, self.other.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def put(self, user_id, data, place_id=None, is_admin=False):
+        token = create_access_token(identity=str(user_id), additional_claims={'is_admin': is_admin})
+        return self.client.put(f'/api/v1/places/{place_id or self.place_id}', json=data,
+                               headers={'Authorization': f'Bearer {token}'})
+
+    def test_owner_update_is_one_statement_on_places(self):
+        statements = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if 'table_versions' not in statement:
+                statements.append(statement)
+        response = self.put(self.owner_id, {'price': 95.0})
+        event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['price'], 95.0)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('UPDATE places'))
+
+    def test_other_user_and_missing_place(self):
+        response = self.put(self.other_id, {'price': 1.0})
+        self.assertEqual(response.status_code, 403)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Place, self.place_id).price, 80.0)
+        self.assertEqual(self.put(self.owner_id, {'price': 1.0}, place_id='unknown').status_code, 404)
+        response = self.put(self.other_id, {'title': 'Admin loft'}, is_admin=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['title'], 'Admin loft')
+
+    def test_response_is_the_place_representation(self):
+        response = self.put(self.owner_id, {'price': 80, 'latitude': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, self.client.get(f'/api/v1/places/{self.place_id}').json)
+        self.assertIsInstance(response.json['price'], float)
+        self.assertIsInstance(response.json['latitude'], float)
+        self.assertIn('rating_histogram', response.json)
+
+    def test_nothing_to_update_writes_nothing(self):
+        before = self.client.get(f'/api/v1/places/{self.place_id}')
+        statements = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        response = self.put(self.owner_id, {'owner_id': self.other_id})
+        event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, before.json)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('SELECT'))
+        self.assertEqual(self.put(self.other_id, {}).status_code, 403)
+        self.assertEqual(self.put(self.owner_id, {}, place_id='unknown').status_code, 404)
+
+    def test_rejected_update_leaves_the_indexes(self):
+        from app.services import facade
+        index = facade.place_repo.geo_index()
+        titles = facade.place_repo.title_index()
+        self.assertEqual(self.put(self.other_id, {'latitude': 40.0, 'title': 'Moved'}).status_code, 403)
+        self.assertEqual(index.nearest(1.0, 2.0, 1)[0][0], self.place_id)
+        self.assertEqual(titles.complete('mov', 5), [])
+        self.assertEqual(self.put(self.owner_id, {'latitude': 40.0, 'title': 'Moved'}).status_code, 200)
+        self.assertEqual(index.nearest(40.0, 2.0, 1, max_km=1.0)[0][0], self.place_id)
+        self.assertEqual([item[0] for item in titles.complete('mov', 5)], [self.place_id])
+
+    def test_amenities_path_checks_the_owner(self):
+        self.assertEqual(self.put(self.other_id, {'amenities': []}).status_code, 403)
+        self.assertEqual(self.put(self.owner_id, {'amenities': []}).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
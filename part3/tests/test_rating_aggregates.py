@@ -0,0 +1,108 @@
+import unittest
+from sqlalchemy import event, text
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.services import facade
+
+
+class TestRatingAggregates(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        self.guests = [User(first_name="Guest", last_name=str(i), email=f"guest{i}@example.com", password="x")
+                       for i in range(4)]
+        db.session.add_all([self.owner] + self.guests)
+        db.session.flush()
+        self.places = [Place(title=f"Place {i}", price=10.0, latitude=45.0, longitude=3.0, owner_id=self.owner.id)
+                       for i in range(3)]
+        db.session.add_all(self.places)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def review(self, guest, place, rating):
+        return facade.create_review({'text': 'Ok', 'rating': rating, 'user_id': guest.id, 'place_id': place.id})
+
+    def aggregates(self, place):
+        data = self.client.get(f'/api/v1/places/{place.id}').json
+        return (data['review_count'], data['rating_sum'], data['rating_avg'],
+                [data['rating_histogram'][str(star)] for star in range(1, 6)])
+
+    def assertMatchesReviews(self):
+        """The maintained aggregates equal the ones recomputed with AVG/COUNT"""
+        db.session.expire_all()
+        for place in Place.query.all():
+            ratings = [review.rating for review in place.reviews]
+            self.assertEqual(place.review_count, len(ratings))
+            self.assertEqual(place.rating_sum, sum(ratings))
+            self.assertAlmostEqual(place.rating_avg, sum(ratings) / len(ratings) if ratings else 0.0, places=4)
+            self.assertEqual([getattr(place, f'rating_{star}') for star in range(1, 6)],
+                             [ratings.count(star) for star in range(1, 6)])
+
+    def test_create_update_delete(self):
+        first = self.review(self.guests[0], self.places[0], 5)
+        self.review(self.guests[1], self.places[0], 2)
+        self.assertEqual(self.aggregates(self.places[0]), (2, 7, 3.5, [0, 1, 0, 0, 1]))
+        facade.update_review(first.id, {'rating': 4})
+        self.assertEqual(self.aggregates(self.places[0]), (2, 6, 3.0, [0, 1, 0, 1, 0]))
+        facade.update_review_returning(first.id, {'rating': 1})
+        self.assertEqual(self.aggregates(self.places[0]), (2, 3, 1.5, [1, 1, 0, 0, 0]))
+        facade.delete_review(first.id)
+        self.assertEqual(self.aggregates(self.places[0]), (1, 2, 2.0, [0, 1, 0, 0, 0]))
+        self.assertMatchesReviews()
+
+    def test_cascade_delete_of_user(self):
+        for place in self.places:
+            self.review(self.guests[0], place, 3)
+            self.review(self.guests[1], place, 5)
+        db.session.delete(db.session.get(User, self.guests[0].id))
+        db.session.commit()
+        self.assertEqual(self.aggregates(self.places[2]), (1, 5, 5.0, [0, 0, 0, 0, 1]))
+        self.assertMatchesReviews()
+
+    def test_rating_sort_is_an_index_scan(self):
+        for i, place in enumerate(self.places):
+            self.review(self.guests[0], place, i + 2)
+        listings = []
+
+        def record(conn, cursor, statement, parameters, *args):
+            if 'FROM places' in statement and 'ORDER BY' in statement:
+                listings.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.get('/api/v1/places/?sort=-rating&limit=2')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual([place['title'] for place in response.json], ['Place 2', 'Place 1'])
+        response = self.client.get(f"/api/v1/places/?sort=-rating&limit=2&cursor={response.headers['X-Next-Cursor']}")
+        self.assertEqual([place['title'] for place in response.json], ['Place 0'])
+        statement, parameters = listings[0]
+        plan = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        detail = ' '.join(str(row) for row in plan)
+        self.assertIn('idx_places_rating', detail)
+        self.assertNotIn('TEMP B-TREE', detail)
+
+    def test_repair_command(self):
+        self.review(self.guests[0], self.places[0], 4)
+        db.session.execute(text("UPDATE places SET review_count = 9, rating_sum = 0, rating_4 = 0"))
+        db.session.execute(text("INSERT INTO reviews (id, text, rating, user_id, place_id, created_at, updated_at) "
+                                "VALUES ('raw', 'Raw', 2, :user, :place, '2024-01-01', '2024-01-01')"),
+                           {'user': self.guests[1].id, 'place': self.places[1].id})
+        db.session.commit()
+        result = self.app.test_cli_runner().invoke(args=['repair-rating-aggregates'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertMatchesReviews()
+        self.assertEqual(self.aggregates(self.places[1]), (1, 2, 2.0, [0, 1, 0, 0, 0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
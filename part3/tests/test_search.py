@@ -0,0 +1,108 @@
+import unittest
+from sqlalchemy import text
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.services import facade
+
+
+class TestFullTextSearch(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        self.guest = User(first_name="Guest", last_name="User", email="guest@example.com", password="x")
+        db.session.add_all([self.owner, self.guest])
+        db.session.flush()
+        self.loft = Place(title="Sunny loft", description="Quiet flat near the canal", price=80.0,
+                          latitude=48.87, longitude=2.36, owner_id=self.owner.id)
+        self.cabin = Place(title="Mountain cabin", description="Sunny terrace <b>and</b> a café",
+                           price=60.0, latitude=45.9, longitude=6.87, owner_id=self.owner.id)
+        self.studio = Place(title="Studio", description="Small studio", price=40.0,
+                            latitude=48.85, longitude=2.35, owner_id=self.owner.id)
+        db.session.add_all([self.loft, self.cabin, self.studio])
+        db.session.flush()
+        db.session.add(Review(text="Lovely sunny balcony", rating=5, user_id=self.guest.id, place_id=self.loft.id))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def search(self, q, **params):
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.client.get(f'/api/v1/places/search?q={q}&{query}')
+
+    def titles(self, q, **params):
+        return [place['title'] for place in self.search(q, **params).json]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.titles('sunny'), ['Sunny loft', 'Mountain cabin'])
+
+    def test_prefix_and_diacritics(self):
+        self.assertEqual(self.titles('mount'), ['Mountain cabin'])
+        self.assertEqual(self.titles('cafe'), ['Mountain cabin'])
+
+    def test_highlight_is_escaped(self):
+        place = self.search('terrace').json[0]
+        self.assertEqual(place['highlight']['title'], 'Mountain cabin')
+        self.assertIn('<mark>terrace</mark> &lt;b&gt;and&lt;/b&gt;', place['highlight']['description'])
+
+    def test_operators_are_plain_words(self):
+        self.assertEqual(self.titles('"sunny OR'), [])
+        self.assertEqual(self.search('!!').status_code, 400)
+
+    def test_pages_follow_rank(self):
+        for i in range(5):
+            db.session.add(Place(title=f"Sunny room {i}", price=20.0, latitude=48.8, longitude=2.3,
+                                 owner_id=self.owner.id))
+        db.session.commit()
+        seen, cursor = [], None
+        while True:
+            response = self.search('sunny', limit=3, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            seen.extend(place['title'] for place in response.json)
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        self.assertEqual(seen, self.titles('sunny', limit=10))
+        self.assertEqual(len(seen), 7)
+
+    def test_q_with_bbox(self):
+        self.assertEqual(self.titles('sunny', bbox='2,48,3,49'), ['Sunny loft'])
+
+    def test_index_follows_orm_writes(self):
+        self.studio.title = "Sunny studio"
+        db.session.commit()
+        self.assertIn('Sunny studio', self.titles('sunny'))
+        db.session.delete(self.loft)
+        db.session.commit()
+        self.assertEqual(self.titles('sunny'), ['Sunny studio', 'Mountain cabin'])
+        self.assertEqual(self.client.get('/api/v1/reviews/search?q=balcony').json, [])
+
+    def test_index_follows_update_returning(self):
+        facade.place_repo.update_returning(self.studio.id, {'description': 'Sunny courtyard'}, ('id',))
+        self.assertIn('Studio', self.titles('courtyard'))
+        self.assertEqual(self.titles('small'), [])
+
+    def test_review_search(self):
+        response = self.client.get('/api/v1/reviews/search?q=balc')
+        self.assertEqual(response.json[0]['highlight']['text'], 'Lovely sunny <mark>balcony</mark>')
+
+    def test_rebuild_command(self):
+        db.session.execute(text("UPDATE places SET title = 'Sunny barn' WHERE id = :id"), {'id': self.studio.id})
+        db.session.commit()
+        self.assertNotIn('Sunny barn', self.titles('barn'))
+        result = self.app.test_cli_runner().invoke(args=['rebuild-search-index'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Rebuilt places_fts', result.output)
+        self.assertEqual(self.titles('barn'), ['Sunny barn'])
+
+
+if __name__ == "__main__":
+    unittest.main()
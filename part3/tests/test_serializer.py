@@ -0,0 +1,68 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.utils import serializer
+
+
+class TestSerializer(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        db.session.add(self.owner)
+        db.session.flush()
+        self.place = Place(title="Loft", description="Café", price=80.0, latitude=1.0, longitude=2.0,
+                           owner_id=self.owner.id)
+        db.session.add(self.place)
+        db.session.flush()
+        db.session.add(Review(text="Nice", rating=4, user_id=self.owner.id, place_id=self.place.id))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_place_dict(self):
+        place = self.place
+        self.assertEqual(place.to_dict(), {
+            'id': place.id, 'title': 'Loft', 'description': 'Café', 'price': 80.0, 'latitude': 1.0,
+            'longitude': 2.0, 'review_count': 1, 'rating_sum': 4, 'rating_avg': 4.0,
+            'rating_histogram': {'1': 0, '2': 0, '3': 0, '4': 1, '5': 0},
+            'created_at': place.created_at.isoformat(), 'updated_at': place.updated_at.isoformat(),
+        })
+        self.assertEqual(place.to_dict(('reviews',))['reviews'][0]['text'], 'Nice')
+
+    def test_timestamps_formatted_once_per_version(self):
+        first = self.place.to_dict()
+        self.assertIs(self.place.to_dict()['created_at'], first['created_at'])
+        self.place.updated_at = datetime.utcnow() + timedelta(days=1)
+        self.assertEqual(self.place.to_dict()['updated_at'], self.place.updated_at.isoformat())
+        self.assertNotEqual(self.place.to_dict()['updated_at'], first['updated_at'])
+
+    def test_encoders_agree(self):
+        data = [self.place.to_dict(), self.owner.to_dict(), {'error': 'é'}]
+        fast = serializer.dumps(data)
+        backend, serializer.orjson = serializer.orjson, None
+        try:
+            self.assertEqual(json.loads(serializer.dumps(data)), json.loads(fast))
+        finally:
+            serializer.orjson = backend
+
+    def test_responses_use_the_encoder(self):
+        response = self.client.get(f'/api/v1/places/{self.place.id}')
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(response.json['title'], 'Loft')
+        self.assertEqual(self.client.get('/api/v1/places/unknown').json, {'error': 'Place not found'})
+        self.assertEqual(self.client.get('/swagger.json').status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
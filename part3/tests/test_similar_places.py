@@ -0,0 +1,134 @@
+import random
+import unittest
+import numpy as np
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.models.user import User
+from app.models.place import Place
+from app.persistence.geo_index import haversine_km
+from app.persistence.similarity import PlaceVectors
+from app.services import facade
+
+
+class TestPlaceVectors(unittest.TestCase):
+    def test_matches_pairwise_scores_across_patches(self):
+        rng = random.Random(3)
+        places = {f"p{i}": (rng.choice([20.0, 80.0, 300.0]), rng.uniform(40, 50), rng.uniform(0, 10))
+                  for i in range(60)}
+        links = {(f"p{i}", f"a{rng.randrange(6)}") for i in range(60) for _ in range(3)}
+        vectors = PlaceVectors.from_rows([(key, *value) for key, value in places.items()], links)
+        # Patches must leave the arrays as a rebuild would
+        for i in range(60, 70):
+            places[f"p{i}"] = (50.0, 45.0, 5.0)
+            vectors.put_place(f"p{i}", 50.0, 45.0, 5.0)
+        for i in range(0, 20, 2):
+            del places[f"p{i}"]
+            vectors.drop_place(f"p{i}")
+        for i in range(60, 70):
+            links.add((f"p{i}", "a1"))
+            vectors.link(f"p{i}", "a1")
+        links = {(place_id, amenity_id) for place_id, amenity_id in links if place_id in places}
+        for link in sorted(links)[:5]:
+            links.discard(link)
+            vectors.unlink(*link)
+
+        def score(a, b):
+            amenities_a = {amenity for place, amenity in links if place == a}
+            amenities_b = {amenity for place, amenity in links if place == b}
+            cosine = len(amenities_a & amenities_b) / np.sqrt(len(amenities_a) * len(amenities_b)) \
+                if amenities_a and amenities_b else 0.0
+            price = np.exp(-abs(np.log1p(places[a][0]) - np.log1p(places[b][0])) / 0.5)
+            location = np.exp(-haversine_km(places[a][1], places[a][2], places[b][1], places[b][2]) / 50.0)
+            return 0.5 * cosine + 0.2 * price + 0.3 * location
+
+        for place_id in ("p1", "p33", "p65"):
+            hits = vectors.similar(place_id, 5)
+            expected = sorted((score(place_id, other) for other in places if other != place_id), reverse=True)[:5]
+            self.assertNotIn(place_id, dict(hits))
+            np.testing.assert_allclose([similarity for _, similarity in hits], expected, rtol=1e-5)
+
+
+class TestSimilarPlacesApi(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        self.wifi, self.pool, self.sauna = Amenity(name="Wifi"), Amenity(name="Pool"), Amenity(name="Sauna")
+        db.session.add_all([self.owner, self.wifi, self.pool, self.sauna])
+        db.session.flush()
+
+        def place(title, price, lat, lon, amenities):
+            return Place(title=title, price=price, latitude=lat, longitude=lon, owner_id=self.owner.id,
+                         amenities=amenities)
+        self.loft = place("Loft", 100.0, 48.85, 2.35, [self.wifi, self.pool])
+        self.flat = place("Flat", 110.0, 48.86, 2.34, [self.wifi, self.pool])
+        self.villa = place("Villa", 400.0, 43.70, 7.26, [self.pool, self.sauna])
+        self.hut = place("Hut", 15.0, 35.68, 139.65, [])
+        db.session.add_all([self.loft, self.flat, self.villa, self.hut])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def titles(self, place_id, k=3):
+        response = self.client.get(f'/api/v1/places/{place_id}/similar?k={k}')
+        self.assertEqual(response.status_code, 200)
+        return [place['title'] for place in response.json]
+
+    def test_ranked_by_similarity(self):
+        response = self.client.get(f'/api/v1/places/{self.loft.id}/similar')
+        self.assertEqual([place['title'] for place in response.json], ['Flat', 'Villa', 'Hut'])
+        self.assertGreater(response.json[0]['similarity'], 0.9)
+        self.assertEqual(self.titles(self.loft.id, k=1), ['Flat'])
+        self.assertEqual(self.client.get('/api/v1/places/unknown/similar').status_code, 404)
+
+    def test_vectors_follow_writes(self):
+        self.titles(self.villa.id)
+        # Moved next to the villa at its price, the hut overtakes the loft and flat
+        facade.update_place_returning(self.hut.id, {'latitude': 43.70, 'longitude': 7.26, 'price': 400.0})
+        self.hut.amenities = [self.sauna]
+        db.session.delete(self.flat)
+        db.session.commit()
+        vectors, neighbours = facade.place_repo.vectors()
+        neighbours.refresh(vectors, 50)
+        self.assertEqual(self.titles(self.villa.id), ['Hut', 'Loft'])
+        db.session.delete(self.pool)
+        db.session.commit()
+        neighbours.refresh(vectors, 50)
+        # Without the pool, the loft keeps nothing in common with the villa
+        self.assertLess(dict(vectors.similar(self.villa.id, 2))[self.loft.id], 0.1)
+
+    def test_hot_places_are_served_from_their_list(self):
+        vectors, neighbours = facade.place_repo.vectors()
+        for _ in range(3):
+            self.titles(self.loft.id)
+        self.assertEqual(neighbours.hits[self.loft.id], 3)
+        neighbours.refresh(vectors, 50)
+        self.assertEqual(neighbours.hits[self.loft.id], 1)
+        # Deleting a listed place drops the list
+        db.session.delete(self.flat)
+        db.session.commit()
+        self.assertIsNone(neighbours.get(self.loft.id, 3))
+        self.assertEqual(self.titles(self.loft.id), ['Villa', 'Hut'])
+
+    def test_writes_drop_the_lists(self):
+        _, neighbours = facade.place_repo.vectors()
+        self.titles(self.hut.id)
+        self.titles(self.villa.id)
+        generation = neighbours.generation
+        facade.update_place_returning(self.hut.id, {'latitude': 43.70, 'longitude': 7.26, 'price': 400.0})
+        # The hut's own list and the villa's, which holds the hut, go; a list computed before the write is refused
+        self.assertIsNone(neighbours.get(self.hut.id, 3))
+        self.assertIsNone(neighbours.get(self.villa.id, 3))
+        neighbours.put(self.villa.id, [(self.hut.id, 0.0)], generation)
+        self.assertIsNone(neighbours.get(self.villa.id, 1))
+        self.assertEqual(self.titles(self.villa.id, k=1), ['Hut'])
+
+
+if __name__ == "__main__":
+    unittest.main()
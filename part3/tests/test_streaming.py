@@ -0,0 +1,74 @@
+import json
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.utils.streaming import stream_list
+
+NDJSON = {'Accept': 'application/x-ndjson'}
+
+
+class TestStreamingLists(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("config.TestingConfig")
+        self.app.config['STREAM_CHUNK_SIZE'] = 50
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.owner = User(first_name="Owner", last_name="User", email="owner@example.com", password="x")
+        db.session.add(self.owner)
+        db.session.flush()
+        db.session.add_all([Place(title=f"Place {i}", price=float(i), latitude=0.0, longitude=0.0,
+                                  owner_id=self.owner.id) for i in range(230)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_ndjson_streams_every_row_past_the_page_size(self):
+        response = self.client.get('/api/v1/places/?sort=-price', headers=NDJSON)
+        self.assertTrue(response.is_streamed)
+        places = self.lines(response)
+        self.assertEqual([place['price'] for place in places], [float(i) for i in range(229, -1, -1)])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+        # The default Accept keeps the paged JSON array
+        paged = self.client.get('/api/v1/places/')
+        self.assertEqual(len(paged.json), 20)
+        self.assertIn('X-Next-Cursor', paged.headers)
+
+    def test_ndjson_resumes_from_cursor_with_fields(self):
+        first = self.client.get('/api/v1/places/?limit=100&fields=title')
+        rest = self.lines(self.client.get(f"/api/v1/places/?fields=title&cursor={first.headers['X-Next-Cursor']}",
+                                          headers=NDJSON))
+        self.assertEqual(len(rest), 130)
+        self.assertEqual(set(rest[0]), {'title'})
+        self.assertEqual(len(self.lines(self.client.get('/api/v1/users/', headers=NDJSON))), 1)
+
+    def test_rows_are_read_in_chunks(self):
+        fetches = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count(conn, cursor, statement, parameters, context, executemany):
+            fetches.append(context.execution_options.get('yield_per'))
+        self.lines(self.client.get('/api/v1/places/', headers=NDJSON))
+        event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertIn(50, fetches)
+
+    def test_json_array(self):
+        with self.app.test_request_context('/'):
+            response = stream_list(iter(range(250)), lambda n: {'n': n})
+            self.assertEqual(json.loads(response.get_data(as_text=True)), [{'n': n} for n in range(250)])
+            self.assertEqual(stream_list(iter(()), str).get_data(as_text=True), '[]')
+
+
+if __name__ == "__main__":
+    unittest.main()